@@ -0,0 +1,224 @@
+"""Headless chat API: REST plus Server-Sent Events over the chat pipeline.
+
+    POST   /conversations                  -> 201 {"conversation_id": ...}
+    GET    /conversations/{id}             -> {"conversation_id", "messages"} (recent messages)
+    POST   /conversations/{id}/messages    {"message": "..."} -> text/event-stream
+    DELETE /conversations/{id}             -> 204
+    GET    /healthz
+    GET    /stats                          -> counters of this worker process
+    GET    /metrics                        -> the same and more, in Prometheus text format
+
+A message streams ``event: chunk`` events with ``{"text": ...}`` as the
+reply is generated and ends with ``event: done`` carrying the full reply,
+and the turn's ``trace_id`` when it was traced. A failed turn ends with
+``event: error`` instead, whose ``status`` is 409 when another request
+saved the conversation during the turn, and 500 otherwise.
+
+Run:
+    uvicorn src.api.app:app --host 0.0.0.0 --port 8000 --workers 4
+"""
+import asyncio
+import json
+import logging
+import os
+import uuid
+import weakref
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+from dotenv import load_dotenv
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from src.core.chat import ChatService
+from src.core.conversation_store import ConversationConflict, conversation_store_from_env
+from src.core.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, get_metrics
+from src.core.streaming import StreamRunner
+from src.core.tools import OrderQuerySystem
+from src.utils.database.migrate import apply_migrations
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    # Stop nginx from buffering the stream
+    "X-Accel-Buffering": "no",
+}
+
+
+def sse_event(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class ConversationRegistry:
+    """Conversations in a conversation store, with turn locks for this worker.
+
+    Each turn loads the conversation's memory and state from the store and
+    saves them back, so any worker can serve any conversation. Turns of
+    one conversation are serialized within a worker by a lock, and across
+    workers by the store's optimistic concurrency.
+    """
+
+    def __init__(self, chat: ChatService, store):
+        self.chat = chat
+        self.store = store
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    def session(self, conversation_id: str) -> OrderQuerySystem:
+        return self.chat.new_conversation(conversation_id, self.store)
+
+    def lock(self, conversation_id: str) -> asyncio.Lock:
+        lock = self._locks.get(conversation_id)
+        if lock is None:
+            lock = self._locks[conversation_id] = asyncio.Lock()
+        return lock
+
+    async def create(self) -> str:
+        conversation_id = uuid.uuid4().hex
+        await asyncio.to_thread(self.session(conversation_id).save_state)
+        return conversation_id
+
+    async def load(self, conversation_id: str) -> Optional[OrderQuerySystem]:
+        """The conversation with its state loaded, or None if unknown or expired"""
+        session = self.session(conversation_id)
+        if not await asyncio.to_thread(session.load_state):
+            return None
+        return session
+
+    async def delete(self, conversation_id: str) -> bool:
+        return await asyncio.to_thread(self.store.delete, conversation_id)
+
+
+async def create_conversation(request: Request) -> Response:
+    conversation_id = await request.app.state.conversations.create()
+    return JSONResponse({"conversation_id": conversation_id}, status_code=201)
+
+
+async def get_conversation(request: Request) -> Response:
+    conversation_id = request.path_params["conversation_id"]
+    session = await request.app.state.conversations.load(conversation_id)
+    if session is None:
+        return JSONResponse({"error": "conversation not found"}, status_code=404)
+    return JSONResponse({
+        "conversation_id": conversation_id,
+        "messages": session.memory.get_history(as_dict=True),
+    })
+
+
+async def delete_conversation(request: Request) -> Response:
+    if not await request.app.state.conversations.delete(request.path_params["conversation_id"]):
+        return JSONResponse({"error": "conversation not found"}, status_code=404)
+    return Response(status_code=204)
+
+
+async def post_message(request: Request) -> Response:
+    try:
+        body = await request.json()
+    except ValueError:
+        body = None
+    message = body.get("message") if isinstance(body, dict) else None
+    if not isinstance(message, str) or not message.strip():
+        return JSONResponse({"error": "message must be a non-empty string"}, status_code=400)
+
+    conversations: ConversationRegistry = request.app.state.conversations
+    chat: ChatService = request.app.state.chat
+    runner: StreamRunner = request.app.state.runner
+    conversation_id = request.path_params["conversation_id"]
+
+    # Held until the turn has saved its state, even if the client
+    # disconnects mid-stream
+    lock = conversations.lock(conversation_id)
+    await lock.acquire()
+    try:
+        # The turn reuses this load instead of loading again
+        session = await conversations.load(conversation_id)
+        if session is None:
+            lock.release()
+            return JSONResponse({"error": "conversation not found"}, status_code=404)
+        reply = []
+
+        async def turn_stream():
+            async for chunk in chat.stream_response(session, message):
+                reply.append(chunk)
+                yield chunk
+
+        # Started before the response, so the turn runs and releases the
+        # lock whether or not the client reads the stream
+        queue, turn = runner.start(turn_stream)
+    except BaseException:
+        lock.release()
+        raise
+    turn.add_done_callback(lambda _: lock.release())
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            async for chunk in runner.chunks(queue):
+                yield sse_event("chunk", {"text": chunk})
+        except ConversationConflict:
+            # The response has started, so the status goes in the event
+            logger.warning(f"Conversation {conversation_id} was saved by another request during the turn")
+            yield sse_event("error", {"error": "conversation changed during the turn, retry", "status": 409})
+            return
+        except Exception as e:
+            logger.error(f"Turn failed for conversation {conversation_id}: {str(e)}")
+            yield sse_event("error", {"error": str(e) or type(e).__name__, "status": 500})
+            return
+        done = {"reply": "".join(reply)}
+        if session.trace_id:
+            done["trace_id"] = session.trace_id
+        yield sse_event("done", done)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+async def healthz(request: Request) -> Response:
+    return JSONResponse({"status": "ok"})
+
+
+async def stats(request: Request) -> Response:
+    return JSONResponse({"speculation": request.app.state.chat.speculation.snapshot()})
+
+
+async def metrics(request: Request) -> Response:
+    return Response(get_metrics().render(), media_type=METRICS_CONTENT_TYPE)
+
+
+def create_app(chat: Optional[ChatService] = None, store=None) -> Starlette:
+    """The API app; without ``chat`` or ``store`` they are built from the environment on startup"""
+
+    @asynccontextmanager
+    async def lifespan(app: Starlette):
+        # Building clients and pools blocks, keep the loop free meanwhile
+        if store is None:
+            # The conversation_state table and the orders schema; a no-op
+            # once applied, and workers starting together wait on a lock
+            await asyncio.to_thread(apply_migrations)
+        app.state.chat = chat or await asyncio.to_thread(ChatService.from_env)
+        app.state.conversations = ConversationRegistry(
+            app.state.chat, store or await asyncio.to_thread(conversation_store_from_env)
+        )
+        # Turns make blocking database and LLM calls, so they run on
+        # worker threads to keep this loop serving other requests
+        app.state.runner = StreamRunner(max_workers=int(os.getenv("CHAT_API_MAX_TURNS", "32")), name="chat-turn")
+        yield
+        app.state.runner.shutdown()
+
+    return Starlette(
+        routes=[
+            Route("/healthz", healthz, methods=["GET"]),
+            Route("/stats", stats, methods=["GET"]),
+            Route("/metrics", metrics, methods=["GET"]),
+            Route("/conversations", create_conversation, methods=["POST"]),
+            Route("/conversations/{conversation_id}", get_conversation, methods=["GET"]),
+            Route("/conversations/{conversation_id}", delete_conversation, methods=["DELETE"]),
+            Route("/conversations/{conversation_id}/messages", post_message, methods=["POST"]),
+        ],
+        lifespan=lifespan,
+    )
+
+
+app = create_app()
@@ -0,0 +1,65 @@
+import json
+import threading
+from typing import AsyncGenerator, Dict, Iterator, Tuple
+
+import httpx
+
+
+def parse_sse(lines: Iterator[str]) -> Iterator[Tuple[str, Dict]]:
+    """(event, data) pairs from Server-Sent Events lines"""
+    event, data = "message", []
+    for line in lines:
+        if not line:
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+
+
+class ChatAPIClient:
+    """Client for the chat API, used by the Streamlit UI when CHAT_API_URL is set.
+
+    Connections are kept alive across calls. An async client is bound to
+    the event loop it is used on, so there is one per thread, for callers
+    that keep a long-lived loop per thread such as StreamRunner.
+    """
+
+    def __init__(self, base_url: str, timeout: float = 120.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.client = httpx.Client(timeout=timeout)
+        self._local = threading.local()
+
+    def _async_client(self) -> httpx.AsyncClient:
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = httpx.AsyncClient(timeout=self.timeout)
+        return client
+
+    def create_conversation(self) -> str:
+        response = self.client.post(f"{self.base_url}/conversations")
+        response.raise_for_status()
+        return response.json()["conversation_id"]
+
+    async def stream_message(self, conversation_id: str, message: str) -> AsyncGenerator[str, None]:
+        """Reply chunks as the API streams them"""
+        async with self._async_client().stream(
+            "POST",
+            f"{self.base_url}/conversations/{conversation_id}/messages",
+            json={"message": message},
+        ) as response:
+            response.raise_for_status()
+            lines = []
+            async for line in response.aiter_lines():
+                lines.append(line)
+                if line:
+                    continue
+                for event, data in parse_sse(lines):
+                    if event == "chunk":
+                        yield data["text"]
+                    elif event == "error":
+                        raise RuntimeError(data["error"])
+                lines = []
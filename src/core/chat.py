@@ -0,0 +1,270 @@
+import asyncio
+import os
+import threading
+import time
+from typing import AsyncGenerator, Dict, Optional, Tuple
+
+from src.core.conversation_store import ConversationConflict
+from src.core.embedding import EmbeddingClient
+from src.core.intent import faq_categories_for
+from src.core.metrics import TURN_LLM_CALLS, TURN_TOKENS, get_metrics, start_metrics_server_from_env, turn_usage
+from src.core.pgvector import get_vector_store
+from src.core.tools import OrderQuerySystem
+from src.core.tracing import Tracer, get_tracer, span
+from src.lang.vi import UI_MESSAGES
+
+
+# Intents that never fall back to the FAQ answer
+ORDER_INTENTS = ("CHECK_ORDERS", "CANCEL_ORDER")
+
+FAQ_LOOKUPS = get_metrics().counter("chat_faq_lookups", "FAQ lookups by result (hit, miss, error)", ("result",))
+TURN_SECONDS = get_metrics().histogram(
+    "chat_turn_seconds", "Turn latency to the last chunk, by answer source (faq, pipeline)", ("source",)
+)
+TURN_FIRST_CHUNK_SECONDS = get_metrics().histogram(
+    "chat_turn_first_chunk_seconds", "Turn latency to the first chunk, by answer source", ("source",)
+)
+# Summed over every ChatService in the process; each service's own
+# counts are in its SpeculationStats
+SPECULATION_EVENTS = get_metrics().counter(
+    "chat_speculation", "Speculative turn events, see SpeculationStats", ("event",)
+)
+
+
+class SpeculationStats:
+    """Counters for turns that race FAQ retrieval against intent classification.
+
+    The wasted work of speculating is counted by ``cancelled_intents``
+    (LLM calls aborted by a FAQ hit or a local intent), ``unused_intents``
+    (LLM calls that finished before a FAQ hit) and ``ignored_retrievals``
+    (FAQ lookups made irrelevant by an order intent).
+    """
+
+    FIELDS = (
+        "turns",
+        "faq_first",
+        "intent_first",
+        "faq_hits",
+        "cancelled_intents",
+        "unused_intents",
+        "ignored_retrievals",
+        "intent_errors",
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.FIELDS, 0)
+
+    def add(self, *fields: str):
+        with self._lock:
+            for field in fields:
+                self._counts[field] += 1
+        for field in fields:
+            SPECULATION_EVENTS.labels(field).inc()
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+
+class ChatService:
+    """FAQ-first chat pipeline shared by the Streamlit UI and the HTTP API.
+
+    Holds the clients, chains, pools and vector store that every
+    conversation in the process uses. Conversations themselves are
+    OrderQuerySystem sessions from ``new_conversation()``.
+
+    With ``speculative`` set, turns that need an intent start the FAQ
+    lookup and the LLM intent call together, so a FAQ miss costs the
+    slower of the two rather than their sum.
+    """
+
+    def __init__(
+        self,
+        order_system: OrderQuerySystem,
+        vector_db,
+        embedding_client: EmbeddingClient,
+        faq_threshold: float = 0.7,
+        speculative: bool = False,
+        tracer: Optional[Tracer] = None,
+    ):
+        self.order_system = order_system
+        self.vector_db = vector_db
+        self.embedding_client = embedding_client
+        self.faq_threshold = faq_threshold
+        self.speculative = speculative
+        self.speculation = SpeculationStats()
+        self.tracer = tracer or Tracer()
+
+    @classmethod
+    def from_env(cls) -> "ChatService":
+        start_metrics_server_from_env()
+        return cls(
+            order_system=OrderQuerySystem(),
+            vector_db=get_vector_store(),
+            embedding_client=EmbeddingClient(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                cache_size=int(os.getenv("EMBEDDING_CACHE_SIZE", "512")),
+            ),
+            faq_threshold=float(os.getenv("FAQ_SIMILARITY_THRESHOLD", "0.7")),
+            speculative=os.getenv("CHAT_SPECULATIVE", "false").lower() == "true",
+            tracer=get_tracer(),
+        )
+
+    def new_conversation(self, conversation_id: Optional[str] = None, state_store=None) -> OrderQuerySystem:
+        return self.order_system.new_session(conversation_id, state_store)
+
+    def get_faq_response(self, query: str) -> Dict:
+        """Get response from FAQ system"""
+        with span("faq") as faq_span:
+            faq_response = self._faq_lookup(query)
+            faq_span.set(found=faq_response["found"], similarity=faq_response.get("similarity"))
+        if faq_response["found"]:
+            FAQ_LOOKUPS.labels("hit").inc()
+        else:
+            # Misses keep the query embedding; errors have none
+            FAQ_LOOKUPS.labels("miss" if "embedding" in faq_response else "error").inc()
+        return faq_response
+
+    def _faq_lookup(self, query: str) -> Dict:
+        try:
+            # Get embedding for query
+            query_embeddings = self.embedding_client.embed_documents(
+                texts=[query], input_type="search_query"
+            )
+
+            if not query_embeddings:
+                return {"found": False}
+            query_embedding = query_embeddings[0]
+
+            # A confident local intent narrows the search to its FAQ
+            # categories, and routes the turn when the FAQ doesn't answer
+            local_intent = self.order_system.classify_intent_local(query, query_embedding)
+
+            # Search similar questions
+            results = self.vector_db.similarity_search(
+                query_embedding=query_embedding,
+                k=3,
+                similarity_threshold=self.faq_threshold,
+                categories=faq_categories_for(local_intent),
+            )
+
+            if results:
+                return {
+                    "found": True,
+                    "answer": results[0]["answer"],
+                    "similarity": results[0]["similarity"],
+                    "embedding": query_embedding,
+                    "local_intent": local_intent,
+                }
+            return {"found": False, "embedding": query_embedding, "local_intent": local_intent}
+        except Exception as e:
+            print(UI_MESSAGES["faq_error"].format(str(e)))
+        return {"found": False}
+
+    def _is_faq_hit(self, faq_response: Dict) -> bool:
+        return faq_response["found"] and faq_response["similarity"] > self.faq_threshold
+
+    @staticmethod
+    async def _cancel(task: asyncio.Task):
+        # Let the task unwind, closing its request and ending its span
+        task.cancel()
+        await asyncio.wait((task,))
+
+    async def _speculate(self, conversation: OrderQuerySystem, user_input: str) -> Tuple[Dict, Optional[Dict]]:
+        """Run FAQ retrieval and LLM intent classification concurrently.
+
+        Returns (FAQ response, intent or None). Whichever decides the turn
+        first wins: a confident FAQ hit or local intent cancels the LLM
+        call, and an order intent stops waiting for the FAQ lookup.
+        """
+        faq_task = asyncio.ensure_future(asyncio.to_thread(self.get_faq_response, user_input))
+        intent_task = asyncio.ensure_future(conversation.classify_intent_llm(user_input))
+        done, _ = await asyncio.wait((faq_task, intent_task), return_when=asyncio.FIRST_COMPLETED)
+        self.speculation.add("turns", "faq_first" if faq_task in done else "intent_first")
+
+        if faq_task in done and not intent_task.done():
+            faq_response = faq_task.result()
+            if self._is_faq_hit(faq_response):
+                await self._cancel(intent_task)
+                self.speculation.add("faq_hits", "cancelled_intents")
+                return faq_response, None
+            intent_result = faq_response.get("local_intent")
+            if intent_result is not None:
+                await self._cancel(intent_task)
+                self.speculation.add("cancelled_intents")
+                return faq_response, intent_result
+
+        try:
+            intent_result = await intent_task
+        except Exception as e:
+            # Classified again, without speculation, by process_query_stream
+            print(f"Intent error: {str(e)}")
+            self.speculation.add("intent_errors")
+            intent_result = None
+
+        if not faq_task.done() and intent_result is not None and intent_result.get("intent") in ORDER_INTENTS:
+            # The lookup thread cannot be stopped; its result is dropped
+            self.speculation.add("ignored_retrievals")
+            return {"found": False}, intent_result
+
+        faq_response = await faq_task
+        if self._is_faq_hit(faq_response):
+            self.speculation.add("faq_hits", "unused_intents")
+            return faq_response, None
+        return faq_response, intent_result
+
+    async def stream_response(
+        self, conversation: OrderQuerySystem, user_input: str
+    ) -> AsyncGenerator[str, None]:
+        """Answer from the FAQ when it matches, otherwise stream from the conversation"""
+        start = time.perf_counter()
+        first_chunk = None
+        with self.tracer.trace("turn", conversation_id=conversation.conversation_id) as turn_span, turn_usage() as usage:
+            conversation.trace_id = turn_span.trace_id
+            conversation.last_usage = usage
+            try:
+                async for chunk in self._stream_turn(conversation, user_input, turn_span, usage):
+                    if first_chunk is None:
+                        first_chunk = time.perf_counter() - start
+                    yield chunk
+            finally:
+                TURN_SECONDS.labels(usage.source).observe(time.perf_counter() - start)
+                if first_chunk is not None:
+                    TURN_FIRST_CHUNK_SECONDS.labels(usage.source).observe(first_chunk)
+                TURN_LLM_CALLS.labels(usage.source).observe(usage.calls)
+                TURN_TOKENS.labels(usage.source).observe(usage.tokens)
+
+    async def _stream_turn(
+        self, conversation: OrderQuerySystem, user_input: str, turn_span, usage
+    ) -> AsyncGenerator[str, None]:
+        try:
+            intent_result = None
+            conversation.begin_turn()
+            if self.speculative and conversation.needs_intent(user_input):
+                with span("speculate"):
+                    faq_response, intent_result = await self._speculate(conversation, user_input)
+            else:
+                faq_response = self.get_faq_response(user_input)
+                intent_result = faq_response.get("local_intent")
+
+            if self._is_faq_hit(faq_response):
+                usage.source = "faq"
+                turn_span.set(source="faq")
+                yield faq_response["answer"]
+                conversation.record_exchange(user_input, faq_response["answer"])
+                return
+
+            usage.source = "pipeline"
+            turn_span.set(source="pipeline")
+            # The FAQ lookup already ran the local classifier, so an
+            # unclassified turn goes to the LLM without running it again
+            async for chunk in conversation.process_query_stream(user_input, intent_result=intent_result):
+                yield chunk
+
+        except ConversationConflict:
+            raise
+        except Exception as e:
+            print(f"Response error: {str(e)}")
+            turn_span.set(error=str(e))
+            yield UI_MESSAGES["response_error"]
@@ -0,0 +1,226 @@
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from psycopg_pool import ConnectionPool
+
+from src.core.replicas import get_replica_router
+
+# Records at least this large are zlib-compressed
+COMPRESS_MIN_BYTES = 512
+
+# First byte of an encoded record
+_PLAIN = b"j"
+_COMPRESSED = b"z"
+
+LOAD_SQL = """
+    SELECT version, data FROM conversation_state
+    WHERE conversation_id = %s AND expires_at > now()
+"""
+
+# Inserts version 1, or bumps the version of a row whose version the
+# caller saw (or which has expired). No row back means a conflict.
+SAVE_SQL = """
+    INSERT INTO conversation_state AS current (conversation_id, version, data, expires_at)
+    VALUES (%(id)s, 1, %(data)s, now() + make_interval(secs => %(ttl)s))
+    ON CONFLICT (conversation_id) DO UPDATE
+    SET version = current.version + 1, data = EXCLUDED.data, expires_at = EXCLUDED.expires_at
+    WHERE current.version = %(version)s OR current.expires_at <= now()
+    RETURNING version
+"""
+
+DELETE_SQL = "DELETE FROM conversation_state WHERE conversation_id = %s"
+
+PURGE_SQL = "DELETE FROM conversation_state WHERE expires_at <= now()"
+
+ARCHIVE_SQL = """
+    INSERT INTO conversation_archive (conversation_id, seq, role, content)
+    VALUES (%s, %s, %s, %s)
+    ON CONFLICT (conversation_id, seq) DO NOTHING
+"""
+
+# Newest first; callers reverse the page
+LOAD_ARCHIVE_SQL = """
+    SELECT role, content FROM conversation_archive
+    WHERE conversation_id = %s AND seq < %s
+    ORDER BY seq DESC
+    LIMIT %s
+"""
+
+DELETE_ARCHIVE_SQL = "DELETE FROM conversation_archive WHERE conversation_id = %s"
+
+# Archived messages live as long as their conversation's state
+PURGE_ARCHIVE_SQL = """
+    DELETE FROM conversation_archive a
+    WHERE NOT EXISTS (
+        SELECT 1 FROM conversation_state s
+        WHERE s.conversation_id = a.conversation_id AND s.expires_at > now()
+    )
+"""
+
+
+class ConversationConflict(Exception):
+    """The conversation was saved by another turn since it was loaded"""
+
+
+def encode_record(record: Dict) -> bytes:
+    """Compact JSON, compressed when large"""
+    data = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if len(data) >= COMPRESS_MIN_BYTES:
+        return _COMPRESSED + zlib.compress(data)
+    return _PLAIN + data
+
+
+def decode_record(data: bytes) -> Dict:
+    data = bytes(data)
+    if data[:1] == _COMPRESSED:
+        return json.loads(zlib.decompress(data[1:]))
+    return json.loads(data[1:])
+
+
+class InMemoryConversationStore:
+    """Conversation records in this process, for tests and single-process runs"""
+
+    def __init__(self, ttl_seconds: float = 86400.0, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # conversation id -> (expiry, version, encoded record)
+        self._entries: "OrderedDict[str, Tuple[float, int, bytes]]" = OrderedDict()
+        # conversation id -> archived messages in order
+        self._archives: "OrderedDict[str, List[Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _live(self, conversation_id: str) -> Optional[Tuple[float, int, bytes]]:
+        entry = self._entries.get(conversation_id)
+        if entry is not None and entry[0] <= time.monotonic():
+            del self._entries[conversation_id]
+            self._archives.pop(conversation_id, None)
+            return None
+        return entry
+
+    def load(self, conversation_id: str) -> Optional[Tuple[int, Dict]]:
+        """(version, record), or None for an unknown or expired conversation"""
+        with self._lock:
+            entry = self._live(conversation_id)
+        if entry is None:
+            return None
+        return entry[1], decode_record(entry[2])
+
+    def save(self, conversation_id: str, record: Dict, version: int) -> int:
+        """Store record if ``version`` is still current; returns the new version"""
+        data = encode_record(record)
+        with self._lock:
+            entry = self._live(conversation_id)
+            current = entry[1] if entry is not None else 0
+            if entry is not None and current != version:
+                raise ConversationConflict(conversation_id)
+            self._entries[conversation_id] = (time.monotonic() + self.ttl_seconds, current + 1, data)
+            self._entries.move_to_end(conversation_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return current + 1
+
+    def delete(self, conversation_id: str) -> bool:
+        with self._lock:
+            self._archives.pop(conversation_id, None)
+            return self._entries.pop(conversation_id, None) is not None
+
+    def archive(self, conversation_id: str, start: int, messages: List[Dict]):
+        """Store messages numbered from ``start``; already archived numbers are kept"""
+        with self._lock:
+            archived = self._archives.setdefault(conversation_id, [])
+            archived.extend(messages[max(len(archived) - start, 0):])
+            self._archives.move_to_end(conversation_id)
+            while len(self._archives) > self.max_entries:
+                self._archives.popitem(last=False)
+
+    def load_archive(self, conversation_id: str, before: int, limit: int) -> List[Dict]:
+        """Up to ``limit`` archived messages numbered below ``before``, oldest first"""
+        with self._lock:
+            archived = self._archives.get(conversation_id, [])
+            return [dict(message) for message in archived[max(before - limit, 0):before]]
+
+
+class PostgresConversationStore:
+    """Conversation records in the ``conversation_state`` table.
+
+    Loads and saves are one statement each. Saves are optimistic: they
+    name the version that was loaded and fail with ConversationConflict
+    if another worker saved in between. Rows expire ``ttl_seconds`` after
+    their last save and are purged at most every ``purge_interval``,
+    together with the archived messages of conversations that expired or
+    no longer exist.
+    """
+
+    def __init__(self, pool: ConnectionPool, ttl_seconds: float = 86400.0, purge_interval: float = 600.0):
+        self.pool = pool
+        self.ttl_seconds = ttl_seconds
+        self.purge_interval = purge_interval
+        self._next_purge = time.monotonic() + purge_interval
+
+    def load(self, conversation_id: str) -> Optional[Tuple[int, Dict]]:
+        """(version, record), or None for an unknown or expired conversation"""
+        with self.pool.connection() as conn:
+            row = conn.execute(LOAD_SQL, (conversation_id,), prepare=True).fetchone()
+        if row is None:
+            return None
+        return row[0], decode_record(row[1])
+
+    def save(self, conversation_id: str, record: Dict, version: int) -> int:
+        """Store record if ``version`` is still current; returns the new version"""
+        params = {"id": conversation_id, "data": encode_record(record), "ttl": self.ttl_seconds, "version": version}
+        with self.pool.connection() as conn:
+            row = conn.execute(SAVE_SQL, params, prepare=True).fetchone()
+        if row is None:
+            raise ConversationConflict(conversation_id)
+        self._maybe_purge()
+        return row[0]
+
+    def _maybe_purge(self):
+        if time.monotonic() >= self._next_purge:
+            self._next_purge = time.monotonic() + self.purge_interval
+            self.purge_expired()
+
+    def delete(self, conversation_id: str) -> bool:
+        with self.pool.connection() as conn:
+            conn.execute(DELETE_ARCHIVE_SQL, (conversation_id,))
+            return conn.execute(DELETE_SQL, (conversation_id,)).rowcount > 0
+
+    def archive(self, conversation_id: str, start: int, messages: List[Dict]):
+        """Store messages numbered from ``start``, in one pipelined round trip"""
+        rows = [
+            (conversation_id, start + i, message["role"], message["content"])
+            for i, message in enumerate(messages)
+        ]
+        with self.pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.executemany(ARCHIVE_SQL, rows)
+        self._maybe_purge()
+
+    def load_archive(self, conversation_id: str, before: int, limit: int) -> List[Dict]:
+        """Up to ``limit`` archived messages numbered below ``before``, oldest first"""
+        with self.pool.connection() as conn:
+            rows = conn.execute(LOAD_ARCHIVE_SQL, (conversation_id, before, limit), prepare=True).fetchall()
+        return [{"role": role, "content": content} for role, content in reversed(rows)]
+
+    def purge_expired(self) -> int:
+        """Delete expired state, and the archived messages of conversations without live state"""
+        with self.pool.connection() as conn:
+            purged = conn.execute(PURGE_SQL).rowcount
+            conn.execute(PURGE_ARCHIVE_SQL)
+            return purged
+
+
+def conversation_store_from_env():
+    """CONVERSATION_STORE: ``postgres`` (on the shared primary pool) or ``memory``"""
+    ttl_seconds = float(os.getenv("CONVERSATION_TTL", "86400"))
+    kind = os.getenv("CONVERSATION_STORE", "postgres")
+    if kind == "memory":
+        return InMemoryConversationStore(ttl_seconds=ttl_seconds)
+    if kind != "postgres":
+        raise ValueError(f"Unknown conversation store: {kind}")
+    return PostgresConversationStore(get_replica_router().primary.pool, ttl_seconds=ttl_seconds)
@@ -0,0 +1,37 @@
+import os
+from typing import List, Optional
+
+
+def get_connection_string(host: Optional[str] = None, port: Optional[int] = None) -> str:
+    """Get database connection string from environment variables"""
+    host = host or os.getenv('PGHOST', 'localhost')
+    port = port or int(os.getenv('PGPORT', '5432'))
+    user = os.getenv('PGUSER', 'postgres')
+    password = os.getenv('PGPASSWORD', 'postgres')
+    database = os.getenv('PGDATABASE', 'postgres')
+    return f"postgresql://{user}:{password}@{host}:{port}/{database}"
+
+
+def _connection_strings_from(variable: str) -> List[str]:
+    """Connection strings for a comma-separated list of ``host`` or
+    ``host:port`` in an environment variable; credentials and database are
+    the primary's.
+    """
+    conninfos = []
+    for entry in os.getenv(variable, '').split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        host, _, port = entry.partition(':')
+        conninfos.append(get_connection_string(host, int(port) if port else None))
+    return conninfos
+
+
+def get_replica_connection_strings() -> List[str]:
+    """Connection strings for the read replicas in PGREPLICA_HOSTS"""
+    return _connection_strings_from('PGREPLICA_HOSTS')
+
+
+def get_shard_connection_strings() -> List[str]:
+    """Connection strings for the FAQ vector shards in PGVECTOR_SHARD_HOSTS"""
+    return _connection_strings_from('PGVECTOR_SHARD_HOSTS')
@@ -1,20 +1,81 @@
+from array import array
+from collections import OrderedDict
+import threading
+import time
 from openai import OpenAI
 from typing import List
 
+from src.core.metrics import get_metrics
+from src.core.tracing import span
+
+EMBEDDING_SECONDS = get_metrics().histogram("chat_embedding_request_seconds", "Embedding API call latency")
+EMBEDDING_TOKENS = get_metrics().counter("chat_embedding_tokens", "Tokens sent to the embedding API")
+EMBEDDING_CACHE = get_metrics().counter(
+    "chat_embedding_cache", "Embedding cache lookups by result (hit, miss)", ("result",)
+)
+
+
 class EmbeddingClient:
-    def __init__(self, api_key: str):
+    """Embeddings from the OpenAI API.
+
+    With ``cache_size`` the most recently used embeddings are kept per
+    text, so repeated questions skip the API call. Vectors are stored as
+    packed doubles, about 12 KiB each at 1536 dimensions.
+    """
+
+    def __init__(self, api_key: str, cache_size: int = 0):
         self.client = OpenAI(api_key=api_key)
         self.model = "text-embedding-3-small"
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, array]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def _cached(self, texts: List[str]) -> List:
+        with self._cache_lock:
+            found = []
+            for text in texts:
+                vector = self._cache.get(text)
+                if vector is not None:
+                    self._cache.move_to_end(text)
+                found.append(vector)
+        hits = sum(vector is not None for vector in found)
+        if hits:
+            EMBEDDING_CACHE.labels("hit").inc(hits)
+        if hits < len(texts):
+            EMBEDDING_CACHE.labels("miss").inc(len(texts) - hits)
+        return found
+
+    def _store(self, texts: List[str], embeddings: List[List[float]]):
+        with self._cache_lock:
+            for text, embedding in zip(texts, embeddings):
+                self._cache[text] = array("d", embedding)
+                self._cache.move_to_end(text)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
 
     def embed_documents(self, texts: List[str], input_type: str = "search_document") -> List[List[float]]:
         try:
-            response = self.client.embeddings.create(
-                input=texts,
-                model=self.model
-            )
+            found = self._cached(texts) if self.cache_size else [None] * len(texts)
+            missing = [text for text, vector in zip(texts, found) if vector is None]
+            with span("embed", texts=len(texts), cached=len(texts) - len(missing), model=self.model) as embed_span:
+                if missing:
+                    start = time.perf_counter()
+                    response = self.client.embeddings.create(
+                        input=missing,
+                        model=self.model
+                    )
+                    EMBEDDING_SECONDS.observe(time.perf_counter() - start)
+                    if response.usage:
+                        EMBEDDING_TOKENS.inc(response.usage.total_tokens)
+                    embed_span.set(tokens=response.usage.total_tokens if response.usage else None)
+            if not missing:
+                return [list(vector) for vector in found]
             # Extract embeddings from response
             embeddings = [item.embedding for item in response.data]
-            return embeddings
+            if self.cache_size:
+                self._store(missing, embeddings)
+            fresh = iter(embeddings)
+            return [list(vector) if vector is not None else next(fresh) for vector in found]
         except Exception as e:
             print(f"Error embedding documents: {e}")
             return []
@@ -0,0 +1,150 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import tiktoken
+
+# Per-chain history budgets in tokens. Extractors and the classifier only
+# need the last turn or two; chat gets the most context.
+DEFAULT_HISTORY_BUDGETS = {
+    "intent": 300,
+    "email": 300,
+    "order_id": 300,
+    "response": 200,
+    "conversation": 600,
+    "response_formatter": 200,
+    "chat": 800,
+}
+
+TRUNCATION_MARKER = " …[rút gọn]"
+
+
+class HistoryBuilder:
+    """Render conversation history as compact text within a token budget.
+
+    Messages are rendered as ``role: content`` lines without timestamps or
+    JSON. Long messages (such as order lists) are cut to
+    ``max_message_tokens``, and the newest messages are kept until the
+    chain's budget is used up. A rolling summary of older turns, if any, is
+    placed first when it still fits.
+    """
+
+    def __init__(
+        self,
+        budgets: Optional[Dict[str, int]] = None,
+        default_budget: int = 400,
+        max_message_tokens: int = 150,
+        encoding_name: str = "o200k_base",
+    ):
+        self.budgets = dict(DEFAULT_HISTORY_BUDGETS if budgets is None else budgets)
+        self.default_budget = default_budget
+        self.max_message_tokens = max_message_tokens
+        try:
+            self.encoding = tiktoken.get_encoding(encoding_name)
+        except Exception as e:
+            # Encoding files are fetched on first use; estimate when offline
+            print(f"Tokenizer unavailable, estimating token counts: {str(e)}")
+            self.encoding = None
+
+    def count_tokens(self, text: str) -> int:
+        if self.encoding is None:
+            return len(text) // 4 + 1
+        return len(self.encoding.encode(text))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut text to at most max_tokens tokens"""
+        if self.encoding is None:
+            if len(text) <= max_tokens * 4:
+                return text
+            return text[: max_tokens * 4] + TRUNCATION_MARKER
+        tokens = self.encoding.encode(text)
+        if len(tokens) <= max_tokens:
+            return text
+        return self.encoding.decode(tokens[:max_tokens]) + TRUNCATION_MARKER
+
+    def render_message(self, message) -> str:
+        return f"{message.role}: {self.truncate(message.content, self.max_message_tokens)}"
+
+    def render(self, messages: Iterable, chain: Optional[str] = None, summary: str = "") -> str:
+        """Render the newest messages that fit in the chain's budget"""
+        budget = self.budgets.get(chain, self.default_budget)
+        lines: List[str] = []
+        for message in reversed(list(messages)):
+            line = self.render_message(message)
+            cost = self.count_tokens(line) + 1
+            if cost > budget:
+                break
+            lines.append(line)
+            budget -= cost
+        lines.reverse()
+
+        if summary:
+            summary_line = f"summary: {summary}"
+            if self.count_tokens(summary_line) + 1 <= budget:
+                lines.insert(0, summary_line)
+        return "\n".join(lines)
+
+
+class RollingSummarizer:
+    """Fold messages evicted from memory into a running summary.
+
+    Summaries are computed on a background thread so the LLM call stays
+    off the turn's path: start() at the end of a turn, result() at the
+    start of the next one. Jobs are keyed by the summary and messages
+    they fold, so a later session of the same conversation finds them.
+    """
+
+    def __init__(
+        self,
+        summarize_fn: Callable[[str, str], str],
+        builder: HistoryBuilder,
+        max_summary_tokens: int = 150,
+        max_jobs: int = 256,
+    ):
+        self.summarize_fn = summarize_fn
+        self.builder = builder
+        self.max_summary_tokens = max_summary_tokens
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="history-summary")
+        self._jobs: "OrderedDict[Tuple, Future]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, summary: str, evicted: Iterable) -> str:
+        lines = "\n".join(self.builder.render_message(message) for message in evicted)
+        try:
+            updated = self.summarize_fn(summary, lines)
+        except Exception as e:
+            print(f"Error summarizing history: {str(e)}")
+            return summary
+        return self.builder.truncate(updated.strip(), self.max_summary_tokens)
+
+    @staticmethod
+    def _key(summary: str, evicted: Tuple) -> Tuple:
+        return summary, tuple((message.role, message.content) for message in evicted)
+
+    def start(self, summary: str, evicted: Iterable) -> Future:
+        """Start folding ``evicted`` into ``summary`` unless already started"""
+        evicted = tuple(evicted)
+        key = self._key(summary, evicted)
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None:
+                job = self._executor.submit(self, summary, evicted)
+                self._jobs[key] = job
+                # Jobs of abandoned conversations are dropped oldest first
+                while len(self._jobs) > self.max_jobs:
+                    self._jobs.popitem(last=False)
+            return job
+
+    def result(self, summary: str, evicted: Iterable) -> Optional[str]:
+        """The updated summary if its job is done, else None; starts the
+        job if it is not running
+        """
+        evicted = tuple(evicted)
+        job = self.start(summary, evicted)
+        if not job.done():
+            return None
+        with self._lock:
+            self._jobs.pop(self._key(summary, evicted), None)
+        return job.result()
@@ -0,0 +1,146 @@
+import re
+import json
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+INTENT_LABELS = ("CHECK_ORDERS", "CANCEL_ORDER", "FAQ", "CHAT")
+
+# FAQ categories worth searching for an intent; other intents search them all
+INTENT_FAQ_CATEGORIES = {
+    "CHECK_ORDERS": ("order_information", "shipping", "preorder", "payment"),
+    "CANCEL_ORDER": ("cancel", "returns", "payment"),
+}
+
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+ORDER_ID_PATTERN = re.compile(r"\b(ORD-[0-9A-Za-z]+)\b|#([0-9A-Za-z-]+)")
+
+
+def extract_email(text: str) -> Optional[str]:
+    """Return the first email address found in text"""
+    match = EMAIL_PATTERN.search(text)
+    return match.group(0) if match else None
+
+
+def extract_order_id(text: str) -> Optional[str]:
+    """Return the first order ID (ORD-XXXX or #XXXX) found in text"""
+    match = ORDER_ID_PATTERN.search(text)
+    if not match:
+        return None
+    return (match.group(1) or match.group(2)).upper()
+
+
+def faq_categories_for(
+    intent_result: Optional[Dict], categories: Dict[str, Sequence[str]] = INTENT_FAQ_CATEGORIES
+) -> Optional[List[str]]:
+    """FAQ categories to restrict a search to, or None to search everything"""
+    if not intent_result or intent_result.get("intent") not in categories:
+        return None
+    return list(categories[intent_result["intent"]])
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+class EmbeddingIntentClassifier:
+    """Nearest-centroid intent classifier over query embeddings.
+
+    Each intent is represented by the normalized mean of its example
+    embeddings. Cosine similarities to the centroids are turned into a
+    confidence with a scaled softmax; predictions below ``threshold`` are
+    reported as unconfident so the caller can fall back to the LLM.
+    """
+
+    def __init__(
+        self,
+        labels: Sequence[str],
+        centroids: np.ndarray,
+        threshold: float = 0.7,
+        scale: float = 20.0,
+    ):
+        self.labels = list(labels)
+        self.centroids = _normalize(np.asarray(centroids, dtype=np.float32))
+        self.threshold = threshold
+        self.scale = scale
+
+    @classmethod
+    def fit(
+        cls,
+        embeddings: Sequence[Sequence[float]],
+        labels: Sequence[str],
+        threshold: float = 0.7,
+        scale: float = 20.0,
+    ) -> "EmbeddingIntentClassifier":
+        """Build centroids from labeled example embeddings"""
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+        labels = np.asarray(labels)
+        classes = [label for label in INTENT_LABELS if label in set(labels)]
+        if not classes:
+            raise ValueError("No labeled examples to train on")
+        centroids = np.stack([vectors[labels == label].mean(axis=0) for label in classes])
+        return cls(classes, centroids, threshold=threshold, scale=scale)
+
+    def predict(self, embedding: Sequence[float]) -> Tuple[str, float]:
+        """Return the most likely intent and its confidence"""
+        query = np.asarray(embedding, dtype=np.float32)
+        similarities = self.centroids @ query / (np.linalg.norm(query) or 1.0)
+        logits = (similarities - similarities.max()) * self.scale
+        probabilities = np.exp(logits)
+        probabilities /= probabilities.sum()
+        best = int(probabilities.argmax())
+        return self.labels[best], float(probabilities[best])
+
+    def classify(self, text: str, embedding: Sequence[float]) -> Optional[Dict]:
+        """Classify a query, or return None when not confident enough.
+
+        The result has the same shape as the intent LLM's JSON answer, with
+        email and order ID pulled out of the text by pattern matching.
+        """
+        intent, confidence = self.predict(embedding)
+        if confidence < self.threshold:
+            return None
+        return {
+            "intent": intent,
+            "confidence": confidence,
+            "email": extract_email(text),
+            "order_id": extract_order_id(text),
+        }
+
+    def save(self, path: str):
+        """Save the model to an .npz file"""
+        np.savez(
+            path,
+            labels=np.asarray(self.labels),
+            centroids=self.centroids,
+            params=np.asarray([self.threshold, self.scale], dtype=np.float64),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "EmbeddingIntentClassifier":
+        """Load a model saved with save()"""
+        with np.load(path) as data:
+            threshold, scale = data["params"].tolist()
+            return cls(data["labels"].tolist(), data["centroids"], threshold=threshold, scale=scale)
+
+
+def load_labeled_examples(paths: List[str]) -> List[Tuple[str, str]]:
+    """Load (text, intent) pairs from example files and intent logs.
+
+    ``.json`` files map each intent to a list of example texts; ``.jsonl``
+    files hold one ``{"input": ..., "intent": ...}`` record per line, as
+    written by OrderQuerySystem when INTENT_LOG_PATH is set.
+    """
+    examples = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as file:
+            if path.endswith(".jsonl"):
+                for line in file:
+                    if line.strip():
+                        record = json.loads(line)
+                        examples.append((record["input"], record["intent"]))
+            else:
+                for intent, texts in json.load(file).items():
+                    examples.extend((text, intent) for text in texts)
+    return [(text, intent) for text, intent in examples if intent in INTENT_LABELS]
@@ -0,0 +1,335 @@
+import bisect
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Seconds; fine enough below 100 ms for DB queries, wide enough for LLM calls
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIMILARITY_BUCKETS = (0.5, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 8, 10, 15)
+TOKEN_BUCKETS = (0, 100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+logger = logging.getLogger(__name__)
+
+# (label values, value) pairs reported by a callback metric
+Samples = Iterable[Tuple[Dict[str, str], float]]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _header(name: str, description: str, kind: str) -> List[str]:
+    # Counter samples, and so their family, are named with a _total suffix
+    if kind == "counter":
+        name += "_total"
+    return [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """The series for these label values, in ``labelnames`` order"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _series(self) -> List[Tuple[Dict[str, str], object]]:
+        with self._lock:
+            items = list(self._children.items())
+        return [(dict(zip(self.labelnames, values)), child) for values, child in items]
+
+    def render(self) -> List[str]:
+        lines = _header(self.name, self.description, self.kind)
+        for labels, child in self._series():
+            lines.extend(self._render_child(labels, child))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def _render_child(self, labels, child) -> List[str]:
+        return [f"{self.name}_total{_format_labels(labels)} {_format_value(child.value)}"]
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # One count per bucket plus +Inf, not cumulative until rendered
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Histogram(_Metric):
+    """Bucketed observations; quantiles come from histogram_quantile() at query time"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _render_child(self, labels, child) -> List[str]:
+        with child._lock:
+            counts, total = list(child.counts), child.sum
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            bucket_labels = {**labels, "le": _format_value(float(bound))}
+            lines.append(f"{self.name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+        lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class CallbackMetric:
+    """Values read at scrape time, such as pool sizes, costing nothing in between"""
+
+    def __init__(self, name: str, description: str, kind: str, collect: Callable[[], Samples]):
+        self.name = name
+        self.description = description
+        self.kind = kind
+        self.collect = collect
+        # Set while collection keeps failing, so each scrape doesn't log again
+        self._failing = False
+
+    def render(self) -> List[str]:
+        lines = _header(self.name, self.description, self.kind)
+        suffix = "_total" if self.kind == "counter" else ""
+        try:
+            for labels, value in self.collect():
+                lines.append(f"{self.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        except Exception:
+            if not self._failing:
+                self._failing = True
+                logger.exception(f"Metrics collection failed for {self.name}; not logged again until it recovers")
+            return lines
+        self._failing = False
+        return lines
+
+
+class MetricsRegistry:
+    """Process-wide metrics, rendered in the Prometheus text format.
+
+    Recording is a dict lookup, a bisect and a short lock, so metrics
+    stay on in production. Registering a name twice returns the existing
+    metric, so modules can declare theirs at import time.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, name: str, factory):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = factory()
+            return metric
+
+    def counter(self, name: str, description: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(name, lambda: Counter(name, description, labelnames))
+
+    def histogram(
+        self, name: str, description: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._register(name, lambda: Histogram(name, description, labelnames, buckets))
+
+    def callback(self, name: str, description: str, collect: Callable[[], Samples], kind: str = "gauge") -> CallbackMetric:
+        return self._register(name, lambda: CallbackMetric(name, description, kind, collect))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    return _registry
+
+
+LLM_SECONDS = _registry.histogram(
+    "chat_llm_request_seconds", "LLM call latency by chain and model", ("chain", "model")
+)
+LLM_TOKENS = _registry.counter(
+    "chat_llm_tokens", "LLM tokens by chain and kind (prompt, completion, cached)", ("chain", "kind")
+)
+LLM_ERRORS = _registry.counter("chat_llm_errors", "Failed LLM calls by chain", ("chain",))
+DB_QUERY_SECONDS = _registry.histogram(
+    "chat_db_query_seconds", "Database query latency by query, including waiting for a connection", ("query",)
+)
+TURN_LLM_CALLS = _registry.histogram(
+    "chat_turn_llm_calls", "LLM calls per turn", ("source",), buckets=COUNT_BUCKETS
+)
+TURN_TOKENS = _registry.histogram(
+    "chat_turn_llm_tokens", "Prompt plus completion tokens per turn", ("source",), buckets=TOKEN_BUCKETS
+)
+
+
+class TurnUsage:
+    """LLM calls and tokens of the running turn, and where its answer came from"""
+
+    __slots__ = ("calls", "tokens", "source")
+
+    def __init__(self):
+        self.calls = 0
+        self.tokens = 0
+        self.source = "error"
+
+
+# Shared by the tasks and threads a turn starts, like the current span
+_turn_usage: ContextVar[Optional[TurnUsage]] = ContextVar("turn_usage", default=None)
+
+
+@contextmanager
+def turn_usage() -> Iterator[TurnUsage]:
+    usage = TurnUsage()
+    token = _turn_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        try:
+            _turn_usage.reset(token)
+        except ValueError:
+            # An async generator closed from another context
+            _turn_usage.set(None)
+
+
+def record_llm_call(chain: str, model: str, seconds: float, usage: Dict[str, int]):
+    """Record one LLM call, also counting it towards the running turn"""
+    LLM_SECONDS.labels(chain, model).observe(seconds)
+    for kind in ("prompt", "completion", "cached"):
+        if usage.get(f"{kind}_tokens"):
+            LLM_TOKENS.labels(chain, kind).inc(usage[f"{kind}_tokens"])
+    current = _turn_usage.get()
+    if current is not None:
+        current.calls += 1
+        current.tokens += usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = _registry
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0].rstrip("/") not in ("", "/metrics"):
+            self.send_error(404)
+            return
+        payload = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> Optional[ThreadingHTTPServer]:
+    """Serve /metrics on a daemon thread; once per process"""
+    global _server
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError as e:
+                # e.g. another worker of this host already serves the port
+                print(f"Metrics server not started on port {port}: {str(e)}")
+                return None
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+        return _server
+
+
+def start_metrics_server_from_env() -> Optional[ThreadingHTTPServer]:
+    """Start the metrics server on METRICS_PORT, if set"""
+    port = os.getenv("METRICS_PORT")
+    if not port:
+        return None
+    return start_metrics_server(int(port), os.getenv("METRICS_HOST", "0.0.0.0"))
@@ -1,44 +1,158 @@
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 from typing import Dict, Any, Optional, Union
 from langchain_core.runnables import Runnable
 from langchain_core.pydantic_v1 import BaseModel
 from langchain.schema import SystemMessage, HumanMessage, AIMessage
+from collections import defaultdict
+import asyncio
+import threading
+import time
 import json
+from src.core.metrics import LLM_ERRORS, record_llm_call
+from src.core.routing import LatencyRouter
+from src.core.tracing import span
+
+class UsageTracker:
+    """Accumulate token usage per chain, including provider cache hits"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = defaultdict(lambda: defaultdict(int))
+        self.last = {}
+
+    def record(self, chain: str, usage: Any) -> Dict[str, int]:
+        """Add one call's usage; returns its token counts"""
+        if usage is None:
+            return {}
+        details = getattr(usage, "prompt_tokens_details", None)
+        entry = {
+            "prompt_tokens": usage.prompt_tokens or 0,
+            "completion_tokens": usage.completion_tokens or 0,
+            "cached_tokens": (getattr(details, "cached_tokens", None) or 0) if details else 0,
+        }
+        with self._lock:
+            self.last = {"chain": chain, **entry}
+            totals = self._totals[chain]
+            totals["calls"] += 1
+            for key, value in entry.items():
+                totals[key] += value
+        return entry
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        """Return totals per chain, with the share of prompt tokens served from cache"""
+        with self._lock:
+            result = {chain: dict(totals) for chain, totals in self._totals.items()}
+        for totals in result.values():
+            totals["cache_hit_ratio"] = totals["cached_tokens"] / (totals["prompt_tokens"] or 1)
+        return result
 
 class OpenAIClient(Runnable, BaseModel):
     api_key: str
     model_id: str = "gpt-4o-mini"
     client: Any = None
+    usage: Any = None
+    router: Any = None
+    latency_routing: bool = False
+    async_clients: Any = None
 
-    def __init__(self, api_key: str, model_id: str = "gpt-4o-mini", **kwargs):
-        super().__init__(api_key=api_key, model_id=model_id, **kwargs)
+    def __init__(self, api_key: str, model_id: str = "gpt-4o-mini", latency_routing: bool = False, **kwargs):
+        super().__init__(api_key=api_key, model_id=model_id, latency_routing=latency_routing, **kwargs)
+        # Honors OPENAI_BASE_URL, e.g. to point at a local stand-in server
         self.client = OpenAI(api_key=api_key)
         self.model_id = model_id
+        self.usage = UsageTracker()
+        # Latency is always observed; it only drives model choice when
+        # latency_routing is enabled
+        self.router = LatencyRouter()
+        self.async_clients = threading.local()
+
+    def _select_model(self, models: Optional[list]) -> str:
+        if not models:
+            return self.model_id
+        if self.latency_routing:
+            return self.router.select(models)
+        return models[0]
+
+    def _request_params(self, input: Union[Dict[str, Any], Any], config: Optional[Dict[str, Any]], kwargs: Dict) -> Dict:
+        # Validate and extract messages
+        messages = self._extract_messages(input)
+
+        # Filter valid OpenAI parameters
+        allowed_params = {
+            "model": self._select_model(kwargs.get("models")),
+            "messages": messages,
+            "temperature": input.get("temperature", 0.7) if isinstance(input, dict) else 0.7,
+            "max_tokens": input.get("max_tokens", 1000) if isinstance(input, dict) else 1000,
+        }
+
+        # Per-chain parameters bound with .bind(...)
+        allowed_params.update({
+            k: v for k, v in kwargs.items()
+            if k in ["temperature", "max_tokens", "stop"]
+        })
+
+        # Add valid config parameters
+        if config:
+            allowed_params.update({
+                k: v for k, v in config.items()
+                if k in ["temperature", "max_tokens", "top_p", "frequency_penalty", "presence_penalty"]
+            })
+        return allowed_params
+
+    @staticmethod
+    def _chain_name(config: Optional[Dict[str, Any]]) -> str:
+        return ((config or {}).get("metadata") or {}).get("chain", "default")
+
+    def _observe(self, params: Dict, config: Optional[Dict[str, Any]], response: Any, start: float, llm_span):
+        seconds = time.perf_counter() - start
+        self.router.observe(params["model"], seconds)
+        chain = self._chain_name(config)
+        usage = self.usage.record(chain, response.usage)
+        llm_span.set(**usage)
+        record_llm_call(chain, params["model"], seconds, usage)
 
     def invoke(self, input: Union[Dict[str, Any], Any], config: Optional[Dict[str, Any]] = None, **kwargs) -> str:
         try:
-            # Validate and extract messages
-            messages = self._extract_messages(input)
-            
-            # Filter valid OpenAI parameters
-            allowed_params = {
-                "model": self.model_id,
-                "messages": messages,
-                "temperature": input.get("temperature", 0.7) if isinstance(input, dict) else 0.7,
-                "max_tokens": input.get("max_tokens", 1000) if isinstance(input, dict) else 1000,
-            }
-            
-            # Add valid config parameters
-            if config:
-                allowed_params.update({
-                    k: v for k, v in config.items() 
-                    if k in ["temperature", "max_tokens", "top_p", "frequency_penalty", "presence_penalty"]
-                })
-
-            response = self.client.chat.completions.create(**allowed_params)
+            allowed_params = self._request_params(input, config, kwargs)
+            with span("llm", chain=self._chain_name(config), model=allowed_params["model"]) as llm_span:
+                start = time.perf_counter()
+                response = self.client.chat.completions.create(**allowed_params)
+                self._observe(allowed_params, config, response, start, llm_span)
+            return response.choices[0].message.content
+
+        except Exception as e:
+            LLM_ERRORS.labels(self._chain_name(config)).inc()
+            error_msg = f"Lỗi khi gọi OpenAI API: {str(e)}"
+            print(error_msg)
+            return error_msg
+
+    def _async_client(self) -> AsyncOpenAI:
+        # An async client is bound to the event loop it first runs on, and
+        # callers keep one long-lived loop per thread
+        local = self.async_clients
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = AsyncOpenAI(api_key=self.api_key)
+        return client
+
+    async def ainvoke(self, input: Union[Dict[str, Any], Any], config: Optional[Dict[str, Any]] = None, **kwargs) -> str:
+        """Like invoke, without blocking the event loop.
+
+        Cancelling the awaiting task aborts the HTTP request.
+        """
+        try:
+            allowed_params = self._request_params(input, config, kwargs)
+            with span("llm", chain=self._chain_name(config), model=allowed_params["model"]) as llm_span:
+                start = time.perf_counter()
+                try:
+                    response = await self._async_client().chat.completions.create(**allowed_params)
+                except asyncio.CancelledError:
+                    llm_span.set(cancelled=True)
+                    raise
+                self._observe(allowed_params, config, response, start, llm_span)
             return response.choices[0].message.content
 
         except Exception as e:
+            LLM_ERRORS.labels(self._chain_name(config)).inc()
             error_msg = f"Lỗi khi gọi OpenAI API: {str(e)}"
             print(error_msg)
             return error_msg
@@ -0,0 +1,115 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+
+import psycopg
+
+# Channel used by the orders trigger and cancel_order to announce that a
+# customer's orders changed. The payload is the customer email.
+ORDERS_CHANGED_CHANNEL = "orders_changed"
+
+
+class OrderCache:
+    """Per-email order lookup cache with TTL, LRU bound and invalidation.
+
+    Lookups take an epoch with ``begin_read()`` before querying the
+    database and pass it to ``set()``. Any invalidation in between bumps
+    the epoch, so a result read before a concurrent write is never stored.
+    """
+
+    def __init__(self, ttl_seconds: float = 30.0, max_entries: int = 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    def begin_read(self) -> int:
+        with self._lock:
+            return self._epoch
+
+    def get(self, email: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(email) if self.enabled else None
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[email]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(email)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, email: str, value: Any, epoch: int):
+        with self._lock:
+            if not self.enabled or epoch != self._epoch:
+                return
+            self._entries[email] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(email)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, email: str):
+        with self._lock:
+            self._epoch += 1
+            self._entries.pop(email, None)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+
+    def set_enabled(self, enabled: bool):
+        """Enable or bypass the cache; disabling drops every entry"""
+        with self._lock:
+            self.enabled = enabled
+            self._epoch += 1
+            if not enabled:
+                self._entries.clear()
+
+
+class OrderChangeListener(threading.Thread):
+    """Invalidate cache entries on Postgres NOTIFY from other workers.
+
+    The cache is only served while the listener is connected. On a lost
+    connection it is bypassed until LISTEN is re-established, because
+    writes made by other workers in the meantime would go unnoticed.
+    """
+
+    def __init__(
+        self,
+        cache: OrderCache,
+        conninfo: str,
+        retry_seconds: float = 5.0,
+        on_change: Optional[Callable[[str], None]] = None,
+    ):
+        super().__init__(name="order-change-listener", daemon=True)
+        self.cache = cache
+        self.conninfo = conninfo
+        self.retry_seconds = retry_seconds
+        self.on_change = on_change
+        self._stop_event = threading.Event()
+
+    def run(self):
+        self.cache.set_enabled(False)
+        while not self._stop_event.is_set():
+            try:
+                with psycopg.connect(self.conninfo, autocommit=True) as conn:
+                    conn.execute(f"LISTEN {ORDERS_CHANGED_CHANNEL}")
+                    self.cache.set_enabled(True)
+                    while not self._stop_event.is_set():
+                        for notify in conn.notifies(timeout=1.0):
+                            self.cache.invalidate(notify.payload)
+                            if self.on_change is not None:
+                                self.on_change(notify.payload)
+            except Exception as e:
+                print(f"Order change listener error: {str(e)}")
+            self.cache.set_enabled(False)
+            self._stop_event.wait(self.retry_seconds)
+
+    def stop(self):
+        self._stop_event.set()
@@ -0,0 +1,359 @@
+import os
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from psycopg.rows import class_row
+from psycopg_pool import ConnectionPool
+
+from src.core.metrics import DB_QUERY_SECONDS, get_metrics
+from src.core.order_cache import OrderCache, OrderChangeListener
+from src.core.replicas import ReplicaRouter, get_replica_router
+from src.core.tracing import span
+
+
+@dataclass
+class Order:
+    """An order row as returned by the repository"""
+    order_id: str
+    customer_email: str
+    order_detail: Dict
+    total_price: Decimal
+    status: str
+    created_at: datetime
+
+    def to_dict(self) -> Dict:
+        """JSON-friendly form used by tools and prompts"""
+        return {
+            "order_id": self.order_id,
+            "order_detail": self.order_detail,
+            "total_price": str(float(self.total_price)),
+            "status": self.status,
+            "created_at": self.created_at.isoformat(),
+        }
+
+
+# Keyset pagination position: (created_at, order_id) of the last order shown
+PageCursor = Tuple[str, str]
+
+
+@dataclass
+class OrderSummary:
+    """Aggregates over all of a customer's orders plus the newest page"""
+    email: str
+    total_orders: int
+    total_spent: Decimal
+    status_counts: Dict[str, int]
+    orders: List[Order] = field(default_factory=list)
+    next_cursor: Optional[PageCursor] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "email": self.email,
+            "total_orders": self.total_orders,
+            "total_spent": str(float(self.total_spent)),
+            "status_counts": self.status_counts,
+            "orders": [order.to_dict() for order in self.orders],
+        }
+
+
+class CancelStatus(str, Enum):
+    CANCELLED = "cancelled"
+    NOT_FOUND = "not_found"
+    INVALID_STATUS = "invalid_status"
+
+
+@dataclass
+class CancelResult:
+    order_id: str
+    status: CancelStatus
+    # Status the order had when the cancellation was attempted
+    order_status: Optional[str] = None
+
+
+ORDER_COLUMNS = "order_id, customer_email, order_detail, total_price, status, created_at"
+
+LOOKUP_SQL = f"""
+    SELECT {ORDER_COLUMNS}
+    FROM orders
+    WHERE customer_email = %s
+    ORDER BY created_at DESC, order_id DESC
+"""
+
+BULK_LOOKUP_SQL = f"""
+    SELECT {ORDER_COLUMNS}
+    FROM orders
+    WHERE customer_email = ANY(%s)
+    ORDER BY customer_email, created_at DESC
+"""
+
+SUMMARY_SQL = """
+    SELECT status, count(*), coalesce(sum(total_price), 0)
+    FROM orders
+    WHERE customer_email = %s
+    GROUP BY status
+"""
+
+# Both page queries walk the (customer_email, created_at DESC, order_id DESC)
+# index and stop after limit + 1 rows, whatever the customer's order count
+FIRST_PAGE_SQL = f"""
+    SELECT {ORDER_COLUMNS}
+    FROM orders
+    WHERE customer_email = %s
+    ORDER BY created_at DESC, order_id DESC
+    LIMIT %s
+"""
+
+NEXT_PAGE_SQL = f"""
+    SELECT {ORDER_COLUMNS}
+    FROM orders
+    WHERE customer_email = %s AND (created_at, order_id) < (%s, %s)
+    ORDER BY created_at DESC, order_id DESC
+    LIMIT %s
+"""
+
+# Matches the idx_orders_pending partial index predicate
+PENDING_SQL = f"""
+    SELECT {ORDER_COLUMNS}
+    FROM orders
+    WHERE customer_email = %s AND status = 'pending'
+    ORDER BY created_at DESC, order_id DESC
+    LIMIT %s
+"""
+
+LOOKUP_BY_IDS_SQL = f"""
+    SELECT {ORDER_COLUMNS}
+    FROM orders
+    WHERE order_id = ANY(%s)
+"""
+
+# Lock the order, cancel it only if pending and report what happened, all
+# in one statement. A concurrent cancel blocks on the row lock and then
+# sees the committed 'cancelled' status. The orders triggers notify caches
+# on commit.
+CANCEL_SQL = """
+    WITH target AS (
+        SELECT order_id, status
+        FROM orders
+        WHERE customer_email = %(email)s AND order_id = %(order_id)s
+        FOR UPDATE
+    ), updated AS (
+        UPDATE orders
+        SET status = 'cancelled', updated_at = %(updated_at)s
+        WHERE order_id IN (SELECT order_id FROM target WHERE lower(status) = 'pending')
+        RETURNING order_id
+    )
+    SELECT target.status, updated.order_id IS NOT NULL AS cancelled
+    FROM target LEFT JOIN updated USING (order_id)
+"""
+
+
+class OrderRepository:
+    """Orders data access over a connection pool.
+
+    Statements are prepared on each pooled connection, bulk operations use
+    pipeline mode or ``= ANY`` arrays, and rows are built directly into
+    Order objects. Order summaries go through an optional OrderCache,
+    which is invalidated by cancellations.
+
+    With a ReplicaRouter, reads go to replicas keyed by customer email, so
+    a customer's reads after their own cancellation still see it. Writes
+    always use ``pool``, the primary.
+    """
+
+    def __init__(
+        self,
+        pool: ConnectionPool,
+        cache: Optional[OrderCache] = None,
+        router: Optional[ReplicaRouter] = None,
+    ):
+        self.pool = pool
+        self.cache = cache
+        self.router = router
+
+    def _read_connection(self, email: Optional[str] = None):
+        if self.router is not None:
+            return self.router.connection(key=email)
+        return self.pool.connection()
+
+    def get_orders(self, email: str) -> List[Order]:
+        """Get all of a customer's orders, newest first"""
+        with span("db.orders") as db_span, DB_QUERY_SECONDS.labels("orders").time(), self._read_connection(email) as conn:
+            with conn.cursor(row_factory=class_row(Order)) as cur:
+                orders = cur.execute(LOOKUP_SQL, (email,), prepare=True).fetchall()
+            db_span.set(rows=len(orders))
+        return orders
+
+    def iter_orders(self, email: str, batch_size: int = 1000) -> Iterator[Order]:
+        """Stream all of a customer's orders through a server-side cursor"""
+        with self._read_connection(email) as conn:
+            with conn.cursor(name="iter_orders", row_factory=class_row(Order)) as cur:
+                cur.itersize = batch_size
+                cur.execute(LOOKUP_SQL, (email,))
+                yield from cur
+
+    def get_order_summary(self, email: str, limit: int = 5) -> OrderSummary:
+        """Counts by status, total spent and the newest page of orders.
+
+        Aggregates are computed by Postgres, and both queries are
+        pipelined into one round trip.
+        """
+        with span("db.order_summary") as db_span, DB_QUERY_SECONDS.labels("order_summary").time():
+            summary, cache_hit = self._order_summary(email, limit)
+            db_span.set(cache_hit=cache_hit, rows=len(summary.orders))
+        return summary
+
+    def _order_summary(self, email: str, limit: int) -> Tuple[OrderSummary, bool]:
+        if self.cache is not None:
+            cached = self.cache.get(email)
+            # Reusable if it holds exactly this page size, or all orders
+            if cached is not None and (
+                len(cached.orders) == limit
+                or (cached.next_cursor is None and len(cached.orders) < limit)
+            ):
+                return cached, True
+            epoch = self.cache.begin_read()
+
+        with self._read_connection(email) as conn:
+            with conn.pipeline():
+                totals = conn.cursor()
+                totals.execute(SUMMARY_SQL, (email,), prepare=True)
+                page = conn.cursor(row_factory=class_row(Order))
+                page.execute(FIRST_PAGE_SQL, (email, limit + 1), prepare=True)
+            status_rows = totals.fetchall()
+            orders = page.fetchall()
+
+        summary = OrderSummary(
+            email=email,
+            total_orders=sum(count for _, count, _ in status_rows),
+            total_spent=sum((total for _, _, total in status_rows), Decimal(0)),
+            status_counts={status: count for status, count, _ in status_rows},
+        )
+        summary.orders, summary.next_cursor = self._split_page(orders, limit)
+
+        if self.cache is not None:
+            self.cache.set(email, summary, epoch)
+        return summary, False
+
+    def get_order_page(
+        self, email: str, cursor: PageCursor, limit: int = 5
+    ) -> Tuple[List[Order], Optional[PageCursor]]:
+        """Get the page of orders after cursor, and the cursor for the next one"""
+        created_at, order_id = cursor
+        with span("db.order_page") as db_span, DB_QUERY_SECONDS.labels("order_page").time(), self._read_connection(email) as conn:
+            with conn.cursor(row_factory=class_row(Order)) as cur:
+                orders = cur.execute(
+                    NEXT_PAGE_SQL,
+                    (email, datetime.fromisoformat(created_at), order_id, limit + 1),
+                    prepare=True,
+                ).fetchall()
+            db_span.set(rows=len(orders))
+        return self._split_page(orders, limit)
+
+    @staticmethod
+    def _split_page(orders: List[Order], limit: int) -> Tuple[List[Order], Optional[PageCursor]]:
+        """Trim the extra row fetched to detect whether another page exists"""
+        if len(orders) <= limit:
+            return orders, None
+        last = orders[limit - 1]
+        return orders[:limit], (last.created_at.isoformat(), last.order_id)
+
+    def get_pending_orders(self, email: str, limit: int = 5) -> List[Order]:
+        """Get a customer's newest cancellable orders"""
+        with span("db.pending_orders") as db_span, DB_QUERY_SECONDS.labels("pending_orders").time(), self._read_connection(email) as conn:
+            with conn.cursor(row_factory=class_row(Order)) as cur:
+                orders = cur.execute(PENDING_SQL, (email, limit), prepare=True).fetchall()
+            db_span.set(rows=len(orders))
+        return orders
+
+    def get_orders_bulk(self, emails: Iterable[str]) -> Dict[str, List[Order]]:
+        """Get orders for many customers in one query"""
+        emails = list(dict.fromkeys(emails))
+        results: Dict[str, List[Order]] = {email: [] for email in emails}
+        with self._read_connection() as conn:
+            with conn.cursor(row_factory=class_row(Order)) as cur:
+                for order in cur.execute(BULK_LOOKUP_SQL, (emails,), prepare=True):
+                    results[order.customer_email].append(order)
+        return results
+
+    def get_orders_by_ids(self, order_ids: Iterable[str]) -> List[Order]:
+        """Get orders by ID in one query"""
+        with self._read_connection() as conn:
+            with conn.cursor(row_factory=class_row(Order)) as cur:
+                return cur.execute(LOOKUP_BY_IDS_SQL, (list(order_ids),), prepare=True).fetchall()
+
+    def cancel(self, email: str, order_id: str) -> CancelResult:
+        """Cancel a pending order in a single round trip"""
+        with span("db.cancel") as db_span, DB_QUERY_SECONDS.labels("cancel").time():
+            result = self.cancel_many([(email, order_id)])[0]
+            db_span.set(status=result.status.value)
+        return result
+
+    def cancel_many(self, requests: Iterable[Tuple[str, str]]) -> List[CancelResult]:
+        """Cancel several (email, order_id) pairs, pipelined in one transaction"""
+        requests = list(requests)
+        now = datetime.now()
+        with self.pool.connection() as conn:
+            cursors = []
+            with conn.pipeline():
+                for email, order_id in requests:
+                    cur = conn.cursor()
+                    cur.execute(
+                        CANCEL_SQL,
+                        {"email": email, "order_id": order_id, "updated_at": now},
+                        prepare=True,
+                    )
+                    cursors.append(cur)
+            rows = [cur.fetchone() for cur in cursors]
+            conn.commit()
+            if self.router is not None:
+                cancelled = [email for (email, _), row in zip(requests, rows) if row and row[1]]
+                self.router.record_write_from(conn, cancelled)
+
+        results = []
+        for (email, order_id), row in zip(requests, rows):
+            if row is None:
+                results.append(CancelResult(order_id, CancelStatus.NOT_FOUND))
+                continue
+            status, cancelled = row
+            if cancelled:
+                if self.cache is not None:
+                    self.cache.invalidate(email)
+                results.append(CancelResult(order_id, CancelStatus.CANCELLED, status))
+            else:
+                results.append(CancelResult(order_id, CancelStatus.INVALID_STATUS, status))
+        return results
+
+
+_repository: Optional[OrderRepository] = None
+_repository_lock = threading.Lock()
+
+
+def get_order_repository() -> OrderRepository:
+    """Process-wide repository with its cache and change listener, on the
+    shared primary pool and replica router
+    """
+    global _repository
+    with _repository_lock:
+        if _repository is None:
+            router = get_replica_router()
+            cache = OrderCache(
+                ttl_seconds=float(os.getenv("ORDER_CACHE_TTL", "30")),
+                max_entries=int(os.getenv("ORDER_CACHE_SIZE", "1024")),
+            )
+            # Keep cached lookups consistent with writes from other workers
+            # Writes from other workers also pin that customer's reads to
+            # the primary until replicas have caught up
+            if os.getenv("ORDER_CACHE_LISTEN", "true").lower() in ("1", "true"):
+                OrderChangeListener(cache, router.primary.conninfo, on_change=router.record_write).start()
+            _repository = OrderRepository(router.primary.pool, cache, router)
+            get_metrics().callback(
+                "chat_order_cache",
+                "Order summary cache lookups by result (hit, miss)",
+                lambda: [({"result": "hit"}, cache.hits), ({"result": "miss"}, cache.misses)],
+                kind="counter",
+            )
+        return _repository
@@ -1,51 +1,289 @@
+import hashlib
+import heapq
 import logging
+import math
+import re
 import psycopg
-from typing import List, Dict, Any, Optional
+from psycopg import sql
+from psycopg.types.json import Jsonb
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextvars import copy_context
+from typing import List, Dict, Any, Iterable, Optional, Sequence, Tuple, Union
 import json
 import os
 
+from src.core.db import get_shard_connection_strings
+from src.core.metrics import SIMILARITY_BUCKETS, get_metrics
+from src.core.quantization import binary_quantize
+from src.core.replicas import ReplicaRouter, get_replica_router
+from src.core.tracing import span
+
 logger = logging.getLogger(__name__)
 
-class PGVector:
-    def __init__(self):
-        self._init_db()
+SEARCH_SECONDS = get_metrics().histogram(
+    "chat_vector_search_seconds", "FAQ vector search latency, per shard when sharded", ("rerank",)
+)
+TOP_SIMILARITY = get_metrics().histogram(
+    "chat_vector_search_top_similarity",
+    "Similarity of the best match of searches that returned any, per shard when sharded",
+    buckets=SIMILARITY_BUCKETS,
+)
 
-    def _get_connection_string(self):
-        """Get database connection string from environment variables"""
-        host = os.getenv('PGHOST', 'localhost')
-        user = os.getenv('PGUSER', 'postgres')
-        password = os.getenv('PGPASSWORD', 'postgres')
-        database = os.getenv('PGDATABASE', 'postgres')
-        return f"postgresql://{user}:{password}@{host}:5432/{database}"
+DOCUMENTS_TABLE = "documents"
 
-    def _init_db(self):
-        with psycopg.connect(self._get_connection_string()) as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-          CREATE TABLE IF NOT EXISTS documents (
+# Formatted with the table name, so reindex_faq.py can build a staging copy
+CREATE_DOCUMENTS_TABLE_SQL = """
+          CREATE TABLE IF NOT EXISTS {table} (
           id SERIAL PRIMARY KEY,
           question TEXT NOT NULL,
           answer TEXT NOT NULL,
+          category TEXT,
           metadata JSONB,
           embedding vector(1536),
+          embedding_bits BIT(1536),
           created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP)
         """
-                )
 
-                cur.execute(
-                    """
-          CREATE INDEX IF NOT EXISTS documents_embedding_idx 
-          ON documents USING vchordrq (embedding vector_l2_ops)
+# Tables created before the category column stored the category as a JSON
+# string in metadata, and had no binary codes. Each upgrade only runs when
+# its column is missing, so a start doesn't lock or scan the table.
+UPGRADE_DOCUMENTS_SQL = {
+    "category": [
+        "ALTER TABLE {table} ADD COLUMN IF NOT EXISTS category TEXT",
+        """
+          UPDATE {table}
+          SET category = metadata #>> '{{}}',
+              metadata = jsonb_build_object('category', metadata #>> '{{}}')
+          WHERE jsonb_typeof(metadata) = 'string'
+        """,
+    ],
+    "embedding_bits": ["ALTER TABLE {table} ADD COLUMN IF NOT EXISTS embedding_bits BIT(1536)"],
+}
+
+TABLE_COLUMNS_SQL = """
+          SELECT attname FROM pg_attribute
+          WHERE attrelid = to_regclass(%s) AND attnum > 0 AND NOT attisdropped
+        """
+
+# Codes for rows written before the embedding_bits column. Only needed by
+# two-stage search, and run once, before its index is built.
+BACKFILL_BITS_SQL = """
+          UPDATE {table}
+          SET embedding_bits = (
+              SELECT string_agg(CASE WHEN x > 0 THEN '1' ELSE '0' END, '' ORDER BY i)
+              FROM unnest(embedding::real[]) WITH ORDINALITY AS t(x, i)
+          )::bit(1536)
+          WHERE embedding_bits IS NULL AND embedding IS NOT NULL
+        """
+
+# Cosine ops, matching the <=> operator used by similarity_search
+CREATE_EMBEDDING_INDEX_SQL = """
+          CREATE INDEX IF NOT EXISTS {table}_embedding_idx
+          ON {table} USING vchordrq (embedding vector_cosine_ops)
           WITH (options = $$
           residual_quantization = true
           [build.internal]
           lists = [4096]
-          spherical_centroids = false
+          spherical_centroids = true
           $$)
         """
-                )
-                conn.commit()
+
+# Hamming ops, matching the <~> operator of the two-stage search's first
+# stage. Bit vector support needs pgvector 0.7.
+CREATE_BITS_INDEX_SQL = """
+          CREATE INDEX IF NOT EXISTS {table}_embedding_bits_idx
+          ON {table} USING hnsw (embedding_bits bit_hamming_ops)
+        """
+MIN_BITS_PGVECTOR_VERSION = (0, 7)
+
+# Operator class of an index's first column; NULL when the index is missing
+INDEX_OPCLASS_SQL = """
+          SELECT opc.opcname
+          FROM pg_index i JOIN pg_opclass opc ON opc.oid = i.indclass[0]
+          WHERE i.indexrelid = to_regclass(%s)
+        """
+
+CREATE_METADATA_INDEX_SQL = [
+    "CREATE INDEX IF NOT EXISTS {table}_metadata_idx ON {table} USING gin (metadata jsonb_path_ops)",
+    "CREATE INDEX IF NOT EXISTS {table}_category_idx ON {table} (category)",
+]
+
+# A vector index over one category's rows, used by searches restricted to
+# that category. Categories are small, hence a few lists.
+CREATE_CATEGORY_INDEX_SQL = """
+          CREATE INDEX IF NOT EXISTS {table}_embedding_{slug}_idx
+          ON {table} USING vchordrq (embedding vector_cosine_ops)
+          WITH (options = $$
+          residual_quantization = true
+          [build.internal]
+          lists = [{lists}]
+          spherical_centroids = true
+          $$)
+          WHERE category = {category}
+        """
+
+
+def normalize_metadata(metadata: Any) -> Tuple[Dict, Optional[str]]:
+    """Metadata as a JSON object, and its category.
+
+    The FAQ files give the category as a bare string.
+    """
+    if isinstance(metadata, str):
+        metadata = {"category": metadata} if metadata else {}
+    metadata = dict(metadata or {})
+    return metadata, metadata.get("category")
+
+
+def category_indexes_from_env() -> Union[List[str], str]:
+    """PGVECTOR_CATEGORY_INDEXES: ``all`` or a comma-separated list of categories"""
+    value = os.getenv("PGVECTOR_CATEGORY_INDEXES", "").strip()
+    if value == "all":
+        return value
+    return [category.strip() for category in value.split(",") if category.strip()]
+
+
+def pgvector_version(conn: psycopg.Connection) -> Tuple[int, ...]:
+    """Installed version of the vector extension"""
+    version = conn.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector'").fetchone()[0]
+    return tuple(int(part) for part in re.findall(r"\d+", version))
+
+
+def hnsw_ef_search(candidates: int) -> int:
+    """hnsw.ef_search that lets the index return ``candidates`` rows,
+    within pgvector's default and maximum
+    """
+    return min(max(candidates, 40), 1000)
+
+
+def create_documents_indexes(
+    conn: psycopg.Connection,
+    table: str,
+    category_indexes: Union[Sequence[str], str] = (),
+    bits_index: bool = False,
+):
+    """Create the vector, metadata and per-category indexes of a documents
+    table, and with ``bits_index`` the binary code index of two-stage search
+    """
+    # Tables from before cosine search have an L2 index under the same
+    # name, which IF NOT EXISTS would keep
+    opclass = conn.execute(INDEX_OPCLASS_SQL, (f"{table}_embedding_idx",)).fetchone()
+    if opclass and opclass[0] != "vector_cosine_ops":
+        logger.info(f"Rebuilding {table}_embedding_idx with vector_cosine_ops (was {opclass[0]})")
+        conn.execute(f"DROP INDEX {table}_embedding_idx")
+    conn.execute(CREATE_EMBEDDING_INDEX_SQL.format(table=table))
+    if bits_index:
+        conn.execute(CREATE_BITS_INDEX_SQL.format(table=table))
+    for statement in CREATE_METADATA_INDEX_SQL:
+        conn.execute(statement.format(table=table))
+
+    counts = dict(conn.execute(
+        f"SELECT category, count(*) FROM {table} WHERE category IS NOT NULL GROUP BY category"
+    ).fetchall())
+    categories = sorted(counts) if category_indexes == "all" else category_indexes
+    for category in categories:
+        conn.execute(CREATE_CATEGORY_INDEX_SQL.format(
+            table=table,
+            slug=re.sub(r"\W", "_", category.lower()),
+            lists=max(1, int(math.sqrt(counts.get(category, 0)))),
+            category=sql.Literal(category).as_string(conn),
+        ))
+
+
+SEARCH_SQL = """
+            SELECT 
+                question,
+                answer,
+                category,
+                metadata,
+                1 - (embedding <=> %(embedding)s::vector) as similarity
+            FROM documents
+            WHERE 1=1 
+                {category_condition}
+                {filter_condition}
+                AND 1 - (embedding <=> %(embedding)s::vector) >= %(threshold)s
+            ORDER BY embedding <=> %(embedding)s::vector
+            LIMIT %(k)s
+            """
+
+# The candidates come from the embedding_bits HNSW index, ordered by Hamming
+# distance. They carry their columns, so the exact distance is only
+# computed for them; joining back on id let the planner compute it for
+# every row.
+TWO_STAGE_SEARCH_SQL = """
+            WITH candidates AS MATERIALIZED (
+                SELECT question, answer, category, metadata, embedding
+                FROM documents
+                WHERE 1=1
+                    {category_condition}
+                    {filter_condition}
+                ORDER BY embedding_bits <~> %(bits)s::bit(1536)
+                LIMIT %(candidates)s
+            )
+            SELECT
+                question,
+                answer,
+                category,
+                metadata,
+                1 - (embedding <=> %(embedding)s::vector) as similarity
+            FROM candidates
+            WHERE 1 - (embedding <=> %(embedding)s::vector) >= %(threshold)s
+            ORDER BY embedding <=> %(embedding)s::vector
+            LIMIT %(k)s
+            """
+
+
+class PGVector:
+    def __init__(
+        self,
+        router: Optional[ReplicaRouter] = None,
+        statement_timeout_ms: Optional[int] = None,
+        category_indexes: Union[Sequence[str], str, None] = None,
+        rerank_multiplier: Optional[int] = None,
+        probes: Optional[str] = None,
+        epsilon: Optional[float] = None,
+    ):
+        # Searches are read-only and may be served by a replica
+        self.router = router or get_replica_router()
+        # Server-side limit on searches, so abandoned ones don't keep running
+        self.statement_timeout_ms = statement_timeout_ms
+        # Categories with their own partial vector index, or "all"
+        self.category_indexes = category_indexes_from_env() if category_indexes is None else category_indexes
+        # Two-stage search: k * rerank_multiplier candidates by Hamming
+        # distance between binary codes, reranked by exact cosine. 0 is exact.
+        if rerank_multiplier is None:
+            rerank_multiplier = int(os.getenv("PGVECTOR_RERANK_MULTIPLIER", "0"))
+        self.rerank_multiplier = rerank_multiplier
+        # vchordrq search settings; unset keeps the server's defaults
+        self.probes = probes if probes is not None else os.getenv("PGVECTOR_PROBES")
+        if epsilon is None and os.getenv("PGVECTOR_EPSILON"):
+            epsilon = float(os.getenv("PGVECTOR_EPSILON"))
+        self.epsilon = epsilon
+        self._init_db()
+
+    def _get_connection_string(self):
+        """Connection string of the primary holding the documents table"""
+        return self.router.primary.conninfo
+
+    def _init_db(self):
+        with psycopg.connect(self._get_connection_string()) as conn:
+            conn.execute(CREATE_DOCUMENTS_TABLE_SQL.format(table=DOCUMENTS_TABLE))
+            columns = {name for (name,) in conn.execute(TABLE_COLUMNS_SQL, (DOCUMENTS_TABLE,))}
+            for column, statements in UPGRADE_DOCUMENTS_SQL.items():
+                if column not in columns:
+                    for statement in statements:
+                        conn.execute(statement.format(table=DOCUMENTS_TABLE))
+            if self.rerank_multiplier:
+                if pgvector_version(conn) < MIN_BITS_PGVECTOR_VERSION:
+                    raise ValueError("Two-stage search needs pgvector 0.7 or later for its Hamming distance index")
+                bits_index = conn.execute(
+                    "SELECT to_regclass(%s)", (f"{DOCUMENTS_TABLE}_embedding_bits_idx",)
+                ).fetchone()[0]
+                if bits_index is None:
+                    conn.execute(BACKFILL_BITS_SQL.format(table=DOCUMENTS_TABLE))
+            create_documents_indexes(
+                conn, DOCUMENTS_TABLE, self.category_indexes, bits_index=bool(self.rerank_multiplier)
+            )
+            conn.commit()
 
     def add_documents(self, documents: List[Dict], get_embedding_fn) -> List[int]:
         """
@@ -65,20 +303,20 @@ class PGVector:
                 for doc in documents:
                     all_questions = doc.get("variations", [])
                     answer = doc.get("answer", "")
-                    metadata = doc.get("metadata", "")
+                    metadata, category = normalize_metadata(doc.get("metadata"))
 
-                embeddings = get_embedding_fn(all_questions)
+                    embeddings = get_embedding_fn(all_questions)
 
-                for question, embedding in zip(all_questions, embeddings):
-                    cur.execute(
-                        """
-              INSERT INTO documents (question, answer, embedding, metadata)
-              VALUES (%s, %s, %s, %s)
+                    for question, embedding in zip(all_questions, embeddings):
+                        cur.execute(
+                            """
+              INSERT INTO documents (question, answer, category, embedding, embedding_bits, metadata)
+              VALUES (%s, %s, %s, %s, %s, %s)
               RETURNING id;
               """,
-                        (question, answer, embedding, json.dumps(metadata)),
-                    )
-                    doc_ids.append(cur.fetchone()[0])
+                            (question, answer, category, embedding, binary_quantize(embedding), Jsonb(metadata)),
+                        )
+                        doc_ids.append(cur.fetchone()[0])
             conn.commit()
         return doc_ids
 
@@ -88,33 +326,79 @@ class PGVector:
         k: int = 3,
         filter_metadata: Dict = None,
         similarity_threshold: float = 0.8,
+        categories: Optional[Sequence[str]] = None,
     ):
-        with psycopg.connect(self._get_connection_string()) as conn:
+        """Nearest documents by cosine similarity.
+
+        With ``categories`` only those categories are searched, one
+        subquery each. The category is inlined as a literal so the
+        planner can pick the category's partial index.
+
+        With a rerank multiplier, the candidates are the rows nearest in
+        Hamming distance between binary codes, which is much cheaper to
+        scan than full vectors, and only those are compared exactly.
+        """
+        rerank = bool(self.rerank_multiplier)
+        with span("vector_search", k=k, categories=len(categories or []), rerank=rerank) as search_span:
+            with SEARCH_SECONDS.labels(str(rerank).lower()).time():
+                results = self._search(query_embedding, k, filter_metadata, similarity_threshold, categories)
+            search_span.set(rows=len(results))
+        if results:
+            TOP_SIMILARITY.observe(results[0]["similarity"])
+        return results
+
+    def _search(
+        self,
+        query_embedding: List[float],
+        k: int,
+        filter_metadata: Optional[Dict],
+        similarity_threshold: float,
+        categories: Optional[Sequence[str]],
+    ) -> List[Dict]:
+        with self.router.connection() as conn:
             with conn.cursor() as cur:
+                if self.statement_timeout_ms:
+                    cur.execute(f"SET LOCAL statement_timeout = {int(self.statement_timeout_ms)}")
+                if self.probes or self.epsilon is not None:
+                    cur.execute(
+                        "SELECT set_config('vchordrq.probes', coalesce(%s, current_setting('vchordrq.probes')), true),"
+                        " set_config('vchordrq.epsilon', coalesce(%s, current_setting('vchordrq.epsilon')), true)",
+                        (self.probes, None if self.epsilon is None else str(self.epsilon)),
+                    )
                 filter_condition = ""
-                params = [query_embedding]
+                params = {"embedding": query_embedding, "threshold": similarity_threshold, "k": k}
 
                 if filter_metadata:
-                    filter_condition = "AND metadata @> %s::jsonb"
-                    params.append(json.dumps(filter_metadata))
+                    filter_condition = "AND metadata @> %(filter)s::jsonb"
+                    params["filter"] = json.dumps(filter_metadata)
 
-                cur.execute(
-                    f"""
-            SELECT 
-                question,
-                answer,
-                metadata,
-                1 - (embedding <=> %s::vector) as similarity
-            FROM documents
-            WHERE 1=1 
-                {filter_condition}
-                AND 1 - (embedding <=> %s::vector) >= %s
-            ORDER BY embedding <=> %s::vector
-            LIMIT %s;
-            """,
-                    params
-                    + [query_embedding, similarity_threshold, query_embedding, k],
-                )
+                category_conditions = [""]
+                if categories:
+                    category_conditions = [
+                        sql.SQL("AND category = {}").format(sql.Literal(category)).as_string(conn)
+                        for category in categories
+                    ]
+
+                if self.rerank_multiplier:
+                    params["bits"] = binary_quantize(query_embedding)
+                    params["candidates"] = k * self.rerank_multiplier
+                    # The index returns at most ef_search rows
+                    cur.execute(
+                        "SELECT set_config('hnsw.ef_search', %s, true)",
+                        (str(hnsw_ef_search(params["candidates"])),),
+                    )
+                    template = TWO_STAGE_SEARCH_SQL
+                else:
+                    template = SEARCH_SQL
+                slices = [
+                    template.format(category_condition=category_condition, filter_condition=filter_condition)
+                    for category_condition in category_conditions
+                ]
+                query = slices[0]
+                if len(slices) > 1:
+                    union = " UNION ALL ".join(f"({part})" for part in slices)
+                    query = f"SELECT * FROM ({union}) AS hits ORDER BY similarity DESC LIMIT %(k)s"
+                cur.execute(query, params)
 
                 results = []
                 for row in cur.fetchall():
@@ -122,8 +406,9 @@ class PGVector:
                         {
                             "question": row[0],
                             "answer": row[1],
-                            "metadata": row[2],
-                            "similarity": row[3],
+                            "category": row[2],
+                            "metadata": row[3],
+                            "similarity": row[4],
                         }
                     )
 
@@ -137,3 +422,123 @@ class PGVector:
                 deleted = cur.rowcount > 0
             conn.commit()
         return deleted
+
+
+class SearchResults(list):
+    """Merged search results; ``failed_shards`` lists shards that did not
+    answer in time, in which case the results are partial
+    """
+
+    def __init__(self, results: Iterable[Dict] = (), failed_shards: Iterable[int] = ()):
+        super().__init__(results)
+        self.failed_shards = list(failed_shards)
+
+    @property
+    def partial(self) -> bool:
+        return bool(self.failed_shards)
+
+
+def shard_for(key: str, num_shards: int) -> int:
+    """Stable shard index of a document key"""
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % num_shards
+
+
+class ShardedPGVector:
+    """FAQ documents hash-partitioned across several Postgres instances.
+
+    A document and all its variations live on the shard picked by hashing
+    its key (``id``, else ``original_question``, else the answer), so
+    changing the number of shards means reloading the corpus. Searches fan
+    out to every shard in parallel and the per-shard top-k are merged by
+    similarity. Shards that fail or miss ``shard_timeout`` are left out
+    and reported on the returned SearchResults.
+
+    Document IDs are global: ``local_id * num_shards + shard``.
+    """
+
+    def __init__(self, shards: List[PGVector], shard_timeout: float = 0.5):
+        self.shards = shards
+        self.shard_timeout = shard_timeout
+        # Spare workers so searches still running after a timeout don't
+        # hold up the next fan-out
+        self._executor = ThreadPoolExecutor(
+            max_workers=4 * len(shards), thread_name_prefix="pgvector-shard"
+        )
+
+    @classmethod
+    def from_conninfos(cls, conninfos: List[str], shard_timeout: float = 0.5) -> "ShardedPGVector":
+        timeout_ms = int(shard_timeout * 1000)
+        return cls(
+            [PGVector(ReplicaRouter(conninfo), statement_timeout_ms=timeout_ms) for conninfo in conninfos],
+            shard_timeout,
+        )
+
+    @staticmethod
+    def document_key(doc: Dict) -> str:
+        return str(doc.get("id") or doc.get("original_question") or doc.get("answer", ""))
+
+    def add_documents(self, documents: List[Dict], get_embedding_fn) -> List[int]:
+        """Add documents to their shards and return their global IDs"""
+        by_shard: Dict[int, List[Dict]] = {}
+        for doc in documents:
+            by_shard.setdefault(shard_for(self.document_key(doc), len(self.shards)), []).append(doc)
+
+        doc_ids = []
+        for shard, docs in by_shard.items():
+            local_ids = self.shards[shard].add_documents(docs, get_embedding_fn)
+            doc_ids.extend(local_id * len(self.shards) + shard for local_id in local_ids)
+        return doc_ids
+
+    def similarity_search(
+        self,
+        query_embedding: List[float],
+        k: int = 3,
+        filter_metadata: Dict = None,
+        similarity_threshold: float = 0.8,
+        categories: Optional[Sequence[str]] = None,
+    ) -> SearchResults:
+        with span("vector_search.sharded", shards=len(self.shards)) as search_span:
+            # Each shard search runs in a copy of this context, so its span nests here
+            futures = {
+                self._executor.submit(
+                    copy_context().run,
+                    shard.similarity_search, query_embedding, k, filter_metadata, similarity_threshold, categories,
+                ): index
+                for index, shard in enumerate(self.shards)
+            }
+            done, not_done = wait(futures, timeout=self.shard_timeout)
+            search_span.set(timed_out=len(not_done))
+
+        results, failed = [], [futures[future] for future in not_done]
+        for future in done:
+            index = futures[future]
+            try:
+                shard_results = future.result()
+            except Exception as e:
+                logger.warning(f"Shard {index} search failed: {e}")
+                failed.append(index)
+                continue
+            results.extend({**result, "shard": index} for result in shard_results)
+        if not_done:
+            logger.warning(f"Shards {sorted(futures[f] for f in not_done)} timed out after {self.shard_timeout}s")
+
+        return SearchResults(
+            heapq.nlargest(k, results, key=lambda result: result["similarity"]),
+            sorted(failed),
+        )
+
+    def delete_document(self, doc_id: int) -> bool:
+        """Delete a document by its global ID"""
+        shard, local_id = doc_id % len(self.shards), doc_id // len(self.shards)
+        return self.shards[shard].delete_document(local_id)
+
+
+def get_vector_store() -> Union[PGVector, ShardedPGVector]:
+    """Sharded store over PGVECTOR_SHARD_HOSTS if set, else the main database"""
+    conninfos = get_shard_connection_strings()
+    if conninfos:
+        return ShardedPGVector.from_conninfos(
+            conninfos, shard_timeout=float(os.getenv("PGVECTOR_SHARD_TIMEOUT", "0.5"))
+        )
+    return PGVector()
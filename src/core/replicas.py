@@ -0,0 +1,287 @@
+import itertools
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import psycopg
+from psycopg.conninfo import conninfo_to_dict
+from psycopg_pool import ConnectionPool, PoolTimeout
+
+from src.core.db import get_connection_string, get_replica_connection_strings
+from src.core.metrics import get_metrics
+
+# WAL positions are compared as byte offsets
+CURRENT_LSN_SQL = "SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), '0/0')::bigint"
+
+REPLICA_HEALTH_SQL = """
+    SELECT
+        pg_is_in_recovery(),
+        pg_wal_lsn_diff(pg_last_wal_replay_lsn(), '0/0')::bigint,
+        extract(epoch FROM now() - pg_last_xact_replay_timestamp())
+"""
+
+
+class DatabaseNode:
+    """A Postgres server, its connection pool and its last health check"""
+
+    def __init__(self, name: str, conninfo: str, pool_size: int):
+        self.name = name
+        self.conninfo = conninfo
+        params = conninfo_to_dict(conninfo)
+        # Identifies the pool in metrics without the credentials
+        self.server = f"{params.get('host', '')}:{params.get('port', 5432)}/{params.get('dbname', '')}"
+        self.pool = ConnectionPool(conninfo, min_size=1, max_size=pool_size, name=name, open=True)
+        self.healthy = True
+        # Smoothed health check round trip
+        self.latency: Optional[float] = None
+        # WAL replayed so far; None for a server that is not a standby
+        self.replay_lsn: Optional[int] = None
+        self.lag_seconds: Optional[float] = None
+        self.reads = 0
+
+    def observe_latency(self, seconds: float, alpha: float = 0.3):
+        self.latency = seconds if self.latency is None else alpha * seconds + (1 - alpha) * self.latency
+
+
+class ReplicaRouter:
+    """Route read-only work to healthy replicas and everything else to the primary.
+
+    Replicas are health-checked in a background thread and dropped from
+    rotation while unreachable or lagging more than ``max_lag_seconds``
+    behind the primary. Reads are spread round-robin or sent to the
+    replica with the lowest health check latency.
+
+    Reads keyed by a customer (e.g. their email) see that customer's own
+    writes: after ``record_write`` they go to the primary until a replica
+    has replayed the write's WAL position, as of its last health check, or
+    for ``read_your_writes_seconds`` when the position is unknown (writes
+    seen through NOTIFY, or stand-in replicas that are not standbys). Pins
+    with a position are kept until every replica has replayed it, and at
+    most ``read_your_writes_max_seconds``; a replica lagging that far is
+    out of rotation unless ``max_lag_seconds`` is larger.
+    """
+
+    def __init__(
+        self,
+        primary_conninfo: str,
+        replica_conninfos: List[str] = (),
+        strategy: str = "round_robin",
+        primary_pool_size: int = 10,
+        replica_pool_size: int = 10,
+        health_interval: float = 5.0,
+        max_lag_seconds: float = 5.0,
+        read_your_writes_seconds: float = 5.0,
+        read_your_writes_max_seconds: float = 60.0,
+        acquire_timeout: float = 2.0,
+    ):
+        if strategy not in ("round_robin", "least_latency"):
+            raise ValueError(f"Unknown replica strategy: {strategy}")
+        self.strategy = strategy
+        self.health_interval = health_interval
+        self.max_lag_seconds = max_lag_seconds
+        self.read_your_writes_seconds = read_your_writes_seconds
+        self.read_your_writes_max_seconds = read_your_writes_max_seconds
+        self.acquire_timeout = acquire_timeout
+        self.primary = DatabaseNode("primary", primary_conninfo, primary_pool_size)
+        self.replicas = [
+            DatabaseNode(f"replica-{i}", conninfo, replica_pool_size)
+            for i, conninfo in enumerate(replica_conninfos)
+        ]
+        # key -> (WAL position of the write or None, monotonic time of the write)
+        self._writes: Dict[str, Tuple[Optional[int], float]] = {}
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._health_thread: Optional[threading.Thread] = None
+        _routers.add(self)
+        if self.replicas:
+            self.check_health()
+            self._health_thread = threading.Thread(
+                target=self._health_loop, name="replica-health", daemon=True
+            )
+            self._health_thread.start()
+
+    def check_health(self):
+        """Refresh replica health, replay position and lag"""
+        try:
+            with self.primary.pool.connection(timeout=self.acquire_timeout) as conn:
+                primary_lsn = conn.execute(CURRENT_LSN_SQL).fetchone()[0]
+        except Exception:
+            primary_lsn = None
+
+        for node in self.replicas:
+            try:
+                started = time.perf_counter()
+                with node.pool.connection(timeout=self.acquire_timeout) as conn:
+                    in_recovery, replay_lsn, lag_seconds = conn.execute(REPLICA_HEALTH_SQL).fetchone()
+                node.observe_latency(time.perf_counter() - started)
+            except Exception as e:
+                if node.healthy:
+                    print(f"Replica {node.name} unavailable: {str(e)}")
+                node.healthy = False
+                continue
+
+            if not in_recovery:
+                # Not a standby: a stand-in server, or a promoted replica
+                node.replay_lsn, node.lag_seconds = None, 0.0
+            else:
+                node.replay_lsn = replay_lsn
+                # An idle primary makes the replay timestamp look old
+                caught_up = primary_lsn is not None and replay_lsn is not None and replay_lsn >= primary_lsn
+                node.lag_seconds = 0.0 if caught_up else float(lag_seconds or 0.0)
+            node.healthy = node.lag_seconds <= self.max_lag_seconds
+
+        self._expire_writes()
+
+    def _health_loop(self):
+        while not self._stop_event.wait(self.health_interval):
+            self.check_health()
+
+    def record_write(self, key: str, lsn: Optional[int] = None):
+        """Pin reads for key to the primary until replicas have the write"""
+        now = time.monotonic()
+        with self._lock:
+            previous = self._writes.get(key)
+            if previous and lsn is not None and previous[0] is not None:
+                lsn = max(lsn, previous[0])
+            self._writes[key] = (lsn, now)
+
+    def record_write_from(self, conn: psycopg.Connection, keys: List[str]):
+        """Record writes just committed on a primary connection"""
+        if not self.replicas or not keys:
+            return
+        lsn = conn.execute(CURRENT_LSN_SQL).fetchone()[0]
+        for key in keys:
+            self.record_write(key, lsn)
+
+    def _has_write(self, node: DatabaseNode, write: Tuple[Optional[int], float], now: float) -> bool:
+        lsn, written = write
+        if lsn is not None and node.replay_lsn is not None:
+            return node.replay_lsn >= lsn
+        return now - written > self.read_your_writes_seconds
+
+    def _expire_writes(self):
+        """Drop pins every replica can serve, and pins past the maximum age"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [
+                key for key, write in self._writes.items()
+                if now - write[1] > self.read_your_writes_max_seconds
+                or all(self._has_write(node, write, now) for node in self.replicas)
+            ]
+            for key in expired:
+                del self._writes[key]
+
+    def _can_serve(self, node: DatabaseNode, key: Optional[str]) -> bool:
+        if key is None:
+            return True
+        with self._lock:
+            write = self._writes.get(key)
+        return write is None or self._has_write(node, write, time.monotonic())
+
+    def select(self, key: Optional[str] = None) -> DatabaseNode:
+        """Node for a read, falling back to the primary"""
+        candidates = [node for node in self.replicas if node.healthy and self._can_serve(node, key)]
+        if not candidates:
+            return self.primary
+        if self.strategy == "least_latency":
+            return min(candidates, key=lambda node: node.latency if node.latency is not None else float("inf"))
+        return candidates[next(self._counter) % len(candidates)]
+
+    @contextmanager
+    def connection(self, key: Optional[str] = None) -> Iterator[psycopg.Connection]:
+        """Connection for read-only work; ``key`` enables read-your-writes"""
+        node = self.select(key)
+        if node is not self.primary:
+            try:
+                conn = node.pool.getconn(timeout=self.acquire_timeout)
+            except PoolTimeout:
+                print(f"Replica {node.name} unavailable: no connection within {self.acquire_timeout}s")
+                node.healthy = False
+                node = self.primary
+            else:
+                node.reads += 1
+                try:
+                    yield conn
+                except psycopg.OperationalError:
+                    # Fail over on the next read instead of the next health check
+                    node.healthy = False
+                    raise
+                finally:
+                    # Reads have nothing to commit
+                    if not conn.closed:
+                        conn.rollback()
+                    node.pool.putconn(conn)
+                return
+
+        node.reads += 1
+        with node.pool.connection() as conn:
+            yield conn
+
+    def snapshot(self) -> List[Dict]:
+        return [
+            {
+                "name": node.name,
+                "healthy": node.healthy,
+                "latency_ms": node.latency * 1000 if node.latency is not None else None,
+                "lag_seconds": node.lag_seconds,
+                "reads": node.reads,
+            }
+            for node in [self.primary, *self.replicas]
+        ]
+
+    def close(self):
+        self._stop_event.set()
+        for node in [self.primary, *self.replicas]:
+            node.pool.close()
+
+
+# Every live router, for the pool metrics read at scrape time
+_routers: "weakref.WeakSet[ReplicaRouter]" = weakref.WeakSet()
+
+# psycopg_pool stats key -> (metric, description, kind)
+POOL_METRICS = {
+    "pool_size": ("chat_db_pool_connections", "Open connections per pool", "gauge"),
+    "pool_available": ("chat_db_pool_idle_connections", "Idle connections per pool", "gauge"),
+    "pool_max": ("chat_db_pool_max_connections", "Connection limit per pool", "gauge"),
+    "requests_waiting": ("chat_db_pool_waiting_requests", "Requests waiting for a connection", "gauge"),
+    "requests_queued": ("chat_db_pool_queued_requests", "Requests that had to wait for a connection", "counter"),
+    "requests_wait_ms": ("chat_db_pool_wait_milliseconds", "Time spent waiting for a connection", "counter"),
+    "requests_errors": ("chat_db_pool_errors", "Connection requests that timed out or failed", "counter"),
+}
+
+
+def _pool_samples(stat: str):
+    for router in list(_routers):
+        for node in [router.primary, *router.replicas]:
+            yield {"pool": node.name, "server": node.server}, node.pool.get_stats().get(stat, 0)
+
+
+for _stat, (_name, _description, _kind) in POOL_METRICS.items():
+    get_metrics().callback(_name, _description, lambda stat=_stat: _pool_samples(stat), kind=_kind)
+
+
+_router: Optional[ReplicaRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_replica_router() -> ReplicaRouter:
+    """Process-wide router over the primary and PGREPLICA_HOSTS"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ReplicaRouter(
+                get_connection_string(),
+                get_replica_connection_strings(),
+                strategy=os.getenv("PGREPLICA_STRATEGY", "round_robin"),
+                primary_pool_size=int(os.getenv("ORDER_DB_POOL_SIZE", "10")),
+                replica_pool_size=int(os.getenv("PGREPLICA_POOL_SIZE", "10")),
+                health_interval=float(os.getenv("PGREPLICA_HEALTH_INTERVAL", "5")),
+                max_lag_seconds=float(os.getenv("PGREPLICA_MAX_LAG", "5")),
+                read_your_writes_seconds=float(os.getenv("PGREPLICA_READ_YOUR_WRITES", "5")),
+                read_your_writes_max_seconds=float(os.getenv("PGREPLICA_READ_YOUR_WRITES_MAX", "60")),
+            )
+        return _router
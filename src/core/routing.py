@@ -0,0 +1,100 @@
+import random
+import threading
+from collections import defaultdict, deque
+from typing import Deque, Dict, List, Optional
+
+from pydantic import BaseModel
+
+
+class ChainConfig(BaseModel):
+    """Model and generation parameters for one chain.
+
+    ``models`` lists the candidate models in order of preference. The first
+    one is used unless latency-based routing is enabled, in which case the
+    LatencyRouter picks among them.
+    """
+    models: List[str]
+    temperature: float = 0.7
+    max_tokens: int = 1000
+    stop: Optional[List[str]] = None
+
+    def invoke_kwargs(self) -> Dict:
+        """Keyword arguments bound to the LLM client for this chain"""
+        kwargs = {
+            "models": self.models,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+        }
+        if self.stop:
+            kwargs["stop"] = self.stop
+        return kwargs
+
+
+def build_chain_configs(
+    default_model: str,
+    small_model: str,
+    overrides: Optional[Dict[str, Dict]] = None,
+) -> Dict[str, ChainConfig]:
+    """Per-chain configuration: deterministic, short outputs on the small
+    model for classifiers and extractors, the default model for replies.
+    """
+    configs = {
+        "intent": ChainConfig(models=[small_model], temperature=0, max_tokens=80),
+        "email": ChainConfig(models=[small_model], temperature=0, max_tokens=30, stop=["\n"]),
+        "order_id": ChainConfig(models=[small_model], temperature=0, max_tokens=20, stop=["\n"]),
+        "summary": ChainConfig(models=[small_model], temperature=0, max_tokens=150),
+        "response": ChainConfig(models=[default_model], temperature=0.3, max_tokens=800),
+        "response_formatter": ChainConfig(models=[default_model], temperature=0.5, max_tokens=500),
+        "conversation": ChainConfig(models=[default_model], temperature=0.7, max_tokens=500),
+        "chat": ChainConfig(models=[default_model], temperature=0.7, max_tokens=500),
+    }
+    for name, override in (overrides or {}).items():
+        base = configs[name].model_dump() if name in configs else {"models": [default_model]}
+        configs[name] = ChainConfig(**{**base, **override})
+    return configs
+
+
+class LatencyRouter:
+    """Track call latency per model and pick the model with the lowest p95.
+
+    Models with fewer than ``min_samples`` observations are tried first,
+    and ``explore_rate`` of calls go to a random candidate so that
+    estimates for slower models keep being refreshed.
+    """
+
+    def __init__(self, window: int = 200, min_samples: int = 20, explore_rate: float = 0.05):
+        self.window = window
+        self.min_samples = min_samples
+        self.explore_rate = explore_rate
+        self._latencies: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=self.window))
+        self._lock = threading.Lock()
+
+    def observe(self, model: str, seconds: float):
+        with self._lock:
+            self._latencies[model].append(seconds)
+
+    def p95(self, model: str) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._latencies.get(model, ()))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(0.95 * len(samples)))]
+
+    def select(self, models: List[str]) -> str:
+        if len(models) == 1:
+            return models[0]
+        with self._lock:
+            for model in models:
+                if len(self._latencies.get(model, ())) < self.min_samples:
+                    return model
+        if random.random() < self.explore_rate:
+            return random.choice(models)
+        return min(models, key=lambda model: self.p95(model))
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            models = list(self._latencies)
+        return {
+            model: {"samples": len(self._latencies[model]), "p95_seconds": self.p95(model)}
+            for model in models
+        }
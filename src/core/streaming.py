@@ -0,0 +1,116 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Iterable, Iterator, Optional
+
+
+class StreamRunner:
+    """Run async streams on long-lived event loops in worker threads.
+
+    Each worker thread keeps one event loop for its lifetime, so streams
+    reuse loops (and async clients bound to them) instead of creating and
+    tearing them down per call. The chat pipeline makes blocking database
+    and LLM calls between its awaits, so a stream holds its own thread
+    rather than sharing one loop with every other session. ``max_workers``
+    bounds concurrent streams per process; later ones wait for a thread.
+    """
+
+    _DONE = object()
+
+    def __init__(self, max_workers: int = 16, name: str = "chat-stream"):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._local = threading.local()
+
+    def _thread_loop(self) -> asyncio.AbstractEventLoop:
+        loop = getattr(self._local, "loop", None)
+        if loop is None:
+            loop = self._local.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+        return loop
+
+    def _run(self, make_stream: Callable[[], AsyncIterator[str]], put: Callable):
+        async def consume():
+            async for chunk in make_stream():
+                put(chunk)
+
+        try:
+            self._thread_loop().run_until_complete(consume())
+        except Exception as e:
+            put(e)
+        finally:
+            put(self._DONE)
+
+    def start(self, make_stream: Callable[[], AsyncIterator[str]]):
+        """Start a stream from a running event loop.
+
+        Returns (queue of chunks for ``chunks()``, future done with the stream).
+        """
+        loop = asyncio.get_running_loop()
+        chunks: asyncio.Queue = asyncio.Queue()
+
+        def put(item):
+            loop.call_soon_threadsafe(chunks.put_nowait, item)
+
+        return chunks, loop.run_in_executor(self.executor, self._run, make_stream, put)
+
+    async def chunks(self, chunks: asyncio.Queue) -> AsyncIterator[str]:
+        while True:
+            item = await chunks.get()
+            if item is self._DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def iterate(self, make_stream: Callable[[], AsyncIterator[str]]) -> Iterator[str]:
+        """Chunks of a stream, for synchronous callers such as Streamlit scripts"""
+        chunks: queue.SimpleQueue = queue.SimpleQueue()
+        self.executor.submit(self._run, make_stream, chunks.put)
+        while True:
+            item = chunks.get()
+            if item is self._DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+_runner: Optional[StreamRunner] = None
+_runner_lock = threading.Lock()
+
+
+def get_stream_runner() -> StreamRunner:
+    """Process-wide runner with CHAT_STREAM_THREADS workers"""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = StreamRunner(max_workers=int(os.getenv("CHAT_STREAM_THREADS", "16")))
+        return _runner
+
+
+def coalesce_text(chunks: Iterable[str], fps: float = 10.0, min_chars: int = 0) -> Iterator[str]:
+    """The text so far, at most ``fps`` times a second and after at least
+    ``min_chars`` new characters; always ends with the complete text.
+
+    Re-rendering a growing answer on every chunk costs O(n^2) in its
+    length; this bounds the number of renders by time instead.
+    """
+    interval = 1.0 / fps if fps > 0 else 0.0
+    parts, pending = [], 0
+    last = time.monotonic()
+    for chunk in chunks:
+        parts.append(chunk)
+        pending += len(chunk)
+        now = time.monotonic()
+        if now - last >= interval and pending >= min_chars:
+            text = "".join(parts)
+            parts, pending, last = [text], 0, now
+            yield text
+    if pending or not parts:
+        yield "".join(parts)
@@ -0,0 +1,232 @@
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+
+
+class Span:
+    """A timed stage of a turn, with attributes such as token or row counts"""
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start", "end", "attrs")
+
+    def __init__(self, trace: Optional["Trace"], name: str, parent_id: Optional[str], attrs: Dict):
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.time()
+        self.end: Optional[float] = None
+        self.attrs = attrs
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self, trace_start: float) -> Dict:
+        return {
+            "id": self.span_id,
+            "parent": self.parent_id,
+            "name": self.name,
+            "offset_ms": round((self.start - trace_start) * 1000, 3),
+            "duration_ms": round(((self.end or time.time()) - self.start) * 1000, 3),
+            "attrs": self.attrs,
+        }
+
+
+class _NoopSpan:
+    """Stands in for a span when the turn is not sampled"""
+
+    trace = None
+    trace_id = None
+
+    def set(self, **attrs):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """The spans of one sampled turn"""
+
+    def __init__(self, name: str, trace_id: str):
+        self.trace_id = trace_id
+        self.root = Span(self, name, None, {})
+        self.spans: List[Span] = [self.root]
+        self._lock = threading.Lock()
+
+    def add(self, span: Span):
+        # Spans may end on other threads, e.g. the FAQ lookup
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start)
+        return {
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "start": self.root.start,
+            "duration_ms": round(((self.root.end or time.time()) - self.root.start) * 1000, 3),
+            "spans": [span.to_dict(self.root.start) for span in spans],
+        }
+
+
+# Innermost open span of the running turn; copied into asyncio tasks and
+# asyncio.to_thread calls, so their spans nest under the caller's
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+@contextmanager
+def _activate(span: Span) -> Iterator[Span]:
+    token = _current_span.set(span)
+    try:
+        yield span
+    finally:
+        span.end = time.time()
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # An async generator closed from another context
+            _current_span.set(None)
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Span]:
+    """Time a stage as a child of the current span; a no-op outside a
+    sampled turn
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield NOOP_SPAN
+        return
+    child = Span(parent.trace, name, parent.span_id, attrs)
+    parent.trace.add(child)
+    with _activate(child):
+        yield child
+
+
+class JsonlExporter:
+    """One JSON line per trace, appended to ``path``"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, trace: Dict):
+        line = json.dumps(trace, ensure_ascii=False, default=str) + "\n"
+        try:
+            with self._lock, open(self.path, "a", encoding="utf-8") as file:
+                file.write(line)
+        except OSError as e:
+            print(f"Trace export error: {str(e)}")
+
+
+class OpenTelemetryExporter:
+    """Replays finished traces as OpenTelemetry spans.
+
+    Spans go to the tracer provider configured for the process, for
+    example by ``opentelemetry-instrument`` and the OTEL_* environment
+    variables, and keep their timings. Our trace id is kept in the
+    ``chat.trace_id`` attribute. Needs ``opentelemetry-api``.
+    """
+
+    def __init__(self, tracer_name: str = "fsds-llm.chat"):
+        from opentelemetry import trace as otel_trace
+
+        self._otel = otel_trace
+        self.tracer = otel_trace.get_tracer(tracer_name)
+
+    def export(self, trace: Dict):
+        start_ns = int(trace["start"] * 1e9)
+        otel_spans, end_times = {}, {}
+        # Sorted by start, so parents are created before their children
+        for item in trace["spans"]:
+            parent = otel_spans.get(item["parent"])
+            context = self._otel.set_span_in_context(parent) if parent is not None else None
+            attributes = {
+                key: value if isinstance(value, (str, bool, int, float)) else json.dumps(value, default=str)
+                for key, value in item["attrs"].items()
+                if value is not None
+            }
+            attributes["chat.trace_id"] = trace["trace_id"]
+            otel_spans[item["id"]] = self.tracer.start_span(
+                item["name"],
+                context=context,
+                attributes=attributes,
+                start_time=start_ns + int(item["offset_ms"] * 1e6),
+            )
+            end_times[item["id"]] = start_ns + int((item["offset_ms"] + item["duration_ms"]) * 1e6)
+        for span_id, otel_span in otel_spans.items():
+            otel_span.end(end_time=end_times[span_id])
+
+
+class Tracer:
+    """Samples turns and exports their spans when they finish.
+
+    ``trace()`` opens the root span of a turn; ``span()`` anywhere below
+    it adds a child. Unsampled turns, and code running outside any turn,
+    only pay for a context variable lookup per span.
+    """
+
+    def __init__(self, exporter=None, sample_rate: float = 1.0):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None and self.sample_rate > 0
+
+    @contextmanager
+    def trace(self, name: str, **attrs) -> Iterator[Span]:
+        """Root span of a sampled turn; nested under an open span as a child"""
+        if _current_span.get() is not None:
+            with span(name, **attrs) as child:
+                yield child
+            return
+        if not self.enabled or random.random() >= self.sample_rate:
+            yield NOOP_SPAN
+            return
+        trace = Trace(name, uuid.uuid4().hex)
+        trace.root.set(**attrs)
+        try:
+            with _activate(trace.root) as root:
+                yield root
+        finally:
+            self.exporter.export(trace.to_dict())
+
+
+def tracer_from_env() -> Tracer:
+    """TRACE_EXPORTER: ``jsonl`` (to TRACE_FILE), ``otel`` or ``none``;
+    TRACE_SAMPLE_RATE is the fraction of turns traced
+    """
+    kind = os.getenv("TRACE_EXPORTER", "none")
+    sample_rate = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+    if kind == "none":
+        return Tracer(None, sample_rate)
+    if kind == "jsonl":
+        return Tracer(JsonlExporter(os.getenv("TRACE_FILE", "traces.jsonl")), sample_rate)
+    if kind == "otel":
+        return Tracer(OpenTelemetryExporter(), sample_rate)
+    raise ValueError(f"Unknown trace exporter: {kind}")
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """Process-wide tracer configured from the environment"""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = tracer_from_env()
+        return _tracer
@@ -37,6 +37,11 @@ UI_MESSAGES = {
 - "Bạn có mẫu Gundam nào mới không?"
 """,
     
+    # Chat history
+    "older_messages": "Tin nhắn cũ hơn ({})",
+    "show_older": "Hiện tin nhắn cũ hơn",
+    "load_older": "Tải thêm tin nhắn cũ",
+
     # Buttons
     "clear_chat": "Xóa Cuộc hội thoại",
     "restart_app": "Khởi động lại Ứng dụng",
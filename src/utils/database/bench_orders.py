@@ -0,0 +1,202 @@
+"""Benchmark order lookups at production table sizes.
+
+Builds an orders table in its own schema (``orders_bench`` by default)
+with the migration tool, fills it with generate_orders.py, and times the OrderRepository queries used by the assistant for random
+customers. The summary query plan is checked for an index-only scan.
+
+Usage:
+    python src/utils/database/bench_orders.py --rows 10000000
+    python src/utils/database/bench_orders.py --rows 10000000 --enable partitioning
+    python src/utils/database/bench_orders.py --rows 10000000 --schema-version 2  # before 0003
+
+The table is kept between runs with the same schema name; pass --reload
+to rebuild it or --drop to remove it afterwards.
+"""
+import argparse
+import json
+import logging
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+from urllib.parse import quote
+
+import numpy as np
+import psycopg
+from dotenv import load_dotenv
+from psycopg_pool import ConnectionPool
+
+# Get the project root directory
+PROJECT_ROOT = Path(__file__).parent.parent.parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from src.core.db import get_connection_string
+from src.core.orders import OrderRepository, SUMMARY_SQL
+from src.utils.database.generate_orders import GeneratorConfig, customer_identity, generate_orders
+from src.utils.database.migrate import apply_migrations, is_partitioned
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def bench_conninfo(schema: str) -> str:
+    return f"{get_connection_string()}?options={quote(f'-c search_path={schema}')}"
+
+
+def load(conninfo: str, config: GeneratorConfig, workers: int = None):
+    generate_orders(config, conninfo, workers=workers)
+    # Sets the visibility map that index-only scans rely on
+    logger.info("Running VACUUM ANALYZE")
+    with psycopg.connect(conninfo, autocommit=True) as conn:
+        conn.execute("VACUUM ANALYZE orders")
+
+
+def time_calls(fn: Callable, args: List, warmup: int = 10) -> Dict[str, float]:
+    for arg in args[:warmup]:
+        fn(arg)
+    latencies = []
+    for arg in args:
+        started = time.perf_counter()
+        fn(arg)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies = np.array(latencies)
+    return {
+        "calls": len(latencies),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def summary_plan(conninfo: str, email: str) -> Dict:
+    """Scan nodes of the summary query plan and their heap fetches"""
+    with psycopg.connect(conninfo) as conn:
+        plan = conn.execute(
+            f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {SUMMARY_SQL}", (email,)
+        ).fetchone()[0][0]
+
+    scans: Dict[str, int] = {}
+    heap_fetches = 0
+
+    def walk(node):
+        nonlocal heap_fetches
+        if "Scan" in node["Node Type"]:
+            scans[node["Node Type"]] = scans.get(node["Node Type"], 0) + 1
+            heap_fetches += node.get("Heap Fetches", 0)
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan["Plan"])
+    return {"execution_ms": plan["Execution Time"], "scans": scans, "heap_fetches": heap_fetches}
+
+
+def table_sizes(conninfo: str) -> Dict[str, str]:
+    with psycopg.connect(conninfo) as conn:
+        row = conn.execute("""
+            WITH tables AS (
+                SELECT relid FROM pg_partition_tree('orders') WHERE isleaf
+                UNION SELECT 'orders'::regclass
+            )
+            SELECT pg_size_pretty(sum(pg_table_size(relid))),
+                   pg_size_pretty(sum(pg_indexes_size(relid)))
+            FROM tables
+        """).fetchone()
+    return {"table": row[0], "indexes": row[1]}
+
+
+def run(args) -> Dict:
+    conninfo = bench_conninfo(args.schema)
+    with psycopg.connect(get_connection_string(), autocommit=True) as conn:
+        if args.reload:
+            conn.execute(f'DROP SCHEMA IF EXISTS "{args.schema}" CASCADE')
+        conn.execute(f'CREATE SCHEMA IF NOT EXISTS "{args.schema}"')
+
+    apply_migrations(conninfo, features=args.enable or [], target=args.schema_version)
+    with psycopg.connect(conninfo) as conn:
+        existing = conn.execute("SELECT count(*) FROM orders").fetchone()[0]
+    if existing == 0:
+        load(conninfo, GeneratorConfig(
+            rows=args.rows,
+            customers=args.customers,
+            distribution=args.distribution,
+            days=args.days,
+            seed=args.seed,
+        ), workers=args.workers)
+    elif existing != args.rows:
+        raise ValueError(f"Schema {args.schema} holds {existing} rows, pass --reload to rebuild it")
+
+    rng = random.Random(0)
+    emails = [customer_identity(rng.randrange(args.customers))[1] for _ in range(args.queries)]
+    pool = ConnectionPool(conninfo, min_size=1, max_size=1, open=True)
+    repository = OrderRepository(pool)
+
+    summaries = {}
+
+    def summary(email):
+        summaries[email] = repository.get_order_summary(email, limit=args.page_size)
+
+    plan = summary_plan(conninfo, emails[0])
+    results = {"summary": time_calls(summary, emails)}
+    pages = [(s.email, s.next_cursor) for s in summaries.values() if s.next_cursor]
+    if pages:
+        results["next_page"] = time_calls(
+            lambda page: repository.get_order_page(page[0], page[1], limit=args.page_size), pages
+        )
+    results["pending"] = time_calls(lambda email: repository.get_pending_orders(email), emails)
+    # Cancels write, so they run last and each order only once
+    pending = [order for email in emails[:args.cancels] for order in repository.get_pending_orders(email, limit=1)]
+    if pending:
+        results["cancel"] = time_calls(
+            lambda order: repository.cancel(order.customer_email, order.order_id), pending, warmup=0
+        )
+    pool.close()
+
+    with psycopg.connect(conninfo) as conn:
+        partitioned = is_partitioned(conn)
+        version = conn.execute("SELECT max(version) FROM schema_migrations").fetchone()[0]
+    report = {
+        "rows": args.rows,
+        "customers": args.customers,
+        "schema_version": version,
+        "partitioned": partitioned,
+        "sizes": table_sizes(conninfo),
+        "summary_plan": plan,
+        "latency": results,
+    }
+
+    if args.drop:
+        with psycopg.connect(get_connection_string(), autocommit=True) as conn:
+            conn.execute(f'DROP SCHEMA "{args.schema}" CASCADE')
+    return report
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Benchmark order lookups")
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--customers", type=int, default=100_000)
+    parser.add_argument("--days", type=int, default=730, help="Spread of created_at")
+    parser.add_argument("--distribution", choices=["uniform", "zipf", "lognormal"], default="uniform")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=None, help="Generator processes")
+    parser.add_argument("--schema", default="orders_bench")
+    parser.add_argument("--schema-version", type=int, default=None,
+                        help="Stop migrations after this version")
+    parser.add_argument("--enable", action="append", help="Enable a schema feature, e.g. partitioning")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--cancels", type=int, default=200)
+    parser.add_argument("--page-size", type=int, default=5)
+    parser.add_argument("--reload", action="store_true", help="Rebuild the benchmark table")
+    parser.add_argument("--drop", action="store_true", help="Drop the benchmark schema afterwards")
+    parser.add_argument("--output", help="Write the report as JSON")
+    args = parser.parse_args()
+
+    report = run(args)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
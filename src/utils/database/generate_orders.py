@@ -0,0 +1,321 @@
+"""Generate millions of synthetic orders and COPY them into Postgres.
+
+Orders are built in NumPy-vectorized chunks by a pool of worker
+processes. Each worker streams its chunks into ``orders`` with binary
+COPY over its own connection. Chunk ``i`` is drawn from
+``default_rng([seed, i])``, so a dataset is reproducible from ``--seed``
+and ``--as-of`` whatever the number of workers.
+
+Customers are ``customer<N>@email.com``. The first ones are the demo
+customers from orders_insert.py, so the chat demo works on the generated
+data. The distribution option sets how orders spread over customers:
+
+- ``uniform``: every customer is equally likely.
+- ``zipf``: customer N has weight 1 / (N + 1) ** s, so a few customers
+  hold most orders.
+- ``lognormal``: weights drawn from a lognormal(0, sigma) distribution.
+
+Order dates are spread uniformly over ``--days`` before ``--as-of``. The
+status follows from the order age, as in orders_insert.py, and a share
+of orders is cancelled.
+
+Usage:
+    python src/utils/database/generate_orders.py --rows 10000000 --customers 100000 \\
+        --distribution zipf --seed 42
+"""
+import argparse
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+import psycopg
+from numpy.dtypes import StringDType
+from dotenv import load_dotenv
+from psycopg.types.json import set_json_dumps
+
+# Get the project root directory
+PROJECT_ROOT = Path(__file__).parent.parent.parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from src.core.db import get_connection_string
+from src.utils.database.migrate import apply_migrations, is_partitioned
+from src.utils.database.orders_insert import CUSTOMERS, GUNDAM_ITEMS
+
+logger = logging.getLogger(__name__)
+
+COPY_SQL = """
+    COPY orders (order_id, order_detail, total_price, customer_name, customer_email,
+                 status, created_at, updated_at)
+    FROM STDIN (FORMAT BINARY)
+"""
+COPY_TYPES = ["varchar", "jsonb", "numeric", "varchar", "varchar", "varchar", "timestamp", "timestamp"]
+
+MAX_ITEMS = 3
+MAX_QUANTITY = 2
+ITEM_PRICES_CENTS = np.array([round(item["base_price"] * 100) for item in GUNDAM_ITEMS])
+
+# Pre-rendered JSON for every (item, quantity) pair, indexed by item and
+# quantity - 1; an order's detail is a join of up to three of them
+ITEM_FRAGMENTS = np.array(
+    [
+        [
+            json.dumps({
+                "model": item["model"],
+                "grade": item["grade"],
+                "scale": item["scale"],
+                "quantity": quantity,
+                "price": item["base_price"],
+            })
+            for quantity in range(1, MAX_QUANTITY + 1)
+        ]
+        for item in GUNDAM_ITEMS
+    ],
+    dtype=StringDType(),
+)
+
+ORDER_ID_DIGITS = 10
+HEX_DIGITS = np.array(list("0123456789ABCDEF"))
+
+
+@dataclass
+class GeneratorConfig:
+    rows: int
+    customers: int
+    distribution: str = "uniform"
+    zipf_s: float = 1.1
+    lognormal_sigma: float = 1.0
+    days: int = 730
+    cancelled_share: float = 0.05
+    seed: int = 42
+    as_of: datetime = None
+    chunk_size: int = 100_000
+    id_prefix: str = "ORD-"
+
+
+def customer_cdf(config: GeneratorConfig) -> np.ndarray:
+    """Cumulative order share per customer index"""
+    if config.distribution == "uniform":
+        weights = np.ones(config.customers)
+    elif config.distribution == "zipf":
+        weights = 1.0 / np.arange(1, config.customers + 1) ** config.zipf_s
+    elif config.distribution == "lognormal":
+        rng = np.random.default_rng([config.seed, 2**32 - 1])
+        weights = rng.lognormal(0.0, config.lognormal_sigma, config.customers)
+    else:
+        raise ValueError(f"Unknown distribution: {config.distribution}")
+    cdf = np.cumsum(weights)
+    return cdf / cdf[-1]
+
+
+def customer_identity(index: int) -> Tuple[str, str]:
+    if index < len(CUSTOMERS):
+        return CUSTOMERS[index]["name"], CUSTOMERS[index]["email"]
+    return f"Customer {index}", f"customer{index}@email.com"
+
+
+def order_ids(prefix: str, start: int, n: int) -> np.ndarray:
+    """``prefix`` followed by the zero-padded hex of start .. start + n - 1"""
+    ids = np.arange(start, start + n, dtype=np.int64)
+    shifts = 4 * np.arange(ORDER_ID_DIGITS - 1, -1, -1)
+    digits = HEX_DIGITS[(ids[:, None] >> shifts) & 0xF]
+    return np.strings.add(prefix, digits.view(f"<U{ORDER_ID_DIGITS}")[:, 0])
+
+
+def order_details(items: np.ndarray, quantities: np.ndarray, used: np.ndarray) -> np.ndarray:
+    """JSON detail of each order, joined from ITEM_FRAGMENTS"""
+    fragments = np.where(used, ITEM_FRAGMENTS[items, quantities - 1], "")
+    details = np.strings.add('{"items": [', fragments[:, 0])
+    for j in range(1, MAX_ITEMS):
+        details = np.strings.add(details, np.where(used[:, j], ", ", ""))
+        details = np.strings.add(details, fragments[:, j])
+    return np.strings.add(details, "]}")
+
+
+def generate_chunk(config: GeneratorConfig, cdf: np.ndarray, chunk: int) -> Iterator[Tuple]:
+    """Rows of chunk ``chunk``, ready for COPY.
+
+    Columns are computed for the whole chunk at once. Python objects are
+    only built per distinct customer and total, then shared by their rows.
+    """
+    start = chunk * config.chunk_size
+    n = min(config.chunk_size, config.rows - start)
+    rng = np.random.default_rng([config.seed, chunk])
+
+    customers = np.minimum(np.searchsorted(cdf, rng.random(n)), config.customers - 1)
+
+    # Distinct items per order: the first columns of a random permutation
+    num_items = rng.integers(1, MAX_ITEMS + 1, n)
+    items = np.argsort(rng.random((n, len(GUNDAM_ITEMS))), axis=1)[:, :MAX_ITEMS]
+    quantities = rng.integers(1, MAX_QUANTITY + 1, (n, MAX_ITEMS))
+    used = np.arange(MAX_ITEMS) < num_items[:, None]
+    totals_cents = (ITEM_PRICES_CENTS[items] * quantities * used).sum(axis=1)
+
+    age_seconds = rng.random(n) * config.days * 86400
+    age_days = age_seconds / 86400
+    statuses = np.where(age_days < 1, "pending", np.where(age_days < 4, "in_production", "shipped"))
+    statuses[rng.random(n) < config.cancelled_share] = "cancelled"
+    created_at = (
+        np.datetime64(config.as_of, "us") - (age_seconds * 1e6).astype("timedelta64[us]")
+    ).astype(datetime)
+
+    # Orders share a few thousand (item, quantity) combinations; join
+    # the details of each combination once
+    codes = np.where(used, items * MAX_QUANTITY + quantities, 0)
+    combinations = codes @ (len(GUNDAM_ITEMS) * MAX_QUANTITY + 1) ** np.arange(MAX_ITEMS)
+    _, first_rows, combination_rows = np.unique(combinations, return_index=True, return_inverse=True)
+    details = order_details(items[first_rows], quantities[first_rows], used[first_rows])
+    details = details.astype(object)[combination_rows]
+
+    unique_customers, customer_rows = np.unique(customers, return_inverse=True)
+    identities = [customer_identity(int(customer)) for customer in unique_customers]
+    names = np.array([name for name, _ in identities], dtype=object)[customer_rows]
+    emails = np.array([email for _, email in identities], dtype=object)[customer_rows]
+
+    unique_totals, total_rows = np.unique(totals_cents, return_inverse=True)
+    totals = np.array([Decimal(int(cents)).scaleb(-2) for cents in unique_totals], dtype=object)[total_rows]
+
+    return zip(
+        order_ids(config.id_prefix, start, n).tolist(),
+        details.tolist(),
+        totals.tolist(),
+        names.tolist(),
+        emails.tolist(),
+        statuses.tolist(),
+        created_at.tolist(),
+        itertools.repeat(config.as_of, n),
+    )
+
+
+_worker_state = {}
+
+
+def _init_worker(config: GeneratorConfig, conninfo: str, notify: bool):
+    _worker_state["config"] = config
+    _worker_state["notify"] = notify
+    _worker_state["cdf"] = customer_cdf(config)
+    conn = psycopg.connect(conninfo)
+    # Order details are already JSON text
+    set_json_dumps(str, conn)
+    _worker_state["conn"] = conn
+
+
+def copy_chunk(chunk: int) -> Tuple[int, int, float]:
+    """Generate a chunk and COPY it in one transaction"""
+    config = _worker_state["config"]
+    conn = _worker_state["conn"]
+    started = time.perf_counter()
+    rows = 0
+    with conn.cursor() as cur:
+        if not _worker_state["notify"]:
+            # Skips the cache invalidation triggers for this transaction
+            # only; unlike DISABLE TRIGGER it takes no table lock, so
+            # workers load in parallel and other writers still notify
+            cur.execute("SET LOCAL session_replication_role = replica")
+        with cur.copy(COPY_SQL) as copy:
+            copy.set_types(COPY_TYPES)
+            for row in generate_chunk(config, _worker_state["cdf"], chunk):
+                copy.write_row(row)
+                rows += 1
+    conn.commit()
+    return chunk, rows, time.perf_counter() - started
+
+
+def generate_orders(
+    config: GeneratorConfig,
+    conninfo: Optional[str] = None,
+    workers: Optional[int] = None,
+    notify: bool = False,
+) -> float:
+    """Load config.rows orders into an existing orders table and return the rows/s achieved.
+
+    The loaded rows don't notify order caches unless ``notify`` is set.
+    """
+    conninfo = conninfo or get_connection_string()
+    config.as_of = config.as_of or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    workers = workers or os.cpu_count() or 1
+    chunks = list(range((config.rows + config.chunk_size - 1) // config.chunk_size))
+
+    with psycopg.connect(conninfo, autocommit=True) as conn:
+        if is_partitioned(conn):
+            conn.execute(
+                "SELECT ensure_orders_partitions('orders', %s, %s)",
+                ((config.as_of - timedelta(days=config.days)).date(), config.as_of.date()),
+            )
+
+    logger.info(
+        f"Generating {config.rows} orders for {config.customers} customers "
+        f"({config.distribution}, seed {config.seed}, as of {config.as_of.isoformat()}) "
+        f"in {len(chunks)} chunks on {workers} workers"
+    )
+    started = time.perf_counter()
+    loaded = 0
+    try:
+        with multiprocessing.Pool(workers, _init_worker, (config, conninfo, notify)) as pool:
+            for chunk, rows, seconds in pool.imap_unordered(copy_chunk, chunks):
+                loaded += rows
+                elapsed = time.perf_counter() - started
+                logger.info(
+                    f"Chunk {chunk}: {rows} rows in {seconds:.1f}s, "
+                    f"total {loaded}/{config.rows} ({loaded / elapsed:.0f} rows/s)"
+                )
+    finally:
+        with psycopg.connect(conninfo, autocommit=True) as conn:
+            conn.execute("ANALYZE orders")
+
+    rate = loaded / (time.perf_counter() - started)
+    logger.info(f"Loaded {loaded} orders at {rate:.0f} rows/s")
+    return rate
+
+
+def main():
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Generate synthetic orders with binary COPY")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--customers", type=int, default=100_000)
+    parser.add_argument("--distribution", choices=["uniform", "zipf", "lognormal"], default="uniform",
+                        help="How orders spread over customers")
+    parser.add_argument("--zipf-s", type=float, default=1.1)
+    parser.add_argument("--lognormal-sigma", type=float, default=1.0)
+    parser.add_argument("--days", type=int, default=730, help="Spread of created_at before --as-of")
+    parser.add_argument("--as-of", type=datetime.fromisoformat, default=None,
+                        help="Reference time, defaults to today at midnight")
+    parser.add_argument("--cancelled-share", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=100_000)
+    parser.add_argument("--id-prefix", default="ORD-")
+    parser.add_argument("--workers", type=int, default=None, help="Defaults to the CPU count")
+    parser.add_argument("--notify", action="store_true",
+                        help="Notify order caches of the loaded orders")
+    args = parser.parse_args()
+
+    config = GeneratorConfig(
+        rows=args.rows,
+        customers=args.customers,
+        distribution=args.distribution,
+        zipf_s=args.zipf_s,
+        lognormal_sigma=args.lognormal_sigma,
+        days=args.days,
+        cancelled_share=args.cancelled_share,
+        seed=args.seed,
+        as_of=args.as_of,
+        chunk_size=args.chunk_size,
+        id_prefix=args.id_prefix,
+    )
+    apply_migrations()
+    generate_orders(config, workers=args.workers, notify=args.notify)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""Versioned migrations for the orders schema.
+
+Migrations are the SQL files in ``migrations/`` named
+``NNNN_description.sql``. Pending ones are applied in version order and
+recorded in ``schema_migrations``. Header comments change how a file is
+applied:
+
+- ``-- no-transaction``: statements run one at a time in autocommit mode,
+  as ``CREATE INDEX CONCURRENTLY`` requires. Statements are split on lines
+  ending with ``;``.
+- ``-- feature: <name>``: only applied when the feature is enabled, with
+  ``--enable <name>`` or ``ORDERS_SCHEMA_FEATURES=<name>,...``.
+
+Usage:
+    python src/utils/database/migrate.py status
+    python src/utils/database/migrate.py up [--enable partitioning] [--to VERSION]
+    python src/utils/database/migrate.py maintain [--months-ahead 3]
+
+``maintain`` creates upcoming monthly partitions when orders is
+partitioned and should run periodically (``up`` runs it too).
+"""
+import argparse
+import hashlib
+import logging
+import os
+import re
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, List, Optional, Set
+
+import psycopg
+from dotenv import load_dotenv
+
+# Get the project root directory
+PROJECT_ROOT = Path(__file__).parent.parent.parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from src.core.db import get_connection_string
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+MIGRATION_FILE_PATTERN = re.compile(r"^(\d+)_(\w+)\.sql$")
+FEATURE_PATTERN = re.compile(r"^--\s*feature:\s*(\w+)\s*$", re.MULTILINE)
+NO_TRANSACTION_PATTERN = re.compile(r"^--\s*no-transaction\s*$", re.MULTILINE)
+
+# Serializes migrators across processes, e.g. several containers starting
+MIGRATION_LOCK_ID = 7_204_918_311
+
+CREATE_MIGRATIONS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        checksum TEXT NOT NULL,
+        applied_at TIMESTAMP NOT NULL DEFAULT now()
+    )
+"""
+
+MAINTAIN_PARTITIONS_SQL = """
+    SELECT ensure_orders_partitions(
+        'orders', now()::date, (now() + make_interval(months => %s))::date
+    )
+"""
+
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    sql: str
+    feature: Optional[str]
+    transactional: bool
+
+    @property
+    def checksum(self) -> str:
+        return hashlib.sha256(self.sql.encode("utf-8")).hexdigest()
+
+
+def load_migrations(directory: Path = MIGRATIONS_DIR) -> List[Migration]:
+    """Read the migration files in version order"""
+    migrations = []
+    for path in sorted(directory.glob("*.sql")):
+        match = MIGRATION_FILE_PATTERN.match(path.name)
+        if not match:
+            raise ValueError(f"Unexpected migration file name: {path.name}")
+        sql = path.read_text(encoding="utf-8")
+        feature = FEATURE_PATTERN.search(sql)
+        migrations.append(Migration(
+            version=int(match.group(1)),
+            name=match.group(2),
+            sql=sql,
+            feature=feature.group(1) if feature else None,
+            transactional=not NO_TRANSACTION_PATTERN.search(sql),
+        ))
+    versions = [migration.version for migration in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError("Duplicate migration versions")
+    return migrations
+
+
+def split_statements(sql: str) -> List[str]:
+    """Split a no-transaction migration into statements"""
+    statements, current = [], []
+    for line in sql.splitlines():
+        if line.strip().startswith("--") and not current:
+            continue
+        current.append(line)
+        if line.rstrip().endswith(";"):
+            statements.append("\n".join(current).strip())
+            current = []
+    if "".join(current).strip():
+        statements.append("\n".join(current).strip())
+    return statements
+
+
+def features_from_env() -> Set[str]:
+    value = os.getenv("ORDERS_SCHEMA_FEATURES", "")
+    return {feature.strip() for feature in value.split(",") if feature.strip()}
+
+
+def _applied(conn: psycopg.Connection) -> dict:
+    rows = conn.execute("SELECT version, checksum FROM schema_migrations").fetchall()
+    return dict(rows)
+
+
+def _apply(conn: psycopg.Connection, migration: Migration):
+    record = (
+        "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+        (migration.version, migration.name, migration.checksum),
+    )
+    if migration.transactional:
+        with conn.transaction():
+            conn.execute(migration.sql)
+            conn.execute(*record)
+    else:
+        # Each statement must be safe to re-run if a later one fails
+        for statement in split_statements(migration.sql):
+            conn.execute(statement)
+        conn.execute(*record)
+
+
+def is_partitioned(conn: psycopg.Connection) -> bool:
+    row = conn.execute(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('orders')"
+    ).fetchone()
+    return row is not None
+
+
+def maintain_partitions(conn: psycopg.Connection, months_ahead: int = 3) -> int:
+    """Create the coming months' partitions if orders is partitioned"""
+    if not is_partitioned(conn):
+        return 0
+    with conn.transaction():
+        return conn.execute(MAINTAIN_PARTITIONS_SQL, (months_ahead,)).fetchone()[0]
+
+
+def apply_migrations(
+    conninfo: Optional[str] = None,
+    features: Optional[Iterable[str]] = None,
+    months_ahead: int = 3,
+    target: Optional[int] = None,
+) -> List[Migration]:
+    """Apply pending migrations and return the ones applied.
+
+    Safe to call on every start: applied versions are skipped, and
+    concurrent callers wait on an advisory lock. ``target`` stops after
+    that version.
+    """
+    features = features_from_env() if features is None else set(features)
+    with psycopg.connect(conninfo or get_connection_string(), autocommit=True) as conn:
+        conn.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        try:
+            conn.execute(CREATE_MIGRATIONS_TABLE_SQL)
+            applied = _applied(conn)
+            done = []
+            for migration in load_migrations():
+                if migration.version in applied:
+                    if applied[migration.version] != migration.checksum:
+                        logger.warning(
+                            f"Migration {migration.version}_{migration.name} changed after it was applied"
+                        )
+                    continue
+                if migration.feature and migration.feature not in features:
+                    continue
+                if target is not None and migration.version > target:
+                    break
+                logger.info(f"Applying migration {migration.version}_{migration.name}")
+                _apply(conn, migration)
+                done.append(migration)
+
+            created = maintain_partitions(conn, months_ahead)
+            if created:
+                logger.info(f"Created {created} order partitions")
+            return done
+        finally:
+            conn.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+
+
+def print_status(conninfo: Optional[str] = None):
+    with psycopg.connect(conninfo or get_connection_string(), autocommit=True) as conn:
+        conn.execute(CREATE_MIGRATIONS_TABLE_SQL)
+        applied = _applied(conn)
+        for migration in load_migrations():
+            if migration.version not in applied:
+                state = "pending" if not migration.feature else f"pending (feature: {migration.feature})"
+            elif applied[migration.version] != migration.checksum:
+                state = "applied, file changed since"
+            else:
+                state = "applied"
+            print(f"{migration.version:04d}_{migration.name}: {state}")
+        print(f"orders partitioned: {is_partitioned(conn)}")
+
+
+def main():
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Orders schema migrations")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("status", help="List migrations and whether they are applied")
+    up = subparsers.add_parser("up", help="Apply pending migrations")
+    up.add_argument("--enable", action="append", default=None,
+                    help="Enable an optional feature, e.g. partitioning (repeatable)")
+    up.add_argument("--months-ahead", type=int, default=3)
+    up.add_argument("--to", type=int, default=None, help="Stop after this version")
+    maintain = subparsers.add_parser("maintain", help="Create upcoming order partitions")
+    maintain.add_argument("--months-ahead", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.command == "status":
+        print_status()
+    elif args.command == "up":
+        features = features_from_env() | set(args.enable or [])
+        applied = apply_migrations(
+            features=features, months_ahead=args.months_ahead, target=args.to
+        )
+        print(f"Applied {len(applied)} migrations")
+    else:
+        with psycopg.connect(get_connection_string(), autocommit=True) as conn:
+            print(f"Created {maintain_partitions(conn, args.months_ahead)} order partitions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+-- Notify order lookup caches (channel orders_changed, payload = customer
+-- email) whenever a customer's orders are written
+CREATE OR REPLACE FUNCTION notify_orders_changed() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        PERFORM pg_notify('orders_changed', OLD.customer_email);
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        PERFORM pg_notify('orders_changed', NEW.customer_email);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER orders_changed_notify
+AFTER INSERT OR UPDATE OR DELETE ON orders
+FOR EACH ROW EXECUTE FUNCTION notify_orders_changed();
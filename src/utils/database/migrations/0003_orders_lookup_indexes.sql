@@ -0,0 +1,19 @@
+-- no-transaction
+-- Built concurrently so that existing tables keep taking writes.
+--
+-- idx_orders_lookup serves the per-customer summary as an index-only scan
+-- (status and total_price are included) and the keyset-paginated pages
+-- without a sort. It supersedes the single-column email index and the
+-- (customer_email, created_at, order_id) index created by PGOrders before
+-- migrations existed.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_lookup
+    ON orders (customer_email, created_at DESC, order_id DESC) INCLUDE (status, total_price);
+
+-- Pending orders are the only cancellable ones and a small, shrinking
+-- share of the table
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_pending
+    ON orders (customer_email, created_at DESC) WHERE status = 'pending';
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_orders_email_created_at;
+DROP INDEX CONCURRENTLY IF EXISTS idx_orders_email;
+DROP INDEX CONCURRENTLY IF EXISTS idx_orders_status;
@@ -0,0 +1,72 @@
+-- feature: partitioning
+-- Range-partition orders by month of created_at.
+--
+-- The table is rebuilt: writes are blocked while its rows are copied into
+-- a partitioned table, which then takes its name. The primary key has to
+-- include the partition key, so it becomes (order_id, created_at). Rows
+-- outside the monthly partitions land in orders_default until
+-- ensure_orders_partitions() creates their partition.
+
+-- Create the monthly partitions of parent covering start_month to
+-- end_month. Rows already in the default partition for a new month are
+-- moved into it. Returns the number of partitions created.
+CREATE OR REPLACE FUNCTION ensure_orders_partitions(parent regclass, start_month date, end_month date)
+RETURNS integer AS $$
+DECLARE
+    month date := date_trunc('month', start_month);
+    partition_name text;
+    default_partition regclass;
+    created integer := 0;
+BEGIN
+    SELECT nullif(partdefid, 0)::regclass INTO default_partition
+    FROM pg_partitioned_table WHERE partrelid = parent;
+
+    WHILE month <= end_month LOOP
+        partition_name := format('orders_p%s', to_char(month, 'YYYYMM'));
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I (LIKE %s INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+                           partition_name, parent);
+            IF default_partition IS NOT NULL THEN
+                EXECUTE format(
+                    'WITH moved AS (DELETE FROM %s WHERE created_at >= %L AND created_at < %L RETURNING *) '
+                    'INSERT INTO %I SELECT * FROM moved',
+                    default_partition, month, month + interval '1 month', partition_name);
+            END IF;
+            EXECUTE format('ALTER TABLE %s ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                           parent, partition_name, month, month + interval '1 month');
+            created := created + 1;
+        END IF;
+        month := month + interval '1 month';
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+LOCK TABLE orders IN EXCLUSIVE MODE;
+
+CREATE TABLE orders_partitioned (
+    LIKE orders INCLUDING DEFAULTS INCLUDING CONSTRAINTS,
+    PRIMARY KEY (order_id, created_at)
+) PARTITION BY RANGE (created_at);
+CREATE TABLE orders_default PARTITION OF orders_partitioned DEFAULT;
+
+SELECT ensure_orders_partitions(
+    'orders_partitioned',
+    (SELECT coalesce(min(created_at), now()) FROM orders)::date,
+    (now() + interval '3 months')::date
+);
+INSERT INTO orders_partitioned SELECT * FROM orders;
+
+DROP TABLE orders;
+ALTER TABLE orders_partitioned RENAME TO orders;
+ALTER TABLE orders RENAME CONSTRAINT orders_partitioned_pkey TO orders_pkey;
+
+CREATE INDEX idx_orders_created_at ON orders (created_at DESC);
+CREATE INDEX idx_orders_lookup
+    ON orders (customer_email, created_at DESC, order_id DESC) INCLUDE (status, total_price);
+CREATE INDEX idx_orders_pending
+    ON orders (customer_email, created_at DESC) WHERE status = 'pending';
+
+CREATE TRIGGER orders_changed_notify
+AFTER INSERT OR UPDATE OR DELETE ON orders
+FOR EACH ROW EXECUTE FUNCTION notify_orders_changed();
@@ -0,0 +1,13 @@
+-- Conversation memory and flow state shared by chat API workers.
+--
+-- data is the compact encoding from src/core/conversation_store.py.
+-- version is bumped by every save, which only succeeds when the caller
+-- saw the latest version. Every save rewrites the row, so leave page
+-- space for HOT updates, and keep expires_at unindexed so they stay HOT:
+-- expired rows are purged by a periodic scan.
+CREATE TABLE IF NOT EXISTS conversation_state (
+    conversation_id TEXT PRIMARY KEY,
+    version BIGINT NOT NULL,
+    data BYTEA NOT NULL,
+    expires_at TIMESTAMPTZ NOT NULL
+) WITH (fillfactor = 70);
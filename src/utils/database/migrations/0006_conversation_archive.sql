@@ -0,0 +1,10 @@
+-- Older chat messages moved out of UI sessions, paged back in on demand.
+-- seq is the message's position in the conversation.
+CREATE TABLE IF NOT EXISTS conversation_archive (
+    conversation_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    archived_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (conversation_id, seq)
+);
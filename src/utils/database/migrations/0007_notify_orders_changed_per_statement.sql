@@ -0,0 +1,43 @@
+-- Notify order lookup caches once per statement instead of once per row.
+--
+-- The row-level trigger from 0002 queued one notification per written row,
+-- so a bulk load or bulk cancellation paid for a NOTIFY per row. These
+-- statement-level triggers read the transition tables and send one
+-- notification per distinct customer email. A trigger with transition
+-- tables can only fire on one event, hence three of them.
+CREATE OR REPLACE FUNCTION notify_orders_changed_rows() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM pg_notify('orders_changed', customer_email)
+        FROM (SELECT DISTINCT customer_email FROM new_rows) changed;
+    ELSIF TG_OP = 'UPDATE' THEN
+        PERFORM pg_notify('orders_changed', customer_email)
+        FROM (
+            SELECT customer_email FROM old_rows
+            UNION
+            SELECT customer_email FROM new_rows
+        ) changed;
+    ELSE
+        PERFORM pg_notify('orders_changed', customer_email)
+        FROM (SELECT DISTINCT customer_email FROM old_rows) changed;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS orders_changed_notify ON orders;
+
+CREATE OR REPLACE TRIGGER orders_changed_notify_insert
+AFTER INSERT ON orders
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION notify_orders_changed_rows();
+
+CREATE OR REPLACE TRIGGER orders_changed_notify_update
+AFTER UPDATE ON orders
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION notify_orders_changed_rows();
+
+CREATE OR REPLACE TRIGGER orders_changed_notify_delete
+AFTER DELETE ON orders
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION notify_orders_changed_rows();
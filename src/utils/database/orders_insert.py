@@ -6,6 +6,14 @@ from datetime import datetime, timedelta
 import random
 import uuid
 import os
+import sys
+from pathlib import Path
+
+# Get the project root directory
+PROJECT_ROOT = Path(__file__).parent.parent.parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from src.utils.database.migrate import apply_migrations
 
 logger = logging.getLogger(__name__)
 
@@ -204,25 +212,7 @@ class PGOrders:
         return f"postgresql://{user}:{password}@{host}:5432/{database}"
 
     def _init_db(self):
-        with psycopg.connect(self._get_connection_string()) as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-          CREATE TABLE IF NOT EXISTS orders (
-          order_id VARCHAR(50) PRIMARY KEY,
-          order_detail JSONB NOT NULL,
-          total_price DECIMAL(10,2) NOT NULL,
-          customer_name VARCHAR(100) NOT NULL,
-          customer_email VARCHAR(100) NOT NULL,
-          status VARCHAR(20) NOT NULL,
-          created_at TIMESTAMP NOT NULL,
-          updated_at TIMESTAMP NOT NULL);
-          CREATE INDEX idx_orders_email ON orders(customer_email);
-        CREATE INDEX idx_orders_status ON orders(status);
-        CREATE INDEX idx_orders_created_at ON orders(created_at DESC);
-        """
-                )
-                conn.commit()
+        apply_migrations(self._get_connection_string())
 
     def bulk_insert_orders(self, orders: List[GundamOrder]):
         insert_query = """
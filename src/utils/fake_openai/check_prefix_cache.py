@@ -0,0 +1,85 @@
+"""Check that chain prompts keep a stable, cacheable prefix across turns.
+
+Runs a scripted conversation through OrderQuerySystem against the local
+stand-in server with prefix caching counted token by token, then reports
+for each chain the cached share of prompt tokens and whether every call
+after the first reused at least the static system prompt.
+"""
+import asyncio
+import json
+import os
+import sys
+from pathlib import Path
+
+# Get the project root directory
+PROJECT_ROOT = Path(__file__).parent.parent.parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from src.lang.prompt_vi import SYSTEM_PROMPTS
+from src.utils.fake_openai.server import FakeOpenAIServer, tokenize
+
+SCRIPT = [
+    "Xin chào shop",
+    "Bạn nghĩ gì về mẫu RX-78-2?",
+    "Cho tôi xem đơn hàng của john.smith@email.com",
+    "Unicorn Gundam có ngầu không?",
+    "Cảm ơn nhé",
+]
+
+
+async def run_conversation(system):
+    for message in SCRIPT:
+        async for _ in system.process_query_stream(message):
+            pass
+
+
+def main():
+    intent_reply = json.dumps({"intent": "CHAT", "confidence": 0.9, "email": None, "order_id": None})
+    server = FakeOpenAIServer(
+        ("127.0.0.1", 0),
+        replies={SYSTEM_PROMPTS["intent_classifier"][:60]: intent_reply},
+        default_reply="Vâng ạ.",
+        min_cached_prefix=1,
+        cache_block=1,
+    )
+    server.start_in_thread()
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+
+    from src.core.tools import OrderQuerySystem
+
+    system = OrderQuerySystem(api_key="fake", intent_model_path=None)
+    calls = []
+    original_record = system.llm.usage.record
+
+    def record(chain, usage):
+        entry = original_record(chain, usage)
+        calls.append(dict(system.llm.usage.last))
+        return entry
+
+    system.llm.usage.record = record
+    asyncio.run(run_conversation(system))
+    server.shutdown()
+
+    prompt_keys = {
+        "intent": "intent_classifier",
+        "email": "email_extractor",
+        "order_id": "order_id_extractor",
+        "response": "order_response_formatter",
+        "summary": "history_summarizer",
+    }
+    stable = True
+    for chain, totals in system.llm.usage.snapshot().items():
+        chain_calls = [call for call in calls if call["chain"] == chain]
+        static_tokens = len(tokenize(f"<|system|>{SYSTEM_PROMPTS[prompt_keys.get(chain, chain)]}"))
+        reused = all(call["cached_tokens"] >= static_tokens for call in chain_calls[1:])
+        stable = stable and reused
+        print(
+            f"{chain:20s} calls={totals['calls']:3d} prompt_tokens={totals['prompt_tokens']:6d} "
+            f"cached={totals['cached_tokens']:6d} ({totals['cache_hit_ratio']:.0%}) "
+            f"static_prefix={static_tokens} {'stable' if reused else 'UNSTABLE'}"
+        )
+    sys.exit(0 if stable else 1)
+
+
+if __name__ == "__main__":
+    main()
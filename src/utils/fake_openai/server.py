@@ -0,0 +1,260 @@
+"""Local stand-in for the OpenAI chat completions and embeddings APIs.
+
+Replies with canned text and reports ``prompt_tokens_details.cached_tokens``
+the way OpenAI's prompt caching does: the longest prefix shared with an
+earlier request, counted in blocks once it reaches a minimum length.
+
+Replies take ``--latency-ms`` plus their completion tokens at
+``--tokens-per-second``, so load tests see realistic service times.
+Embeddings are unit vectors seeded by the text: the same text always
+gets the same vector, and different texts are nearly orthogonal.
+
+Example:
+    python server.py --port 8100 --latency-ms 300 --tokens-per-second 80
+    OPENAI_BASE_URL=http://localhost:8100/v1 streamlit run main.py
+"""
+import argparse
+import base64
+import hashlib
+import json
+import math
+import random
+import struct
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+try:
+    import tiktoken
+
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _ENCODING = None
+
+
+def tokenize(text: str) -> List[int]:
+    if _ENCODING is not None:
+        return _ENCODING.encode(text)
+    # Rough stand-in: one token per 4 bytes
+    data = text.encode("utf-8")
+    return [hash(data[i : i + 4]) for i in range(0, len(data), 4)]
+
+
+def fake_embedding(text: str, dims: int = 1536) -> List[float]:
+    """Unit vector seeded by the text"""
+    rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+    vector = [rng.gauss(0.0, 1.0) for _ in range(dims)]
+    norm = math.sqrt(sum(x * x for x in vector))
+    return [x / norm for x in vector]
+
+
+def common_prefix_length(a: List[int], b: List[int]) -> int:
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return length
+
+
+class PromptCache:
+    """Remember recent prompts and measure how much of a new one is cached"""
+
+    def __init__(self, min_prefix: int = 1024, block: int = 128, size: int = 256):
+        self.min_prefix = min_prefix
+        self.block = max(block, 1)
+        self.prompts = deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def lookup_and_store(self, tokens: List[int]) -> int:
+        with self.lock:
+            longest = max((common_prefix_length(tokens, seen) for seen in self.prompts), default=0)
+            self.prompts.append(tokens)
+        if longest < self.min_prefix or longest == 0:
+            return 0
+        return self.min_prefix + (longest - self.min_prefix) // self.block * self.block
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """Threaded HTTP server holding the canned replies and prompt cache.
+
+    ``responder``, if given, is asked for a reply to each request's
+    messages before the canned replies, e.g. to script replies per user
+    message. It returns None to fall back to them.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address=("127.0.0.1", 8100),
+        replies: Optional[Dict[str, str]] = None,
+        default_reply: str = "None",
+        min_cached_prefix: int = 1024,
+        cache_block: int = 128,
+        latency_ms: float = 0.0,
+        tokens_per_second: float = 0.0,
+        embedding_latency_ms: float = 0.0,
+        embedding_dims: int = 1536,
+        responder: Optional[Callable[[List[Dict]], Optional[str]]] = None,
+    ):
+        super().__init__(address, FakeOpenAIHandler)
+        self.replies = replies or {}
+        self.default_reply = default_reply
+        self.cache = PromptCache(min_prefix=min_cached_prefix, block=cache_block)
+        self.latency_ms = latency_ms
+        # 0 generates instantly
+        self.tokens_per_second = tokens_per_second
+        self.embedding_latency_ms = embedding_latency_ms
+        self.embedding_dims = embedding_dims
+        self.responder = responder
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def reply_for(self, messages: List[Dict]) -> str:
+        """Pick the canned reply whose key appears in the first system message"""
+        if self.responder is not None:
+            reply = self.responder(messages)
+            if reply is not None:
+                return reply
+        system = next((m["content"] for m in messages if m["role"] == "system"), "")
+        for key, reply in self.replies.items():
+            if key in system:
+                return reply
+        return self.default_reply
+
+    def completion_seconds(self, completion_tokens: int) -> float:
+        """Time to answer: the fixed latency plus generating the completion"""
+        seconds = self.latency_ms / 1000
+        if self.tokens_per_second > 0:
+            seconds += completion_tokens / self.tokens_per_second
+        return seconds
+
+    def start_in_thread(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    server: FakeOpenAIServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: Dict):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        try:
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up, e.g. a cancelled speculative call
+            pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(200, self._chat_completion(request))
+        elif self.path.rstrip("/").endswith("/embeddings"):
+            self._send_json(200, self._embeddings(request))
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown endpoint {self.path}"}})
+
+    def _chat_completion(self, request: Dict) -> Dict:
+        messages = request.get("messages", [])
+        prompt = "".join(f"<|{m['role']}|>{m['content']}" for m in messages)
+        tokens = tokenize(prompt)
+        cached = self.server.cache.lookup_and_store(tokens)
+        content = self.server.reply_for(messages)
+        completion_tokens = len(tokenize(content))
+        time.sleep(self.server.completion_seconds(completion_tokens))
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": len(tokens),
+                "completion_tokens": completion_tokens,
+                "total_tokens": len(tokens) + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": cached},
+            },
+        }
+
+
+    def _embeddings(self, request: Dict) -> Dict:
+        texts = request.get("input", [])
+        if isinstance(texts, str):
+            texts = [texts]
+        dims = self.server.embedding_dims
+        data = []
+        for index, text in enumerate(texts):
+            vector = fake_embedding(text, dims)
+            if request.get("encoding_format") == "base64":
+                # The openai client asks for packed float32 by default
+                vector = base64.b64encode(struct.pack(f"<{dims}f", *vector)).decode("ascii")
+            data.append({"object": "embedding", "index": index, "embedding": vector})
+        prompt_tokens = sum(len(tokenize(text)) for text in texts)
+        time.sleep(self.server.embedding_latency_ms / 1000)
+        return {
+            "object": "list",
+            "data": data,
+            "model": request.get("model", "fake"),
+            "usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens},
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--reply", default="None", help="Default reply content")
+    parser.add_argument("--replies", help="JSON file mapping system prompt substrings to replies")
+    parser.add_argument("--min-cached-prefix", type=int, default=1024)
+    parser.add_argument("--cache-block", type=int, default=128)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Fixed time before each reply")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0,
+                        help="Completion generation rate; 0 generates instantly")
+    parser.add_argument("--embedding-latency-ms", type=float, default=0.0)
+    parser.add_argument("--embedding-dims", type=int, default=1536)
+    args = parser.parse_args()
+
+    replies = None
+    if args.replies:
+        with open(args.replies, "r", encoding="utf-8") as file:
+            replies = json.load(file)
+
+    server = FakeOpenAIServer(
+        (args.host, args.port),
+        replies=replies,
+        default_reply=args.reply,
+        min_cached_prefix=args.min_cached_prefix,
+        cache_block=args.cache_block,
+        latency_ms=args.latency_ms,
+        tokens_per_second=args.tokens_per_second,
+        embedding_latency_ms=args.embedding_latency_ms,
+        embedding_dims=args.embedding_dims,
+    )
+    print(f"Fake OpenAI server listening on {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,7 @@ from pathlib import Path
 PROJECT_ROOT = Path(__file__).parent.parent.parent.parent
 sys.path.append(str(PROJECT_ROOT))
 
-from src.core.pgvector import PGVector
+from src.core.pgvector import get_vector_store
 from src.core.embedding import EmbeddingClient
 
 load_dotenv()
@@ -24,7 +24,7 @@ class FAQVectorSearch:
         if not api_key:
             raise ValueError("OPENAI_API_KEY environment variable is not set")
             
-        self.pgvector = PGVector()
+        self.pgvector = get_vector_store()
         self.embedding_client = EmbeddingClient(api_key=api_key)
 
     def load_and_add_documents(self, json_path: str):
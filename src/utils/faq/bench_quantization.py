@@ -0,0 +1,242 @@
+"""Benchmark two-stage retrieval with binary-quantized codes.
+
+Compares exact cosine top-k with the two-stage search (Hamming distance
+over binary codes for ``k * multiplier`` candidates, then exact rerank)
+for several candidate multipliers, both in-process with
+BinaryQuantizedIndex and in Postgres with the PGVector search queries.
+Recall is the share of the exact top-k found by the two-stage search.
+
+The corpus is synthetic: clustered unit vectors standing in for FAQ
+variations, queried with perturbed copies of corpus vectors. Postgres
+runs without a vector ANN index unless --vector-index is given, so the
+exact baseline is a full scan. The binary codes get the HNSW Hamming
+index the two-stage search reads its candidates from; it needs pgvector
+0.7, and with older versions only the exact search is measured.
+
+Usage:
+    python src/utils/faq/bench_quantization.py --rows 100000
+    python src/utils/faq/bench_quantization.py --rows 100000 --skip-postgres --multipliers 1 2 4 8
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import numpy as np
+import psycopg
+from dotenv import load_dotenv
+
+# Get the project root directory
+PROJECT_ROOT = Path(__file__).parent.parent.parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from src.core.db import get_connection_string
+from src.core.pgvector import (
+    CREATE_BITS_INDEX_SQL,
+    CREATE_DOCUMENTS_TABLE_SQL,
+    DOCUMENTS_TABLE,
+    MIN_BITS_PGVECTOR_VERSION,
+    SEARCH_SQL,
+    TWO_STAGE_SEARCH_SQL,
+    create_documents_indexes,
+    hnsw_ef_search,
+    pgvector_version,
+)
+from src.core.quantization import BinaryQuantizedIndex, binary_quantize
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+COPY_SQL = "COPY {table} (question, answer, category, embedding, embedding_bits) FROM STDIN"
+
+
+def synthetic_corpus(rows: int, dims: int, clusters: int, spread: float, seed: int) -> np.ndarray:
+    """Unit vectors scattered around random cluster centers"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dims)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, rows)]
+    vectors += spread * rng.standard_normal((rows, dims)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def synthetic_queries(corpus: np.ndarray, count: int, noise: float, seed: int) -> np.ndarray:
+    """Perturbed copies of random corpus vectors, like rephrased questions"""
+    rng = np.random.default_rng([seed, 1])
+    queries = corpus[rng.integers(0, len(corpus), count)].copy()
+    queries += noise * rng.standard_normal(queries.shape).astype(np.float32) / np.sqrt(corpus.shape[1])
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return queries
+
+
+def measure(search: Callable, queries: np.ndarray, k: int, exact: Optional[List[set]] = None) -> Tuple[Dict, List[set]]:
+    """Latency and recall of a search, and the top-k it found.
+
+    Without ``exact`` the search is the baseline and its recall is 1.
+    """
+    latencies, found = [], []
+    for query in queries:
+        started = time.perf_counter()
+        found.append(set(search(query)[:k]))
+        latencies.append((time.perf_counter() - started) * 1000)
+    hits = sum(len(top & expected) for top, expected in zip(found, exact or found))
+    latencies = np.array(latencies)
+    return {
+        "recall": hits / sum(len(expected) for expected in exact or found),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+    }, found
+
+
+def bench_in_process(corpus: np.ndarray, queries: np.ndarray, k: int, multipliers: List[int]) -> Dict:
+    index = BinaryQuantizedIndex(corpus)
+    results = {}
+    results["exact"], exact = measure(lambda q: [row for row, _ in index.search(q, k, 0)], queries, k)
+    for multiplier in multipliers:
+        results[f"x{multiplier}"], _ = measure(
+            lambda q: [row for row, _ in index.search(q, k, multiplier)], queries, k, exact
+        )
+    return {
+        "vectors_mb": index.vectors.nbytes / 2**20,
+        "codes_mb": index.codes.nbytes / 2**20,
+        "latency": results,
+    }
+
+
+def _vector_literal(vector: np.ndarray) -> str:
+    return "[" + ",".join(map(str, vector.tolist())) + "]"
+
+
+def vector_schema() -> str:
+    """Schema the vector extension is installed in"""
+    with psycopg.connect(get_connection_string()) as conn:
+        row = conn.execute("SELECT extnamespace::regnamespace::text FROM pg_extension WHERE extname = 'vector'").fetchone()
+    if row is None:
+        raise ValueError("The vector extension is not installed")
+    return row[0]
+
+
+def bench_conninfo(schema: str) -> str:
+    # The vector type and operators resolve through the search_path, so it
+    # holds the extension's schema too, public by default. Statements that
+    # write name the benchmark schema: on the first run its documents table
+    # doesn't exist yet, and a bare ``documents`` would be public.documents.
+    return f"{get_connection_string()}?options={quote(f'-c search_path={schema},{vector_schema()}')}"
+
+
+def recreate_documents_table(conn: psycopg.Connection, schema: str) -> str:
+    """An empty documents table in the benchmark schema, by qualified name"""
+    table = f'"{schema}".{DOCUMENTS_TABLE}'
+    conn.execute(f"DROP TABLE IF EXISTS {table}")
+    conn.execute(CREATE_DOCUMENTS_TABLE_SQL.format(table=table))
+    return table
+
+
+def load_postgres(conninfo: str, schema: str, corpus: np.ndarray, vector_index: bool) -> bool:
+    """Load the corpus; False when pgvector is too old for the two-stage search"""
+    with psycopg.connect(conninfo) as conn:
+        table = recreate_documents_table(conn, schema)
+        with conn.cursor() as cur:
+            with cur.copy(COPY_SQL.format(table=table)) as copy:
+                for i, vector in enumerate(corpus):
+                    copy.write_row((str(i), str(i), None, _vector_literal(vector), binary_quantize(vector)))
+                    if (i + 1) % 20000 == 0:
+                        logger.info(f"Copied {i + 1}/{len(corpus)} rows")
+        conn.commit()
+    with psycopg.connect(conninfo, autocommit=True) as conn:
+        if vector_index:
+            logger.info("Building vector indexes")
+            # Index names can't be qualified; the table now exists in the schema
+            create_documents_indexes(conn, DOCUMENTS_TABLE)
+        two_stage = pgvector_version(conn) >= MIN_BITS_PGVECTOR_VERSION
+        if two_stage:
+            logger.info("Building the binary code index")
+            conn.execute(CREATE_BITS_INDEX_SQL.format(table=DOCUMENTS_TABLE))
+        else:
+            logger.warning("pgvector is older than 0.7, skipping the two-stage search in Postgres")
+        conn.execute(f"VACUUM ANALYZE {table}")
+    return two_stage
+
+
+def bench_postgres(conninfo: str, queries: np.ndarray, k: int, multipliers: List[int], two_stage: bool) -> Dict:
+    with psycopg.connect(conninfo) as conn:
+
+        def search(template: str, multiplier: int = 0):
+            def run(query):
+                params = {"embedding": _vector_literal(query), "threshold": -1.0, "k": k}
+                if multiplier:
+                    params["bits"] = binary_quantize(query)
+                    params["candidates"] = k * multiplier
+                sql = template.format(category_condition="", filter_condition="")
+                return [int(row[0]) for row in conn.execute(sql, params)]
+            return run
+
+        results = {}
+        results["exact"], exact = measure(search(SEARCH_SQL), queries, k)
+        for multiplier in multipliers if two_stage else []:
+            conn.execute("SELECT set_config('hnsw.ef_search', %s, true)", (str(hnsw_ef_search(k * multiplier)),))
+            results[f"x{multiplier}"], _ = measure(search(TWO_STAGE_SEARCH_SQL, multiplier), queries, k, exact)
+
+        sizes = conn.execute(f"""
+            SELECT pg_size_pretty(pg_table_size('{DOCUMENTS_TABLE}')),
+                   pg_size_pretty(sum(pg_column_size(embedding_bits))),
+                   pg_size_pretty(sum(pg_column_size(embedding)))
+            FROM {DOCUMENTS_TABLE}
+        """).fetchone()
+    return {
+        "sizes": {"table": sizes[0], "codes": sizes[1], "vectors": sizes[2]},
+        "latency": results,
+    }
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Benchmark binary-quantized two-stage retrieval")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dims", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=1000)
+    parser.add_argument("--spread", type=float, default=0.5, help="Within-cluster noise")
+    parser.add_argument("--query-noise", type=float, default=0.5)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--multipliers", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--schema", default="faq_bench")
+    parser.add_argument("--vector-index", action="store_true",
+                        help="Build the vchordrq indexes on the Postgres table")
+    parser.add_argument("--skip-postgres", action="store_true")
+    parser.add_argument("--drop", action="store_true", help="Drop the benchmark schema afterwards")
+    parser.add_argument("--output", help="Write the report as JSON")
+    args = parser.parse_args()
+
+    corpus = synthetic_corpus(args.rows, args.dims, args.clusters, args.spread, args.seed)
+    queries = synthetic_queries(corpus, args.queries, args.query_noise, args.seed)
+    report = {
+        "rows": args.rows,
+        "dims": args.dims,
+        "k": args.k,
+        "in_process": bench_in_process(corpus, queries, args.k, args.multipliers),
+    }
+
+    if not args.skip_postgres:
+        with psycopg.connect(get_connection_string(), autocommit=True) as conn:
+            conn.execute(f'CREATE SCHEMA IF NOT EXISTS "{args.schema}"')
+        conninfo = bench_conninfo(args.schema)
+        two_stage = load_postgres(conninfo, args.schema, corpus, args.vector_index)
+        report["postgres"] = bench_postgres(conninfo, queries, args.k, args.multipliers, two_stage)
+        if args.drop:
+            with psycopg.connect(get_connection_string(), autocommit=True) as conn:
+                conn.execute(f'DROP SCHEMA "{args.schema}" CASCADE')
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""Benchmark FAQ retrieval quality and latency on the enriched FAQ.
+
+Each FAQ in faq_enriched.json has labelled paraphrases. A share of each
+FAQ's variations (--holdout) is held out as queries and the rest are
+indexed. Whole FAQs (--negative-docs) are left out of the index, so
+their variations, together with the non-FAQ messages of
+intent_examples.json, are queries that should find nothing.
+
+For every embedding size (--dims, truncated and renormalized the way
+text-embedding-3 shortens embeddings) and search setting, reports:
+
+- recall@k: share of held-out queries with their FAQ in the top k
+- per threshold, the share of held-out queries answered correctly by the
+  top match, precision of the answers given, and the false-hit rate,
+  i.e. the share of unanswerable queries that still got an answer
+- p50/p99 latency of the search
+
+Searches run in-process with BinaryQuantizedIndex (--multipliers, 0 is
+exact) and in Postgres with the PGVector search query, either as a full
+scan or, with --vector-index, over a vchordrq index for each --probes
+and --epsilon.
+
+Embeddings are cached in --cache, so only the first run calls the
+embedding API and later sweeps run offline.
+
+Usage:
+    python src/utils/faq/bench_retrieval.py
+    python src/utils/faq/bench_retrieval.py --dims 1536 512 256 --k 1 3 5 --skip-postgres
+    python src/utils/faq/bench_retrieval.py --vector-index --probes 1 2 4 8 --epsilon 1.0 1.9 --output retrieval.json
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import psycopg
+from dotenv import load_dotenv
+
+# Get the project root directory
+PROJECT_ROOT = Path(__file__).parent.parent.parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from src.core.db import get_connection_string
+from src.core.embedding import EmbeddingClient
+from src.core.pgvector import SEARCH_SQL
+from src.core.quantization import BinaryQuantizedIndex
+from src.utils.faq.bench_quantization import bench_conninfo, recreate_documents_table, vector_schema
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+FAQ_PATH = Path(__file__).parent / "faq_enriched.json"
+INTENT_EXAMPLES_PATH = PROJECT_ROOT / "src" / "utils" / "intent" / "intent_examples.json"
+CACHE_PATH = Path(__file__).parent / "faq_embeddings.npz"
+
+# Same index options as CREATE_EMBEDDING_INDEX_SQL, sized for the corpus
+INDEX_SQL = """
+          CREATE INDEX {name}_embedding_idx
+          ON {table} USING vchordrq (embedding vector_cosine_ops)
+          WITH (options = $$
+          residual_quantization = true
+          [build.internal]
+          lists = [{lists}]
+          spherical_centroids = true
+          $$)
+        """
+
+COPY_SQL = "COPY {table} (question, answer, embedding) FROM STDIN"
+
+
+class EmbeddingCache:
+    """Embeddings by text in a local .npz file, fetched from the API when missing"""
+
+    def __init__(self, path: Path, model: str):
+        self.path = Path(path)
+        self.model = model
+        self.vectors: Dict[str, np.ndarray] = {}
+        if self.path.exists():
+            data = np.load(self.path, allow_pickle=False)
+            if str(data["model"]) == model:
+                self.vectors = dict(zip(data["texts"].tolist(), data["vectors"]))
+            else:
+                logger.info(f"Ignoring {self.path}, it holds {data['model']} embeddings")
+
+    def embed(self, texts: List[str], batch_size: int = 100) -> np.ndarray:
+        missing = sorted(set(texts) - self.vectors.keys())
+        if missing:
+            api_key = os.getenv("OPENAI_API_KEY")
+            if not api_key:
+                raise ValueError(f"{len(missing)} texts are not cached and OPENAI_API_KEY is not set")
+            client = EmbeddingClient(api_key=api_key)
+            client.model = self.model
+            logger.info(f"Embedding {len(missing)} texts with {self.model}")
+            for start in range(0, len(missing), batch_size):
+                batch = missing[start:start + batch_size]
+                embeddings = client.embed_documents(batch)
+                if len(embeddings) != len(batch):
+                    raise RuntimeError("Embedding request failed")
+                self.vectors.update(zip(batch, np.asarray(embeddings, dtype=np.float32)))
+            self.save()
+        return np.stack([self.vectors[text] for text in texts])
+
+    def save(self):
+        texts = list(self.vectors)
+        np.savez_compressed(
+            self.path, model=self.model, texts=np.array(texts), vectors=np.stack([self.vectors[t] for t in texts])
+        )
+
+
+def split_queries(
+    faq_data: List[Dict], negatives: List[str], holdout: float, negative_docs: int, seed: int
+) -> Tuple[List[Tuple[str, int]], List[Tuple[str, int]]]:
+    """(indexed (text, FAQ), queries (text, FAQ or -1 if unanswerable))"""
+    rng = np.random.default_rng(seed)
+    left_out = set(rng.choice(len(faq_data), size=negative_docs, replace=False).tolist())
+    indexed, queries = [], []
+    for doc_id, doc in enumerate(faq_data):
+        variations = list(doc["variations"])
+        if doc_id in left_out:
+            queries.extend((text, -1) for text in variations)
+            continue
+        rng.shuffle(variations)
+        held = max(1, round(len(variations) * holdout))
+        queries.extend((text, doc_id) for text in variations[:held])
+        indexed.extend((text, doc_id) for text in variations[held:])
+    queries.extend((text, -1) for text in negatives)
+    return indexed, queries
+
+
+def truncate(vectors: np.ndarray, dims: int) -> np.ndarray:
+    """The first ``dims`` dimensions, renormalized"""
+    vectors = vectors[:, :dims]
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def measure(search: Callable, queries: np.ndarray, k: int) -> Tuple[List[List[Tuple[int, float]]], Dict]:
+    """Top-k (row, similarity) per query, and the search latency"""
+    results, latencies = [], []
+    for query in queries:
+        started = time.perf_counter()
+        results.append(search(query, k))
+        latencies.append((time.perf_counter() - started) * 1000)
+    return results, {
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def evaluate(results: List[List[Tuple[int, float]]], row_docs: np.ndarray, query_docs: np.ndarray,
+             ks: List[int], thresholds: List[float]) -> Dict:
+    """Recall@k, and answer quality per threshold of the top match"""
+    answerable = query_docs >= 0
+    found = [[int(row_docs[row]) for row, _ in top] for top in results]
+    positives = [(doc, top) for doc, top in zip(query_docs, found) if doc >= 0]
+    recall = {f"recall@{k}": float(np.mean([doc in top[:k] for doc, top in positives])) for k in ks}
+    top_doc = np.array([top[0] if top else -2 for top in found])
+    top_similarity = np.array([top[0][1] if top else -1.0 for top in results])
+    by_threshold = {}
+    for threshold in thresholds:
+        # Answered like ChatService answers: the best match, above the threshold
+        answered = top_similarity > threshold
+        correct = answered & (top_doc == query_docs)
+        by_threshold[f"{threshold:.2f}"] = {
+            "answered": float(correct[answerable].mean()),
+            "precision": float(correct.sum() / answered.sum()) if answered.any() else 1.0,
+            "false_hit_rate": float(answered[~answerable].mean()) if (~answerable).any() else 0.0,
+        }
+    return {**recall, "thresholds": by_threshold}
+
+
+def operating_point(thresholds: Dict[str, Dict], max_false_hits: float) -> Optional[str]:
+    """Lowest threshold whose false-hit rate is within the target"""
+    for threshold, stats in sorted(thresholds.items(), key=lambda item: float(item[0])):
+        if stats["false_hit_rate"] <= max_false_hits:
+            return threshold
+    return None
+
+
+def bench_in_process(corpus: np.ndarray, queries: np.ndarray, k: int, multipliers: List[int]) -> Dict:
+    index = BinaryQuantizedIndex(corpus)
+    return {
+        ("exact" if multiplier == 0 else f"x{multiplier}"): measure(
+            lambda query, k: index.search(query, k, multiplier), queries, k
+        )
+        for multiplier in multipliers
+    }
+
+
+def _vector_literal(vector: np.ndarray) -> str:
+    return "[" + ",".join(map(str, vector.tolist())) + "]"
+
+
+def load_postgres(conninfo: str, schema: str, corpus: np.ndarray, vector_index: bool, lists: Optional[int]):
+    """A documents table of this embedding size; answer holds the row number"""
+    dims = corpus.shape[1]
+    with psycopg.connect(conninfo) as conn:
+        table = recreate_documents_table(conn, schema)
+        conn.execute(f'ALTER TABLE {table} ALTER COLUMN embedding TYPE "{vector_schema()}".vector({dims})')
+        with conn.cursor() as cur:
+            with cur.copy(COPY_SQL.format(table=table)) as copy:
+                for i, vector in enumerate(corpus):
+                    copy.write_row((str(i), str(i), _vector_literal(vector)))
+        conn.commit()
+    with psycopg.connect(conninfo, autocommit=True) as conn:
+        if vector_index:
+            conn.execute(INDEX_SQL.format(
+                name="documents", table=table, lists=lists or max(1, int(math.sqrt(len(corpus))))
+            ))
+        conn.execute(f"VACUUM ANALYZE {table}")
+
+
+def bench_postgres(conninfo: str, queries: np.ndarray, k: int, vector_index: bool,
+                   probes: List[str], epsilons: List[float]) -> Dict:
+    sql = SEARCH_SQL.format(category_condition="", filter_condition="")
+    settings = [(p, e) for p in probes for e in epsilons] if vector_index else [(None, None)]
+    results = {}
+    with psycopg.connect(conninfo) as conn:
+
+        def search(query, k):
+            params = {"embedding": _vector_literal(query), "threshold": -1.0, "k": k}
+            return [(int(row[1]), float(row[4])) for row in conn.execute(sql, params)]
+
+        for probe, epsilon in settings:
+            name = "scan"
+            if probe is not None:
+                conn.execute("SELECT set_config('vchordrq.probes', %s, false)", (probe,))
+                conn.execute("SELECT set_config('vchordrq.epsilon', %s, false)", (str(epsilon),))
+                name = f"probes={probe},epsilon={epsilon}"
+            results[name] = measure(search, queries, k)
+    return results
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--holdout", type=float, default=0.2, help="Share of each FAQ's variations used as queries")
+    parser.add_argument("--negative-docs", type=int, default=4, help="FAQs left out of the index")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--dims", type=int, nargs="+", default=[1536, 1024, 512, 256])
+    parser.add_argument("--thresholds", type=float, nargs="+",
+                        default=[0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9])
+    parser.add_argument("--max-false-hits", type=float, default=0.05,
+                        help="False-hit rate allowed when picking a threshold")
+    parser.add_argument("--multipliers", type=int, nargs="+", default=[0, 4, 8],
+                        help="In-process rerank multipliers, 0 is exact")
+    parser.add_argument("--model", default="text-embedding-3-small")
+    parser.add_argument("--cache", default=str(CACHE_PATH), help="Embedding cache file")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--schema", default="faq_retrieval_bench")
+    parser.add_argument("--vector-index", action="store_true", help="Search Postgres through a vchordrq index")
+    parser.add_argument("--lists", type=int, help="vchordrq lists, default sqrt(rows)")
+    parser.add_argument("--probes", nargs="+", default=["1", "2", "4", "8"])
+    parser.add_argument("--epsilon", type=float, nargs="+", default=[1.9])
+    parser.add_argument("--skip-postgres", action="store_true")
+    parser.add_argument("--drop", action="store_true", help="Drop the benchmark schema afterwards")
+    parser.add_argument("--output", help="Write the report as JSON")
+    args = parser.parse_args()
+
+    with open(FAQ_PATH, "r", encoding="utf-8") as file:
+        faq_data = json.load(file)
+    with open(INTENT_EXAMPLES_PATH, "r", encoding="utf-8") as file:
+        negatives = [text for intent, texts in json.load(file).items() if intent != "FAQ" for text in texts]
+    indexed, queries = split_queries(faq_data, negatives, args.holdout, args.negative_docs, args.seed)
+    cache = EmbeddingCache(args.cache, args.model)
+    corpus_vectors = cache.embed([text for text, _ in indexed])
+    query_vectors = cache.embed([text for text, _ in queries])
+    row_docs = np.array([doc for _, doc in indexed])
+    query_docs = np.array([doc for _, doc in queries])
+    logger.info(
+        f"{len(indexed)} indexed variations, {int((query_docs >= 0).sum())} held-out queries, "
+        f"{int((query_docs < 0).sum())} unanswerable queries"
+    )
+
+    k = max(args.k)
+    if not args.skip_postgres:
+        with psycopg.connect(get_connection_string(), autocommit=True) as conn:
+            conn.execute(f'CREATE SCHEMA IF NOT EXISTS "{args.schema}"')
+        conninfo = bench_conninfo(args.schema)
+
+    runs = []
+    for dims in args.dims:
+        corpus, query_set = truncate(corpus_vectors, dims), truncate(query_vectors, dims)
+        searches = {("in_process", name): run for name, run in bench_in_process(corpus, query_set, k, args.multipliers).items()}
+        if not args.skip_postgres:
+            load_postgres(conninfo, args.schema, corpus, args.vector_index, args.lists)
+            for name, run in bench_postgres(conninfo, query_set, k, args.vector_index, args.probes, args.epsilon).items():
+                searches[("postgres", name)] = run
+        for (backend, name), (results, latency) in searches.items():
+            quality = evaluate(results, row_docs, query_docs, args.k, args.thresholds)
+            runs.append({
+                "backend": backend,
+                "search": name,
+                "dims": dims,
+                **latency,
+                **quality,
+                "threshold": operating_point(quality["thresholds"], args.max_false_hits),
+            })
+
+    if not args.skip_postgres and args.drop:
+        with psycopg.connect(get_connection_string(), autocommit=True) as conn:
+            conn.execute(f'DROP SCHEMA "{args.schema}" CASCADE')
+
+    recalls = [f"recall@{k}" for k in args.k]
+    print(f"{'backend':<12}{'search':<26}{'dims':>6}" + "".join(f"{name:>11}" for name in recalls)
+          + f"{'p50 ms':>9}{'p99 ms':>9}{'threshold':>11}{'answered':>10}{'precision':>11}{'false hits':>12}")
+    for run in runs:
+        point = run["thresholds"].get(run["threshold"], {})
+        print(
+            f"{run['backend']:<12}{run['search']:<26}{run['dims']:>6}"
+            + "".join(f"{run[name]:>11.3f}" for name in recalls)
+            + f"{run['p50_ms']:>9.2f}{run['p99_ms']:>9.2f}{run['threshold'] or '-':>11}"
+            + f"{point.get('answered', 0.0):>10.3f}{point.get('precision', 0.0):>11.3f}{point.get('false_hit_rate', 0.0):>12.3f}"
+        )
+    print(f"\nthreshold: lowest with a false-hit rate of at most {args.max_false_hits:.0%}")
+
+    report = {
+        "model": args.model,
+        "indexed": len(indexed),
+        "queries": int((query_docs >= 0).sum()),
+        "unanswerable": int((query_docs < 0).sum()),
+        "max_false_hits": args.max_false_hits,
+        "runs": runs,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+"""Blue/green reload of the FAQ vector store.
+
+Instead of appending to the live ``documents`` table, the corpus is
+loaded into ``documents_staging`` with COPY, the embedding index is built
+there, and the result is validated before it replaces the live table:
+
+- the staging table holds one row per variation in the FAQ file, and has
+  not shrunk by more than ``--max-shrink`` compared to the live table;
+- for a sample of variations, searching with the variation's own
+  embedding returns its answer in the top ``--k`` (sample recall).
+
+The swap renames ``documents`` to ``documents_previous`` and the staging
+table to ``documents`` in one short transaction, together with their
+indexes and sequences, so searches see either the old or the new corpus.
+``rollback`` swaps the previous table back in.
+
+With PGVECTOR_SHARD_HOSTS set every shard is reloaded with its share of
+the corpus. All shards are validated before any is swapped, but the
+swaps themselves are one transaction per shard.
+
+Usage:
+    python src/utils/faq/reindex_faq.py load faq_enriched.json
+    python src/utils/faq/reindex_faq.py load faq_enriched.json --no-swap  # validate only
+    python src/utils/faq/reindex_faq.py swap
+    python src/utils/faq/reindex_faq.py rollback
+    python src/utils/faq/reindex_faq.py status
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+import psycopg
+from dotenv import load_dotenv
+from psycopg.types.json import Jsonb
+
+# Get the project root directory
+PROJECT_ROOT = Path(__file__).parent.parent.parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from src.core.embedding import EmbeddingClient
+from src.core.quantization import binary_quantize
+from src.core.pgvector import (
+    CREATE_DOCUMENTS_TABLE_SQL,
+    DOCUMENTS_TABLE,
+    ShardedPGVector,
+    create_documents_indexes,
+    get_vector_store,
+    normalize_metadata,
+    shard_for,
+)
+
+logger = logging.getLogger(__name__)
+
+STAGING_TABLE = f"{DOCUMENTS_TABLE}_staging"
+PREVIOUS_TABLE = f"{DOCUMENTS_TABLE}_previous"
+# Parks the live table while rollback swaps the previous one back
+ROLLBACK_TABLE = f"{DOCUMENTS_TABLE}_rollback"
+
+COPY_SQL = f"COPY {STAGING_TABLE} (question, answer, category, metadata, embedding, embedding_bits) FROM STDIN"
+
+RECALL_SQL = f"""
+    SELECT answer FROM {STAGING_TABLE}
+    ORDER BY embedding <=> %s::vector
+    LIMIT %s
+"""
+
+
+def embed_corpus(faq_data: List[Dict], get_embedding_fn: Callable) -> List[Dict]:
+    """One row per variation, embedded a FAQ entry at a time"""
+    rows = []
+    for doc in faq_data:
+        variations = doc.get("variations", [])
+        embeddings = get_embedding_fn(variations)
+        if len(embeddings) != len(variations):
+            raise ValueError(f"Failed to embed the variations of: {doc.get('original_question')}")
+        metadata, category = normalize_metadata(doc.get("metadata"))
+        for question, embedding in zip(variations, embeddings):
+            rows.append({
+                "key": ShardedPGVector.document_key(doc),
+                "question": question,
+                "answer": doc.get("answer", ""),
+                "category": category,
+                "metadata": metadata,
+                "embedding": embedding,
+            })
+    return rows
+
+
+def _vector_literal(embedding: List[float]) -> str:
+    return "[" + ",".join(map(str, embedding)) + "]"
+
+
+def validation_problems(
+    counts: Dict[str, Optional[int]],
+    expected_rows: int,
+    recall: Optional[float] = None,
+    k: int = 3,
+    min_recall: float = 0.9,
+    max_shrink: float = 0.5,
+) -> List[str]:
+    """Reasons not to swap the staging table in; empty when it can be"""
+    staged, live = counts[STAGING_TABLE], counts[DOCUMENTS_TABLE]
+    if staged is None:
+        return [f"{STAGING_TABLE} does not exist"]
+    problems = []
+    if staged != expected_rows:
+        problems.append(f"{STAGING_TABLE} holds {staged} rows, expected {expected_rows}")
+    if live and staged < live * (1 - max_shrink):
+        problems.append(f"{STAGING_TABLE} holds {staged} rows against {live} live, more than {max_shrink:.0%} fewer")
+    if recall is not None and recall < min_recall:
+        problems.append(f"sample recall@{k} is {recall:.2f}, below {min_recall:.2f}")
+    return problems
+
+
+class FAQReindexer:
+    """Staging, validation and swap of one database's documents table"""
+
+    def __init__(
+        self,
+        conninfo: str,
+        name: str = "primary",
+        category_indexes: Union[Sequence[str], str] = (),
+        bits_index: bool = False,
+        lock_timeout_ms: int = 2000,
+        swap_retries: int = 5,
+    ):
+        self.conninfo = conninfo
+        self.name = name
+        self.category_indexes = category_indexes
+        # Whether the live table has the binary code index of two-stage search
+        self.bits_index = bits_index
+        # The renames wait behind running searches; a short lock timeout
+        # keeps new searches from queueing behind the renames in turn
+        self.lock_timeout_ms = lock_timeout_ms
+        self.swap_retries = swap_retries
+
+    def counts(self) -> Dict[str, Optional[int]]:
+        """Rows in the live, staging and previous tables; None when missing"""
+        counts = {}
+        with psycopg.connect(self.conninfo) as conn:
+            for table in (DOCUMENTS_TABLE, STAGING_TABLE, PREVIOUS_TABLE):
+                exists = conn.execute("SELECT to_regclass(%s)", (table,)).fetchone()[0]
+                counts[table] = conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0] if exists else None
+        return counts
+
+    def load(self, rows: List[Dict]):
+        """Recreate the staging table, COPY rows into it and build its indexes"""
+        with psycopg.connect(self.conninfo) as conn:
+            conn.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+            conn.execute(CREATE_DOCUMENTS_TABLE_SQL.format(table=STAGING_TABLE))
+            with conn.cursor() as cur:
+                with cur.copy(COPY_SQL) as copy:
+                    for row in rows:
+                        copy.write_row((
+                            row["question"],
+                            row["answer"],
+                            row["category"],
+                            Jsonb(row["metadata"]),
+                            _vector_literal(row["embedding"]),
+                            binary_quantize(row["embedding"]),
+                        ))
+            conn.commit()
+
+        # Building the indexes once after the load beats maintaining them per row
+        started = time.perf_counter()
+        with psycopg.connect(self.conninfo, autocommit=True) as conn:
+            create_documents_indexes(conn, STAGING_TABLE, self.category_indexes, self.bits_index)
+            conn.execute(f"ANALYZE {STAGING_TABLE}")
+        logger.info(f"{self.name}: loaded {len(rows)} rows, indexes built in {time.perf_counter() - started:.1f}s")
+
+    def validate(
+        self,
+        rows: List[Dict],
+        sample_size: int = 50,
+        k: int = 3,
+        min_recall: float = 0.9,
+        max_shrink: float = 0.5,
+        seed: int = 0,
+    ) -> Dict:
+        """Check the staging table against the rows loaded into it.
+
+        The report's ``problems`` list is empty when the table can be swapped in.
+        """
+        counts = self.counts()
+        if counts[STAGING_TABLE] is None:
+            problems = validation_problems(counts, len(rows))
+            return {"node": self.name, "counts": counts, "recall": None, "problems": problems}
+
+        sample = random.Random(seed).sample(rows, min(sample_size, len(rows)))
+        hits = 0
+        with psycopg.connect(self.conninfo) as conn:
+            for row in sample:
+                answers = [answer for (answer,) in conn.execute(RECALL_SQL, (_vector_literal(row["embedding"]), k))]
+                hits += row["answer"] in answers
+        recall = hits / len(sample) if sample else None
+        problems = validation_problems(counts, len(rows), recall, k, min_recall, max_shrink)
+        return {"node": self.name, "counts": counts, "recall": recall, "problems": problems}
+
+    def _rename(self, cur: psycopg.Cursor, old: str, new: str):
+        """Rename a documents table with its indexes and id sequence"""
+        indexes = cur.execute(
+            "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s",
+            (old,),
+        ).fetchall()
+        for (index,) in indexes:
+            if index.startswith(old):
+                # Renaming the primary key index renames its constraint too
+                cur.execute(f"ALTER INDEX {index} RENAME TO {new}{index[len(old):]}")
+        sequence = cur.execute("SELECT pg_get_serial_sequence(%s, 'id')", (old,)).fetchone()[0]
+        if sequence:
+            cur.execute(f"ALTER SEQUENCE {sequence} RENAME TO {new}_id_seq")
+        cur.execute(f"ALTER TABLE {old} RENAME TO {new}")
+
+    def _swap_tables(self, renames: List, drop: Optional[str] = None):
+        for attempt in range(1, self.swap_retries + 1):
+            try:
+                with psycopg.connect(self.conninfo) as conn:
+                    with conn.cursor() as cur:
+                        cur.execute(f"SET LOCAL lock_timeout = {int(self.lock_timeout_ms)}")
+                        if drop:
+                            cur.execute(f"DROP TABLE IF EXISTS {drop}")
+                        for old, new in renames:
+                            self._rename(cur, old, new)
+                    conn.commit()
+                return
+            except psycopg.errors.LockNotAvailable:
+                if attempt == self.swap_retries:
+                    raise
+                logger.warning(f"{self.name}: documents busy, retrying swap ({attempt}/{self.swap_retries})")
+                time.sleep(0.5 * attempt)
+
+    def swap(self):
+        """Make the staging table live and keep the live one as previous"""
+        counts = self.counts()
+        if not counts[STAGING_TABLE]:
+            raise ValueError(f"{self.name}: no staging table to swap in")
+        self._swap_tables(
+            [(DOCUMENTS_TABLE, PREVIOUS_TABLE), (STAGING_TABLE, DOCUMENTS_TABLE)],
+            drop=PREVIOUS_TABLE,
+        )
+        logger.info(f"{self.name}: swapped in {counts[STAGING_TABLE]} rows, kept {counts[DOCUMENTS_TABLE]} as {PREVIOUS_TABLE}")
+
+    def rollback(self):
+        """Exchange the live and previous tables; running it again undoes it"""
+        if self.counts()[PREVIOUS_TABLE] is None:
+            raise ValueError(f"{self.name}: no {PREVIOUS_TABLE} table to roll back to")
+        self._swap_tables([
+            (DOCUMENTS_TABLE, ROLLBACK_TABLE),
+            (PREVIOUS_TABLE, DOCUMENTS_TABLE),
+            (ROLLBACK_TABLE, PREVIOUS_TABLE),
+        ])
+        logger.info(f"{self.name}: rolled back to {PREVIOUS_TABLE}")
+
+
+def reindexers_for(store) -> List[FAQReindexer]:
+    if isinstance(store, ShardedPGVector):
+        return [
+            FAQReindexer(
+                shard._get_connection_string(),
+                name=f"shard-{index}",
+                category_indexes=shard.category_indexes,
+                bits_index=bool(shard.rerank_multiplier),
+            )
+            for index, shard in enumerate(store.shards)
+        ]
+    return [
+        FAQReindexer(
+            store._get_connection_string(),
+            category_indexes=store.category_indexes,
+            bits_index=bool(store.rerank_multiplier),
+        )
+    ]
+
+
+def split_rows(rows: List[Dict], num_nodes: int) -> List[List[Dict]]:
+    """Rows per node, sharded as ShardedPGVector.add_documents does"""
+    if num_nodes == 1:
+        return [rows]
+    parts = [[] for _ in range(num_nodes)]
+    for row in rows:
+        parts[shard_for(row["key"], num_nodes)].append(row)
+    return parts
+
+
+def reindex(
+    reindexers: List[FAQReindexer],
+    rows: List[Dict],
+    swap: bool = True,
+    **validate_args,
+) -> List[Dict]:
+    """Load and validate every node, then swap them all if every one passed"""
+    reports = []
+    for reindexer, node_rows in zip(reindexers, split_rows(rows, len(reindexers))):
+        reindexer.load(node_rows)
+        reports.append(reindexer.validate(node_rows, **validate_args))
+
+    if any(report["problems"] for report in reports):
+        logger.error("Validation failed, the live documents table was not touched")
+        return reports
+    if not swap:
+        return reports
+
+    swapped = []
+    try:
+        for reindexer in reindexers:
+            reindexer.swap()
+            swapped.append(reindexer)
+    except Exception:
+        logger.error("Swap failed, rolling back the nodes already swapped")
+        for reindexer in swapped:
+            reindexer.rollback()
+        raise
+    return reports
+
+
+def main():
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Blue/green reload of the FAQ vector store")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    load = subparsers.add_parser("load", help="Load a FAQ file into staging, validate and swap it in")
+    load.add_argument("path", nargs="?", default="faq_enriched.json")
+    load.add_argument("--sample", type=int, default=50, help="Variations checked for recall")
+    load.add_argument("--k", type=int, default=3)
+    load.add_argument("--min-recall", type=float, default=0.9)
+    load.add_argument("--max-shrink", type=float, default=0.5,
+                      help="Largest allowed drop in rows compared to the live table")
+    load.add_argument("--no-swap", action="store_true", help="Stop after validation")
+    subparsers.add_parser("swap", help="Swap a validated staging table in")
+    subparsers.add_parser("rollback", help="Swap the previous table back in")
+    subparsers.add_parser("status", help="Row counts of the live, staging and previous tables")
+    args = parser.parse_args()
+
+    # Also creates the live table on a fresh database
+    reindexers = reindexers_for(get_vector_store())
+
+    if args.command == "load":
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("OPENAI_API_KEY environment variable is not set")
+        embedding_client = EmbeddingClient(api_key=api_key)
+        with open(args.path, "r", encoding="utf-8") as file:
+            faq_data = json.load(file)
+        logger.info(f"Loaded {len(faq_data)} documents from {args.path}")
+
+        rows = embed_corpus(faq_data, embedding_client.embed_documents)
+        reports = reindex(
+            reindexers,
+            rows,
+            swap=not args.no_swap,
+            sample_size=args.sample,
+            k=args.k,
+            min_recall=args.min_recall,
+            max_shrink=args.max_shrink,
+        )
+        print(json.dumps(reports, indent=2))
+        if any(report["problems"] for report in reports):
+            sys.exit(1)
+    elif args.command == "swap":
+        for reindexer in reindexers:
+            reindexer.swap()
+    elif args.command == "rollback":
+        for reindexer in reindexers:
+            reindexer.rollback()
+    else:
+        for reindexer in reindexers:
+            print(reindexer.name, json.dumps(reindexer.counts()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""Train and evaluate the local embedding-based intent classifier.
+
+Examples:
+    python train_intent.py train --output intent_model.npz
+    python train_intent.py train --logs intent_log.jsonl --output intent_model.npz
+    python train_intent.py evaluate --model intent_model.npz --llm
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from dotenv import load_dotenv
+
+# Get the project root directory
+PROJECT_ROOT = Path(__file__).parent.parent.parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from src.core.embedding import EmbeddingClient
+from src.core.intent import EmbeddingIntentClassifier, load_labeled_examples
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_EXAMPLES = str(Path(__file__).parent / "intent_examples.json")
+DEFAULT_FAQ = str(PROJECT_ROOT / "src" / "utils" / "faq" / "faq_enriched.json")
+
+
+def load_dataset(args) -> List[Tuple[str, str]]:
+    """Collect labeled examples from example files, logs and FAQ variations"""
+    examples = load_labeled_examples(args.examples + (args.logs or []))
+    if args.faq and os.path.exists(args.faq):
+        with open(args.faq, "r", encoding="utf-8") as file:
+            for doc in json.load(file):
+                examples.extend((text, "FAQ") for text in doc.get("variations", [])[: args.faq_per_doc])
+    return examples
+
+
+def embed_texts(client: EmbeddingClient, texts: List[str], batch_size: int = 100) -> List[List[float]]:
+    embeddings = []
+    for start in range(0, len(texts), batch_size):
+        batch = client.embed_documents(texts[start : start + batch_size], input_type="search_query")
+        if len(batch) != len(texts[start : start + batch_size]):
+            raise RuntimeError("Embedding request failed")
+        embeddings.extend(batch)
+    return embeddings
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def report(
+    classifier: EmbeddingIntentClassifier,
+    texts: List[str],
+    embeddings: List[List[float]],
+    reference: List[str],
+    reference_latencies: List[float] = None,
+) -> Dict:
+    """Compare local predictions against reference labels"""
+    latencies, correct, confident, confident_correct = [], 0, 0, 0
+    for text, embedding, label in zip(texts, embeddings, reference):
+        start = time.perf_counter()
+        result = classifier.classify(text, embedding)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        intent, _ = classifier.predict(embedding)
+        correct += intent == label
+        if result is not None:
+            confident += 1
+            confident_correct += result["intent"] == label
+
+    total = len(reference) or 1
+    stats = {
+        "examples": len(reference),
+        "accuracy": correct / total,
+        "coverage": confident / total,
+        "confident_accuracy": confident_correct / (confident or 1),
+        # Confident turns answered locally, the rest by the LLM reference
+        "routed_accuracy": (confident_correct + total - confident) / total,
+        "local_p50_ms": percentile(latencies, 50),
+        "local_p99_ms": percentile(latencies, 99),
+    }
+    if reference_latencies:
+        stats["llm_p50_ms"] = percentile(reference_latencies, 50)
+        stats["llm_p99_ms"] = percentile(reference_latencies, 99)
+    return stats
+
+
+def llm_labels(texts: List[str]) -> Tuple[List[str], List[float]]:
+    """Label texts with the intent LLM chain, recording latency"""
+    from src.core.tools import OrderQuerySystem
+
+    chain = OrderQuerySystem().chains["intent"]
+    labels, latencies = [], []
+    for text in texts:
+        start = time.perf_counter()
+        try:
+            labels.append(json.loads(chain.invoke({"input": text, "history": "[]"}))["intent"])
+        except (ValueError, KeyError) as e:
+            logger.warning(f"Unparseable LLM intent for {text!r}: {e}")
+            labels.append("CHAT")
+        latencies.append((time.perf_counter() - start) * 1000)
+    return labels, latencies
+
+
+def train(args):
+    examples = load_dataset(args)
+    random.Random(args.seed).shuffle(examples)
+    holdout = int(len(examples) * args.holdout)
+    test, train_set = examples[:holdout], examples[holdout:]
+    logger.info(f"Training on {len(train_set)} examples, holding out {len(test)}")
+
+    client = EmbeddingClient(api_key=os.getenv("OPENAI_API_KEY"))
+    texts = [text for text, _ in examples]
+    embeddings = embed_texts(client, texts)
+
+    classifier = EmbeddingIntentClassifier.fit(
+        embeddings[holdout:],
+        [label for _, label in train_set],
+        threshold=args.threshold,
+        scale=args.scale,
+    )
+    if test:
+        stats = report(classifier, texts[:holdout], embeddings[:holdout], [label for _, label in test])
+        print(json.dumps(stats, indent=2))
+
+    # Refit on everything before saving
+    classifier = EmbeddingIntentClassifier.fit(
+        embeddings, [label for _, label in examples], threshold=args.threshold, scale=args.scale
+    )
+    classifier.save(args.output)
+    logger.info(f"Saved intent model to {args.output}")
+
+
+def evaluate(args):
+    classifier = EmbeddingIntentClassifier.load(args.model)
+    if args.threshold is not None:
+        classifier.threshold = args.threshold
+    examples = load_dataset(args)
+    texts = [text for text, _ in examples]
+
+    client = EmbeddingClient(api_key=os.getenv("OPENAI_API_KEY"))
+    embeddings = embed_texts(client, texts)
+
+    reference_latencies = None
+    if args.llm:
+        reference, reference_latencies = llm_labels(texts)
+    else:
+        reference = [label for _, label in examples]
+    print(json.dumps(report(classifier, texts, embeddings, reference, reference_latencies), indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    for name in ("train", "evaluate"):
+        sub = subparsers.add_parser(name)
+        sub.add_argument("--examples", nargs="+", default=[DEFAULT_EXAMPLES])
+        sub.add_argument("--logs", nargs="*", help="Intent logs (.jsonl) written via INTENT_LOG_PATH")
+        sub.add_argument("--faq", default=DEFAULT_FAQ, help="FAQ variations used as FAQ examples")
+        sub.add_argument("--faq-per-doc", type=int, default=3)
+        sub.add_argument("--seed", type=int, default=0)
+
+    train_parser = subparsers.choices["train"]
+    train_parser.add_argument("--output", default="intent_model.npz")
+    train_parser.add_argument("--holdout", type=float, default=0.2)
+    train_parser.add_argument("--threshold", type=float, default=0.7)
+    train_parser.add_argument("--scale", type=float, default=20.0)
+
+    evaluate_parser = subparsers.choices["evaluate"]
+    evaluate_parser.add_argument("--model", default="intent_model.npz")
+    evaluate_parser.add_argument("--threshold", type=float)
+    evaluate_parser.add_argument("--llm", action="store_true", help="Use the intent LLM as reference labels")
+
+    args = parser.parse_args()
+    if args.command == "train":
+        train(args)
+    else:
+        evaluate(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,466 @@
+"""End-to-end load test of the chat pipeline, offline.
+
+Runs scripted conversations (conversations.json: FAQ hits and misses,
+order lookups with paging, cancellations, small talk) through
+ChatService, the pipeline behind the Streamlit ChatBot and the chat
+API. Each virtual user runs one conversation after another on a
+StreamRunner thread, as the API does, for --duration seconds.
+
+LLM and embedding calls go to the in-process fake OpenAI server with
+--latency-ms and --tokens-per-second; it answers intent, email and order
+ID prompts as the script says. Orders, FAQ documents and conversation
+state live in their own schema (``loadtest`` by default) of the local
+Postgres, built on the first run like bench_orders.py does.
+
+Reports turns/s, turn latency percentiles, time to first chunk and LLM
+calls and tokens per turn, overall, per answer source and per scenario.
+With --output the report is written as JSON, including the git commit,
+so runs can be compared across commits with --baseline.
+
+Usage:
+    python src/utils/loadtest/load_test.py --concurrency 16 --duration 60 --output loadtest.json
+    python src/utils/loadtest/load_test.py --concurrency 16 --speculative --baseline loadtest.json
+    python src/utils/loadtest/load_test.py --latency-ms 500 --tokens-per-second 50 --concurrency 64
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import quote
+
+import numpy as np
+import psycopg
+from dotenv import load_dotenv
+
+# Get the project root directory
+PROJECT_ROOT = Path(__file__).parent.parent.parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from src.core.chat import ChatService
+from src.core.conversation_store import InMemoryConversationStore, PostgresConversationStore
+from src.core.db import get_connection_string
+from src.core.embedding import EmbeddingClient
+from src.core.order_cache import OrderCache
+from src.core.orders import OrderRepository
+from src.core.pgvector import PGVector
+from src.core.replicas import ReplicaRouter
+from src.core.streaming import StreamRunner
+from src.core.tools import OrderQuerySystem
+from src.lang.prompt_vi import ERROR_MESSAGES, SYSTEM_PROMPTS
+from src.lang.vi import UI_MESSAGES
+from src.utils.database.bench_orders import bench_conninfo
+from src.utils.database.generate_orders import GeneratorConfig, customer_identity, generate_orders
+from src.utils.database.migrate import apply_migrations
+from src.utils.fake_openai.server import FakeOpenAIServer
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+# One line per fake LLM request otherwise
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+SCRIPT_PATH = Path(__file__).parent / "conversations.json"
+FAQ_PATH = PROJECT_ROOT / "src" / "utils" / "faq" / "faq_enriched.json"
+
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+ORDER_ID_PATTERN = re.compile(r"\bORD-[\w-]+")
+
+CHAT_REPLY = (
+    "Chào bạn! Mình là trợ lý của cửa hàng Gundam. Mình có thể giúp bạn tra cứu đơn hàng, "
+    "hủy đơn hoặc giải đáp thắc mắc về sản phẩm và chính sách của cửa hàng."
+)
+
+# Replies that mean the turn failed
+ERROR_REPLIES = (UI_MESSAGES["response_error"], ERROR_MESSAGES["processing_error"])
+
+
+class ScriptedResponder:
+    """Fake server replies for scripted turns.
+
+    Intents are the ones the script gives each message, with any email
+    or order ID in it; the email and order ID extractors find them with
+    a regex. Other prompts get the server's default reply.
+    """
+
+    def __init__(self):
+        # message -> scripted intent
+        self.intents: Dict[str, str] = {}
+        self._prompts = {
+            "intent": SYSTEM_PROMPTS["intent_classifier"][:60],
+            "email": SYSTEM_PROMPTS["email_extractor"][:60],
+            "order_id": SYSTEM_PROMPTS["order_id_extractor"][:60],
+        }
+
+    def expect(self, text: str, intent: str):
+        self.intents[text] = intent
+
+    def __call__(self, messages: List[Dict]) -> Optional[str]:
+        system = next((m["content"] for m in messages if m["role"] == "system"), "")
+        text = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        email = EMAIL_PATTERN.search(text)
+        order_id = ORDER_ID_PATTERN.search(text)
+        if system.startswith(self._prompts["intent"]):
+            return json.dumps({
+                "intent": self.intents.get(text, "CHAT"),
+                "confidence": 0.9,
+                "email": email.group(0) if email else None,
+                "order_id": order_id.group(0) if order_id else None,
+            })
+        if system.startswith(self._prompts["email"]):
+            return email.group(0) if email else "None"
+        if system.startswith(self._prompts["order_id"]):
+            return order_id.group(0) if order_id else "None"
+        return None
+
+
+def loadtest_conninfo(schema: str) -> str:
+    # public holds the vector extension. Migrations run with bench_conninfo,
+    # so their DROP ... IF EXISTS can't reach tables in public.
+    return f"{get_connection_string()}?options={quote(f'-c search_path={schema},public')}"
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def prepare_schema(args):
+    """Migrate the schema and load orders on the first run"""
+    conninfo = bench_conninfo(args.schema)
+    with psycopg.connect(get_connection_string(), autocommit=True) as conn:
+        if args.reload:
+            conn.execute(f'DROP SCHEMA IF EXISTS "{args.schema}" CASCADE')
+        conn.execute(f'CREATE SCHEMA IF NOT EXISTS "{args.schema}"')
+    apply_migrations(conninfo)
+
+    with psycopg.connect(conninfo) as conn:
+        existing = conn.execute("SELECT count(*) FROM orders").fetchone()[0]
+    if existing == 0:
+        # Orders younger than a day are pending, so --days sets how many can be cancelled
+        generate_orders(
+            GeneratorConfig(rows=args.orders, customers=args.customers, days=args.days, seed=args.seed),
+            conninfo,
+        )
+    elif existing != args.orders:
+        raise ValueError(f"Schema {args.schema} holds {existing} orders, pass --reload to rebuild it")
+
+
+def load_faq(vector_db, conninfo: str) -> List[str]:
+    """FAQ variations, embedded by the fake server into an empty documents table"""
+    with open(FAQ_PATH, "r", encoding="utf-8") as file:
+        faq_data = json.load(file)
+    with psycopg.connect(conninfo) as conn:
+        loaded = conn.execute("SELECT count(*) FROM documents").fetchone()[0]
+    if not loaded:
+        logger.info(f"Loading {len(faq_data)} FAQ documents")
+        # Not the pipeline's client, whose cache would start warm on this run only
+        embedding_client = EmbeddingClient(api_key="fake")
+        for doc in faq_data:
+            embeddings = embedding_client.embed_documents(doc["variations"])
+            vector_db.add_documents(
+                [{"variations": doc["variations"], "answer": doc["answer"], "metadata": doc.get("metadata")}],
+                get_embedding_fn=lambda texts: embeddings,
+            )
+    return [question for doc in faq_data for question in doc["variations"]]
+
+
+class PendingOrders:
+    """Pending (email, order ID) pairs, each handed out for one cancellation"""
+
+    def __init__(self, conninfo: str, limit: int, seed: int):
+        with psycopg.connect(conninfo) as conn:
+            self.pairs = conn.execute(
+                "SELECT customer_email, order_id FROM orders WHERE status = 'pending' ORDER BY order_id LIMIT %s",
+                (limit,),
+            ).fetchall()
+        random.Random(seed).shuffle(self.pairs)
+        self._lock = threading.Lock()
+
+    def take(self) -> Optional[tuple]:
+        with self._lock:
+            return self.pairs.pop() if self.pairs else None
+
+
+class LoadTest:
+    """Virtual users running scripted conversations against one ChatService"""
+
+    def __init__(self, chat, store, runner, responder: ScriptedResponder, scenarios: List[Dict], faqs: List[str],
+                 pending: PendingOrders, args):
+        self.chat = chat
+        self.store = store
+        self.runner = runner
+        self.responder = responder
+        self.scenarios = scenarios
+        self.faqs = faqs
+        self.pending = pending
+        self.args = args
+        self.results: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def _conversation_values(self, scenario: Dict, rng: random.Random) -> Dict[str, str]:
+        email = customer_identity(rng.randrange(self.args.customers))[1]
+        order_id = "ORD-NONE"
+        if any("{order_id}" in turn["text"] for turn in scenario["turns"]):
+            pair = self.pending.take()
+            if pair is not None:
+                email, order_id = pair
+        return {"email": email, "order_id": order_id}
+
+    def _turn(self, session, text: str) -> Dict:
+        started = time.perf_counter()
+        first_chunk = None
+        reply = []
+        error = None
+        try:
+            for chunk in self.runner.iterate(lambda: self.chat.stream_response(session, text)):
+                if first_chunk is None:
+                    first_chunk = time.perf_counter() - started
+                reply.append(chunk)
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        seconds = time.perf_counter() - started
+        usage = session.last_usage
+        source = usage.source if usage is not None else "error"
+        if error is None and ("".join(reply) in ERROR_REPLIES or source == "error"):
+            error = "error reply"
+        return {
+            "seconds": seconds,
+            "first_chunk": first_chunk,
+            "source": source,
+            "llm_calls": usage.calls if usage is not None else 0,
+            "llm_tokens": usage.tokens if usage is not None else 0,
+            "error": error,
+        }
+
+    def user(self, index: int, warmup_end: float, end: float):
+        rng = random.Random(self.args.seed * 1000 + index)
+        weights = [scenario.get("weight", 1) for scenario in self.scenarios]
+        while time.perf_counter() < end:
+            scenario = rng.choices(self.scenarios, weights)[0]
+            values = self._conversation_values(scenario, rng)
+            session = self.chat.new_conversation(uuid.uuid4().hex, self.store)
+            for step, turn in enumerate(scenario["turns"]):
+                if time.perf_counter() >= end:
+                    return
+                text = turn["text"].format(faq=rng.choice(self.faqs), **values)
+                if "intent" in turn:
+                    self.responder.expect(text, turn["intent"])
+                started = time.perf_counter()
+                result = self._turn(session, text)
+                if result["error"]:
+                    logger.warning(f"{scenario['name']} turn {step}: {result['error']}")
+                if started >= warmup_end:
+                    result.update(scenario=scenario["name"], step=step)
+                    with self._lock:
+                        self.results.append(result)
+                if self.args.think_ms:
+                    time.sleep(rng.expovariate(1000 / self.args.think_ms))
+
+    def run(self) -> float:
+        """Run the users; returns the measured seconds, after the warmup"""
+        start = time.perf_counter()
+        warmup_end = start + self.args.warmup
+        end = warmup_end + self.args.duration
+        users = [
+            threading.Thread(target=self.user, args=(i, warmup_end, end), name=f"user-{i}", daemon=True)
+            for i in range(self.args.concurrency)
+        ]
+        for thread in users:
+            thread.start()
+        for thread in users:
+            thread.join()
+        # Users finish their last turn after the deadline
+        return time.perf_counter() - warmup_end
+
+
+def latency_stats(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    values = np.array(values) * 1000
+    return {
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+    }
+
+
+def summarize(results: List[Dict], seconds: float) -> Dict:
+    def group(items: List[Dict]) -> Dict:
+        return {
+            "turns": len(items),
+            "errors": sum(1 for item in items if item["error"]),
+            "latency": latency_stats([item["seconds"] for item in items]),
+            "first_chunk": latency_stats([item["first_chunk"] for item in items if item["first_chunk"] is not None]),
+            "llm_calls_per_turn": float(np.mean([item["llm_calls"] for item in items])) if items else 0.0,
+            "llm_tokens_per_turn": float(np.mean([item["llm_tokens"] for item in items])) if items else 0.0,
+        }
+
+    by_source, by_scenario = defaultdict(list), defaultdict(list)
+    for result in results:
+        by_source[result["source"]].append(result)
+        by_scenario[result["scenario"]].append(result)
+    return {
+        **group(results),
+        "seconds": seconds,
+        "turns_per_second": len(results) / seconds if seconds else 0.0,
+        "by_source": {source: group(items) for source, items in sorted(by_source.items())},
+        "by_scenario": {name: group(items) for name, items in sorted(by_scenario.items())},
+    }
+
+
+def compare(report: Dict, baseline: Dict):
+    """Print the change of the headline numbers against a baseline report"""
+    print(f"Against {baseline.get('commit') or 'baseline'} ({baseline.get('started_at')}):")
+    rows = [
+        ("turns/s", lambda r: r["turns_per_second"]),
+        ("p50 ms", lambda r: r["latency"].get("p50_ms")),
+        ("p99 ms", lambda r: r["latency"].get("p99_ms")),
+        ("first chunk p50 ms", lambda r: r["first_chunk"].get("p50_ms")),
+        ("LLM calls/turn", lambda r: r["llm_calls_per_turn"]),
+        ("errors", lambda r: r["errors"]),
+    ]
+    for name, get in rows:
+        old, new = get(baseline), get(report)
+        if old is None or new is None:
+            continue
+        change = f"{(new - old) / old:+.1%}" if old else ""
+        print(f"  {name:<20}{old:>10.2f} -> {new:>10.2f}  {change}")
+
+
+def run(args) -> Dict:
+    conninfo = loadtest_conninfo(args.schema)
+    prepare_schema(args)
+
+    responder = ScriptedResponder()
+    server = FakeOpenAIServer(
+        ("127.0.0.1", 0),
+        default_reply=CHAT_REPLY,
+        latency_ms=args.latency_ms,
+        tokens_per_second=args.tokens_per_second,
+        embedding_latency_ms=args.embedding_latency_ms,
+        responder=responder,
+    )
+    server.start_in_thread()
+    # Read when the OpenAI clients are created
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+
+    router = ReplicaRouter(conninfo, primary_pool_size=args.pool_size)
+    vector_db = PGVector(router)
+    faqs = load_faq(vector_db, conninfo)
+    embedding_client = EmbeddingClient(api_key="fake", cache_size=args.embedding_cache_size)
+    repository = OrderRepository(router.primary.pool, OrderCache(), router)
+    chat = ChatService(
+        OrderQuerySystem(api_key="fake", intent_model_path=args.intent_model, order_repository=repository),
+        vector_db,
+        embedding_client,
+        speculative=args.speculative,
+    )
+    if args.state_store == "postgres":
+        store = PostgresConversationStore(router.primary.pool)
+    else:
+        store = InMemoryConversationStore()
+
+    with open(args.script, "r", encoding="utf-8") as file:
+        scenarios = json.load(file)
+    runner = StreamRunner(max_workers=args.concurrency, name="loadtest")
+    pending = PendingOrders(conninfo, limit=10_000, seed=args.seed)
+    started_at = datetime.now().isoformat(timespec="seconds")
+    logger.info(f"Running {args.concurrency} users for {args.warmup:.0f}s warmup and {args.duration:.0f}s")
+    load_test = LoadTest(chat, store, runner, responder, scenarios, faqs, pending, args)
+    seconds = load_test.run()
+    runner.shutdown()
+    server.shutdown()
+    router.close()
+
+    return {
+        "commit": git_commit(),
+        "started_at": started_at,
+        "config": {
+            key: getattr(args, key)
+            for key in (
+                "concurrency", "duration", "warmup", "think_ms", "latency_ms", "tokens_per_second",
+                "embedding_latency_ms", "speculative", "state_store", "pool_size", "embedding_cache_size",
+                "intent_model", "orders", "customers", "seed",
+            )
+        },
+        **summarize(load_test.results, seconds),
+    }
+
+
+def print_report(report: Dict):
+    latency, first_chunk = report["latency"], report["first_chunk"]
+    print(
+        f"{report['turns']} turns in {report['seconds']:.1f}s: {report['turns_per_second']:.1f} turns/s, "
+        f"{report['errors']} errors"
+    )
+    if latency:
+        print(
+            f"turn p50 {latency['p50_ms']:.1f} ms, p95 {latency['p95_ms']:.1f} ms, p99 {latency['p99_ms']:.1f} ms, "
+            f"first chunk p50 {first_chunk.get('p50_ms', 0.0):.1f} ms, "
+            f"{report['llm_calls_per_turn']:.2f} LLM calls/turn"
+        )
+    print()
+    print(f"{'':<24}{'turns':>7}{'errors':>8}{'p50 ms':>10}{'p99 ms':>10}{'LLM calls':>11}{'tokens':>9}")
+    for kind in ("by_source", "by_scenario"):
+        for name, group in report[kind].items():
+            print(
+                f"{name:<24}{group['turns']:>7}{group['errors']:>8}{group['latency'].get('p50_ms', 0.0):>10.1f}"
+                f"{group['latency'].get('p99_ms', 0.0):>10.1f}{group['llm_calls_per_turn']:>11.2f}"
+                f"{group['llm_tokens_per_turn']:>9.0f}"
+            )
+        print()
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=8, help="Virtual users")
+    parser.add_argument("--duration", type=float, default=60.0, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Seconds before measuring")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="Mean pause between a user's turns")
+    parser.add_argument("--script", default=str(SCRIPT_PATH), help="Scripted conversations")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="Fake LLM time before each reply")
+    parser.add_argument("--tokens-per-second", type=float, default=80.0, help="Fake LLM generation rate")
+    parser.add_argument("--embedding-latency-ms", type=float, default=50.0)
+    parser.add_argument("--speculative", action="store_true", help="Race FAQ lookups against intent calls")
+    parser.add_argument("--intent-model", help="Local intent classifier, see train_intent.py")
+    parser.add_argument("--state-store", choices=["postgres", "memory"], default="postgres")
+    parser.add_argument("--pool-size", type=int, default=10, help="Postgres connections")
+    parser.add_argument("--embedding-cache-size", type=int, default=512)
+    parser.add_argument("--schema", default="loadtest")
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--customers", type=int, default=5_000)
+    parser.add_argument("--days", type=int, default=30, help="Spread of created_at")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reload", action="store_true", help="Rebuild the load test schema")
+    parser.add_argument("--output", help="Write the report as JSON")
+    parser.add_argument("--baseline", help="Report of an earlier run to compare with")
+    args = parser.parse_args()
+
+    report = run(args)
+    print_report(report)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            compare(report, json.load(file))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Summarize per-turn latency from trace files.
+
+Reads JSONL traces written with TRACE_EXPORTER=jsonl and prints, for
+each span name, how often it ran and its latency percentiles. Self time
+excludes child spans, so a turn's stages add up: a slow "llm" shows up
+there, not in the "handle" span around it. Stages that ran in parallel,
+such as speculative FAQ and intent, can add up to more than the turn.
+Token, row and cache counts are summed per span name.
+
+Usage:
+    python src/utils/tracing/summarize_traces.py traces.jsonl
+    python src/utils/tracing/summarize_traces.py traces*.jsonl --slowest 5
+    python src/utils/tracing/summarize_traces.py traces.jsonl --since 2026-10-19T08:00
+"""
+import argparse
+import json
+import math
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+# Numeric span attributes summed per span name
+COUNTED_ATTRS = ("prompt_tokens", "completion_tokens", "cached_tokens", "tokens", "rows")
+# Boolean span attributes counted when true
+FLAG_ATTRS = ("cache_hit", "found", "cancelled")
+
+
+def read_traces(paths: Iterable[str], since: Optional[float] = None) -> Iterator[Dict]:
+    for path in paths:
+        with open(path, encoding="utf-8") as file:
+            for line_number, line in enumerate(file, 1):
+                if not line.strip():
+                    continue
+                try:
+                    trace = json.loads(line)
+                except ValueError:
+                    print(f"Skipping malformed line {path}:{line_number}")
+                    continue
+                if since is None or trace["start"] >= since:
+                    yield trace
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, math.ceil(q / 100 * len(values)) - 1))]
+
+
+def self_times(trace: Dict) -> Dict[str, float]:
+    """Span id -> duration minus the durations of its children"""
+    child_total = defaultdict(float)
+    for span in trace["spans"]:
+        if span["parent"]:
+            child_total[span["parent"]] += span["duration_ms"]
+    return {span["id"]: max(span["duration_ms"] - child_total[span["id"]], 0.0) for span in trace["spans"]}
+
+
+def summarize(traces: Iterable[Dict]) -> Dict:
+    turns = []
+    durations = defaultdict(list)
+    self_durations = defaultdict(list)
+    turns_with = defaultdict(int)
+    counts = defaultdict(lambda: defaultdict(int))
+    for trace in traces:
+        turns.append(trace)
+        own = self_times(trace)
+        seen = set()
+        for span in trace["spans"]:
+            name = span["name"]
+            durations[name].append(span["duration_ms"])
+            self_durations[name].append(own[span["id"]])
+            seen.add(name)
+            for key, value in span["attrs"].items():
+                if key in COUNTED_ATTRS and isinstance(value, (int, float)):
+                    counts[name][key] += value
+                elif key in FLAG_ATTRS and value is True:
+                    counts[name][key] += 1
+        for name in seen:
+            turns_with[name] += 1
+
+    turn_ms = sorted(trace["duration_ms"] for trace in turns)
+    total_self = sum(sum(values) for values in self_durations.values()) or 1.0
+    stages = {}
+    for name, values in durations.items():
+        values.sort()
+        own = self_durations[name]
+        stages[name] = {
+            "spans": len(values),
+            "turns": turns_with[name],
+            "p50_ms": percentile(values, 50),
+            "p95_ms": percentile(values, 95),
+            "max_ms": values[-1],
+            "self_ms": sum(own),
+            "self_share": sum(own) / total_self,
+            **counts[name],
+        }
+    return {
+        "turns": len(turns),
+        "turn_ms": {
+            "p50": percentile(turn_ms, 50),
+            "p95": percentile(turn_ms, 95),
+            "p99": percentile(turn_ms, 99),
+            "max": turn_ms[-1] if turn_ms else 0.0,
+        },
+        "stages": dict(sorted(stages.items(), key=lambda item: -item[1]["self_ms"])),
+        "slowest": sorted(turns, key=lambda trace: -trace["duration_ms"]),
+    }
+
+
+def print_summary(summary: Dict, slowest: int):
+    turn_ms = summary["turn_ms"]
+    print(
+        f"{summary['turns']} turns: p50 {turn_ms['p50']:.1f} ms, p95 {turn_ms['p95']:.1f} ms, "
+        f"p99 {turn_ms['p99']:.1f} ms, max {turn_ms['max']:.1f} ms"
+    )
+    print()
+    print(f"{'span':<24}{'count':>7}{'turns':>7}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'self %':>8}  counts")
+    for name, stage in summary["stages"].items():
+        extra = ", ".join(f"{key}={stage[key]}" for key in COUNTED_ATTRS + FLAG_ATTRS if stage.get(key))
+        print(
+            f"{name:<24}{stage['spans']:>7}{stage['turns']:>7}{stage['p50_ms']:>10.1f}"
+            f"{stage['p95_ms']:>10.1f}{stage['max_ms']:>10.1f}{stage['self_share'] * 100:>7.1f}%  {extra}"
+        )
+
+    for trace in summary["slowest"][:slowest]:
+        print()
+        started = datetime.fromtimestamp(trace["start"]).isoformat(timespec="seconds")
+        print(f"trace {trace['trace_id']} at {started}: {trace['duration_ms']:.1f} ms")
+        depth = {}
+        for span in trace["spans"]:
+            depth[span["id"]] = depth.get(span["parent"], -1) + 1
+            attrs = ", ".join(f"{key}={value}" for key, value in span["attrs"].items() if value is not None)
+            print(
+                f"  {span['offset_ms']:>9.1f} +{span['duration_ms']:>9.1f} ms  "
+                f"{'  ' * depth[span['id']]}{span['name']}  {attrs}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="JSONL trace files")
+    parser.add_argument("--since", help="Only turns started at or after this ISO time")
+    parser.add_argument("--slowest", type=int, default=0, help="Also print the N slowest turns span by span")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    args = parser.parse_args()
+
+    since = datetime.fromisoformat(args.since).timestamp() if args.since else None
+    summary = summarize(read_traces(args.paths, since))
+    if args.json:
+        summary["slowest"] = [trace["trace_id"] for trace in summary["slowest"][: args.slowest]]
+        print(json.dumps(summary, indent=2))
+    else:
+        print_summary(summary, args.slowest)
+
+
+if __name__ == "__main__":
+    main()
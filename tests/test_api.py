@@ -0,0 +1,126 @@
+import json
+
+import pytest
+from starlette.testclient import TestClient
+
+from src.api.app import create_app
+from src.core.chat import SpeculationStats
+from src.core.conversation_store import ConversationConflict, InMemoryConversationStore
+from src.core.tools import OrderQuerySystem
+
+
+class StubChat:
+    """Answers every message with a fixed reply, in chunks"""
+
+    def __init__(self, chunks=("Phí ship ", "là ", "30.000đ")):
+        self.chunks = chunks
+        self.system = OrderQuerySystem(api_key="test", order_repository=object())
+        self.speculation = SpeculationStats()
+
+    def new_conversation(self, conversation_id=None, state_store=None):
+        return self.system.new_session(conversation_id, state_store)
+
+    async def stream_response(self, conversation, user_input):
+        conversation.begin_turn()
+        for chunk in self.chunks:
+            yield chunk
+        conversation.record_exchange(user_input, "".join(self.chunks))
+
+
+class FailingChat(StubChat):
+    """Streams the reply, then fails to save it"""
+
+    def __init__(self, error):
+        super().__init__()
+        self.error = error
+
+    async def stream_response(self, conversation, user_input):
+        async for chunk in super().stream_response(conversation, user_input):
+            yield chunk
+        raise self.error
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("src.core.conversation_store.time.monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def client(clock):
+    app = create_app(chat=StubChat(), store=InMemoryConversationStore(ttl_seconds=60))
+    with TestClient(app) as client:
+        yield client
+
+
+def parse_events(body):
+    events = []
+    for block in body.split("\n\n"):
+        if not block:
+            continue
+        event, data = block.split("\n")
+        assert event.startswith("event: ") and data.startswith("data: ")
+        events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+def test_create_and_get(client):
+    response = client.post("/conversations")
+    assert response.status_code == 201
+    conversation_id = response.json()["conversation_id"]
+    assert client.get(f"/conversations/{conversation_id}").json() == {
+        "conversation_id": conversation_id,
+        "messages": [],
+    }
+
+
+def test_message_streams_sse_events(client):
+    conversation_id = client.post("/conversations").json()["conversation_id"]
+    response = client.post(f"/conversations/{conversation_id}/messages", json={"message": "Phí ship?"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.headers["cache-control"] == "no-cache"
+    assert parse_events(response.text) == [
+        ("chunk", {"text": "Phí ship "}),
+        ("chunk", {"text": "là "}),
+        ("chunk", {"text": "30.000đ"}),
+        ("done", {"reply": "Phí ship là 30.000đ"}),
+    ]
+    messages = client.get(f"/conversations/{conversation_id}").json()["messages"]
+    assert [message["content"] for message in messages] == ["Phí ship?", "Phí ship là 30.000đ"]
+
+
+def test_expired_conversation_is_not_found(client, clock):
+    conversation_id = client.post("/conversations").json()["conversation_id"]
+    clock[0] += 61
+    assert client.get(f"/conversations/{conversation_id}").status_code == 404
+    response = client.post(f"/conversations/{conversation_id}/messages", json={"message": "hi"})
+    assert response.status_code == 404
+    assert response.json() == {"error": "conversation not found"}
+
+
+def test_delete(client):
+    conversation_id = client.post("/conversations").json()["conversation_id"]
+    assert client.delete(f"/conversations/{conversation_id}").status_code == 204
+    assert client.delete(f"/conversations/{conversation_id}").status_code == 404
+
+
+@pytest.mark.parametrize("body", [{}, {"message": ""}, {"message": 1}, ["hi"]])
+def test_message_must_be_a_non_empty_string(client, body):
+    conversation_id = client.post("/conversations").json()["conversation_id"]
+    response = client.post(f"/conversations/{conversation_id}/messages", json=body)
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("error, expected", [
+    (ConversationConflict("version 1"), {"error": "conversation changed during the turn, retry", "status": 409}),
+    (RuntimeError("llm down"), {"error": "llm down", "status": 500}),
+])
+def test_failed_turn_ends_with_error_event(clock, error, expected):
+    app = create_app(chat=FailingChat(error), store=InMemoryConversationStore(ttl_seconds=60))
+    with TestClient(app) as client:
+        conversation_id = client.post("/conversations").json()["conversation_id"]
+        response = client.post(f"/conversations/{conversation_id}/messages", json={"message": "hi"})
+    assert response.status_code == 200
+    assert parse_events(response.text)[-1] == ("error", expected)
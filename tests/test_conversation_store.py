@@ -0,0 +1,91 @@
+import pytest
+
+from src.core.conversation_store import (
+    COMPRESS_MIN_BYTES,
+    ConversationConflict,
+    InMemoryConversationStore,
+    decode_record,
+    encode_record,
+)
+from src.core.tools import ConversationMemory, ConversationState, OrderQuerySystem
+
+
+def test_small_record_is_plain_json():
+    data = encode_record({"m": [["u", "xin chào", 1]]})
+    assert data == 'j{"m":[["u","xin chào",1]]}'.encode("utf-8")
+    assert decode_record(data) == {"m": [["u", "xin chào", 1]]}
+
+
+def test_large_record_is_compressed():
+    record = {"m": [["a", "đơn hàng " * 20, i] for i in range(10)]}
+    data = encode_record(record)
+    assert data[:1] == b"z"
+    assert len(data) < COMPRESS_MIN_BYTES
+    assert decode_record(memoryview(data)) == record
+
+
+def test_memory_and_state_round_trip():
+    memory = ConversationMemory(max_messages=3)
+    for role, content in [("user", "a"), ("assistant", "b"), ("user", "c"), ("assistant", "d")]:
+        memory.add_message(role, content)
+    memory.summary = "earlier"
+    state = ConversationState()
+    state.start_flow("CANCEL_ORDER")
+    state.add_data("email", "a@example.com")
+    record = decode_record(encode_record({**memory.to_record(), **state.to_record()}))
+
+    restored_memory, restored_state = ConversationMemory(max_messages=3), ConversationState()
+    restored_memory.load_record(record)
+    restored_state.load_record(record)
+    assert restored_memory.get_history(as_dict=True)[0]["content"] == "b"
+    assert [(m.role, m.content) for m in restored_memory.messages] == [(m.role, m.content) for m in memory.messages]
+    assert restored_memory.summary == "earlier"
+    assert restored_state.is_cancel_flow()
+    assert restored_state.get_data("email") == "a@example.com"
+
+
+def test_save_needs_the_loaded_version():
+    store = InMemoryConversationStore()
+    assert store.load("c1") is None
+    assert store.save("c1", {"m": []}, 0) == 1
+    version, _ = store.load("c1")
+    assert store.save("c1", {"m": [["u", "a", 1]]}, version) == 2
+    # Another turn saved since version 1 was loaded
+    with pytest.raises(ConversationConflict):
+        store.save("c1", {"m": []}, version)
+    assert store.load("c1") == (2, {"m": [["u", "a", 1]]})
+
+
+def test_expired_conversation_starts_over(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("src.core.conversation_store.time.monotonic", lambda: now[0])
+    store = InMemoryConversationStore(ttl_seconds=60)
+    store.save("c1", {"m": []}, 0)
+    store.save("c1", {"m": []}, 1)
+    now[0] += 61
+    assert store.load("c1") is None
+    # Any version may save over an expired conversation
+    assert store.save("c1", {"m": []}, 2) == 1
+
+
+def test_delete():
+    store = InMemoryConversationStore()
+    store.save("c1", {}, 0)
+    assert store.delete("c1")
+    assert not store.delete("c1")
+    assert store.load("c1") is None
+
+
+def test_sessions_conflict_on_concurrent_turns():
+    system = OrderQuerySystem(api_key="test", order_repository=object())
+    store = InMemoryConversationStore()
+    first, second = system.new_session("c1", store), system.new_session("c1", store)
+    first.begin_turn()
+    second.begin_turn()
+    first.record_exchange("Phí ship?", "30.000đ")
+    with pytest.raises(ConversationConflict):
+        second.record_exchange("Đổi trả?", "7 ngày")
+    # A fresh session sees the first turn
+    third = system.new_session("c1", store)
+    assert third.load_state()
+    assert [m.content for m in third.memory.messages] == ["Phí ship?", "30.000đ"]
@@ -0,0 +1,41 @@
+import pytest
+
+from src.core.intent import faq_categories_for
+from src.core.pgvector import category_indexes_from_env, normalize_metadata
+
+
+@pytest.mark.parametrize("metadata, expected", [
+    # The FAQ files give the category as a bare string
+    ("shipping", ({"category": "shipping"}, "shipping")),
+    ("", ({}, None)),
+    (None, ({}, None)),
+    ({"category": "cancel", "tags": ["x"]}, ({"category": "cancel", "tags": ["x"]}, "cancel")),
+    ({"tags": ["x"]}, ({"tags": ["x"]}, None)),
+])
+def test_normalize_metadata(metadata, expected):
+    assert normalize_metadata(metadata) == expected
+
+
+def test_normalize_metadata_copies():
+    metadata = {"category": "cancel"}
+    normalize_metadata(metadata)[0]["extra"] = 1
+    assert metadata == {"category": "cancel"}
+
+
+def test_categories_for_order_intents():
+    assert faq_categories_for({"intent": "CANCEL_ORDER"}) == ["cancel", "returns", "payment"]
+
+
+@pytest.mark.parametrize("intent_result", [None, {"intent": "FAQ"}, {"intent": "CHAT"}])
+def test_other_intents_search_everything(intent_result):
+    assert faq_categories_for(intent_result) is None
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("", []),
+    ("all", "all"),
+    (" shipping, cancel ,,", ["shipping", "cancel"]),
+])
+def test_category_indexes_from_env(monkeypatch, value, expected):
+    monkeypatch.setenv("PGVECTOR_CATEGORY_INDEXES", value)
+    assert category_indexes_from_env() == expected
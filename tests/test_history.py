@@ -0,0 +1,112 @@
+import json
+import threading
+
+from src.core.history import TRUNCATION_MARKER, HistoryBuilder, RollingSummarizer
+from src.core.tools import ChatMessage, ConversationMemory
+
+
+def builder(**kwargs) -> HistoryBuilder:
+    # An unknown encoding estimates 4 characters per token, without a download
+    return HistoryBuilder(encoding_name="estimate", **kwargs)
+
+
+def messages(count: int, size: int = 30):
+    # 36-character lines: 10 estimated tokens, 11 with the newline
+    return [ChatMessage("user", f"{i:02d}".ljust(size, "x")) for i in range(count)]
+
+
+def test_keeps_newest_messages_within_budget():
+    rendered = builder(budgets={"chat": 35}).render(messages(5), "chat").splitlines()
+    assert [line[6:8] for line in rendered] == ["02", "03", "04"]
+
+
+def test_budget_is_per_chain():
+    history = builder(budgets={"intent": 11, "chat": 55})
+    assert len(history.render(messages(5), "intent").splitlines()) == 1
+    assert len(history.render(messages(5), "chat").splitlines()) == 5
+    assert history.render(messages(5), "unknown") == history.render(messages(5), "chat")
+
+
+def test_long_message_is_truncated():
+    line = builder(max_message_tokens=10).render_message(ChatMessage("assistant", "y" * 200))
+    assert line == "assistant: " + "y" * 40 + TRUNCATION_MARKER
+
+
+def test_summary_first_only_when_it_fits():
+    history = builder(budgets={"chat": 30})
+    assert history.render(messages(2), "chat", "short").splitlines()[0] == "summary: short"
+    assert "summary" not in history.render(messages(2), "chat", "s" * 100)
+
+
+def test_summarizer_keeps_summary_on_error():
+    def fail(summary, message):
+        raise RuntimeError("down")
+
+    assert RollingSummarizer(fail, builder())("before", [ChatMessage("user", "hi")]) == "before"
+
+
+def summarizing_memory(summarize_fn):
+    return ConversationMemory(
+        max_messages=2, history_builder=builder(), summarizer=RollingSummarizer(summarize_fn, builder())
+    )
+
+
+def test_memory_summarizes_evicted_messages_in_the_background():
+    folded, release = [], threading.Event()
+
+    def summarize(summary, lines):
+        release.wait(5)
+        folded.append(lines)
+        return summary + lines
+
+    memory = summarizing_memory(summarize)
+    for content in ("a", "b", "c", "d"):
+        memory.add_message("user", content)
+    memory.start_summary()
+    # Not ready: the evicted messages stay in the history
+    memory.apply_summary()
+    assert memory.summary == ""
+    assert memory.get_context_string("chat").splitlines() == ["user: a", "user: b", "user: c", "user: d"]
+
+    release.set()
+    memory.summarizer.start("", memory.unsummarized).result(5)
+    memory.apply_summary()
+    assert folded == ["user: a\nuser: b"]
+    assert memory.summary == "user: a\nuser: b"
+    assert memory.get_context_string("chat") == "summary: user: a\nuser: b\nuser: c\nuser: d"
+
+
+def test_later_session_applies_the_summary_started_by_an_earlier_one():
+    calls = []
+    summarizer = RollingSummarizer(lambda summary, lines: calls.append(lines) or lines, builder())
+    memory = ConversationMemory(max_messages=2, history_builder=builder(), summarizer=summarizer)
+    for content in ("a", "b", "c"):
+        memory.add_message("user", content)
+    memory.start_summary()
+    summarizer.start("", memory.unsummarized).result(5)
+
+    restored = ConversationMemory(max_messages=2, history_builder=builder(), summarizer=summarizer)
+    restored.load_record(json.loads(json.dumps(memory.to_record())))
+    assert [message.content for message in restored.unsummarized] == ["a"]
+    restored.apply_summary()
+    assert restored.summary == "user: a"
+    assert restored.unsummarized == []
+    assert calls == ["user: a"]
+
+
+def test_pending_input_drops_oldest_message_of_full_memory():
+    memory = ConversationMemory(max_messages=3)
+    for content in ("a", "b", "c"):
+        memory.add_message("user", content)
+    rendered = memory.get_context_string(pending_user_input="d")
+    assert [message["content"] for message in json.loads(rendered)] == ["b", "c", "d"]
+    assert len(memory.messages) == 3
+
+
+def test_pending_input_keeps_every_message_below_capacity():
+    memory = ConversationMemory(max_messages=3, history_builder=builder(budgets={"chat": 100}))
+    memory.add_message("user", "a")
+    memory.add_message("assistant", "b")
+    assert memory.get_context_string("chat", pending_user_input="c").splitlines() == [
+        "user: a", "assistant: b", "user: c"
+    ]
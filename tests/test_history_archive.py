@@ -0,0 +1,92 @@
+import pytest
+
+import ui.bot_ui as bot_ui
+from src.core.conversation_store import InMemoryConversationStore
+
+
+def messages(start, end):
+    return [{"role": "user", "content": f"m{i}"} for i in range(start, end)]
+
+
+def contents(rows):
+    return [row["content"] for row in rows]
+
+
+def test_archive_is_numbered_and_idempotent():
+    store = InMemoryConversationStore()
+    store.archive("c1", 0, messages(0, 4))
+    # A retried batch overlapping what is stored adds only the new messages
+    store.archive("c1", 2, messages(2, 6))
+    assert contents(store.load_archive("c1", 6, 3)) == ["m3", "m4", "m5"]
+    assert contents(store.load_archive("c1", 2, 10)) == ["m0", "m1"]
+    assert store.load_archive("other", 6, 3) == []
+
+
+def test_archive_expires_with_its_conversation(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("src.core.conversation_store.time.monotonic", lambda: now[0])
+    store = InMemoryConversationStore(ttl_seconds=60)
+    store.save("c1", {"m": []}, 0)
+    store.archive("c1", 0, messages(0, 2))
+    now[0] += 61
+    assert store.load("c1") is None
+    assert store.load_archive("c1", 2, 2) == []
+
+
+class SessionState(dict):
+    __getattr__ = dict.__getitem__
+
+    def __setattr__(self, key, value):
+        self[key] = value
+
+
+@pytest.fixture
+def bot(monkeypatch):
+    store = InMemoryConversationStore()
+    loads = []
+    load_archive = store.load_archive
+    monkeypatch.setattr(store, "load_archive", lambda *args: loads.append(args) or load_archive(*args))
+    monkeypatch.setattr(bot_ui, "get_archive_store", lambda: store)
+    monkeypatch.setattr(bot_ui, "window_messages", 4)
+    monkeypatch.setattr(bot_ui, "session_max_messages", 8)
+    monkeypatch.setattr(bot_ui.st, "session_state", SessionState(conversation_id="c1"))
+    chat_bot = bot_ui.ChatBot.__new__(bot_ui.ChatBot)
+    chat_bot._reset_messages()
+    chat_bot.loads = loads
+    chat_bot.store = store
+    return chat_bot
+
+
+def test_session_keeps_a_window_and_archives_the_rest(bot):
+    for i in range(20):
+        bot.add_message("user", f"m{i}")
+    state = bot_ui.st.session_state
+    assert state.archived == 15
+    assert contents(state.messages) == ["m15", "m16", "m17", "m18", "m19"]
+    # Under the conversation id, so the stored conversation finds it
+    assert contents(bot.store.load_archive("c1", 15, 2)) == ["m13", "m14"]
+
+
+def test_older_pages_are_loaded_once(bot):
+    for i in range(20):
+        bot.add_message("user", f"m{i}")
+    bot_ui.st.session_state.older_pages = 1
+    for _ in range(3):
+        assert contents(bot.older_messages(4)) == ["m12", "m13", "m14", "m15"]
+    assert len(bot.loads) == 1
+
+    bot_ui.st.session_state.older_pages = 3
+    assert contents(bot.older_messages(12)) == contents(messages(4, 16))
+    assert contents(bot.older_messages(12)) == contents(messages(4, 16))
+    assert len(bot.loads) == 2
+
+
+def test_loaded_pages_follow_new_archives(bot):
+    for i in range(20):
+        bot.add_message("user", f"m{i}")
+    bot_ui.st.session_state.older_pages = 3
+    bot.older_messages(12)
+    for i in range(20, 26):
+        bot.add_message("user", f"m{i}")
+    assert contents(bot.older_messages(12)) == contents(messages(10, 22))
+    assert len(bot.loads) == 1
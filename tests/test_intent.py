@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from src.core.intent import EmbeddingIntentClassifier, extract_email, extract_order_id
+
+
+def classifier(threshold=0.7):
+    # One axis per intent, two noisy examples each
+    embeddings = [[1, 0.1, 0], [1, 0, 0.1], [0.1, 1, 0], [0, 1, 0.1], [0, 0.1, 1], [0.1, 0, 1]]
+    labels = ["CHECK_ORDERS", "CHECK_ORDERS", "CANCEL_ORDER", "CANCEL_ORDER", "FAQ", "FAQ"]
+    return EmbeddingIntentClassifier.fit(embeddings, labels, threshold=threshold)
+
+
+def test_fit_orders_labels_like_intent_labels():
+    assert classifier().labels == ["CHECK_ORDERS", "CANCEL_ORDER", "FAQ"]
+
+
+def test_fit_without_examples_fails():
+    with pytest.raises(ValueError):
+        EmbeddingIntentClassifier.fit([[1, 0]], ["UNKNOWN"])
+
+
+def test_confident_prediction_is_classified():
+    result = classifier().classify("Cancel ORD-12ab for me@example.com", [0, 2, 0])
+    assert result["intent"] == "CANCEL_ORDER"
+    assert result["confidence"] >= 0.7
+    assert result["email"] == "me@example.com"
+    assert result["order_id"] == "ORD-12AB"
+
+
+def test_ambiguous_prediction_falls_back():
+    # Equally close to two centroids: about 0.5 confidence each
+    assert classifier().classify("?", [1, 1, 0]) is None
+
+
+def test_threshold_decides_fallback():
+    _, confidence = classifier().predict([1, 0.6, 0])
+    assert classifier(threshold=confidence - 0.01).classify("", [1, 0.6, 0]) is not None
+    assert classifier(threshold=confidence + 0.01).classify("", [1, 0.6, 0]) is None
+
+
+def test_zero_embedding_does_not_divide_by_zero():
+    intent, confidence = classifier().predict([0, 0, 0])
+    assert intent in classifier().labels
+    assert np.isfinite(confidence)
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = tmp_path / "intent.npz"
+    original = classifier(threshold=0.8)
+    original.save(str(path))
+    loaded = EmbeddingIntentClassifier.load(str(path))
+    assert loaded.labels == original.labels
+    assert loaded.threshold == 0.8
+    assert loaded.predict([0, 0.2, 1]) == pytest.approx(original.predict([0, 0.2, 1]))
+
+
+def test_extractors():
+    assert extract_email("mail a.b+c@shop.example.vn please") == "a.b+c@shop.example.vn"
+    assert extract_order_id("đơn #abc-1") == "ABC-1"
+    assert extract_order_id("no order here") is None
@@ -0,0 +1,101 @@
+import pytest
+
+from src.core.metrics import MetricsRegistry, record_llm_call, turn_usage
+
+
+def samples(registry):
+    """Sample lines of a rendering, without HELP and TYPE comments"""
+    return [line for line in registry.render().splitlines() if not line.startswith("#")]
+
+
+def test_counter_is_named_with_total_suffix():
+    registry = MetricsRegistry()
+    errors = registry.counter("chat_errors", "Errors by chain", ("chain",))
+    errors.labels("intent").inc()
+    errors.labels("intent").inc(2)
+    errors.labels('say "hi"\n').inc()
+    assert registry.render().splitlines() == [
+        "# HELP chat_errors_total Errors by chain",
+        "# TYPE chat_errors_total counter",
+        'chat_errors_total{chain="intent"} 3.0',
+        'chat_errors_total{chain="say \\"hi\\"\\n"} 1.0',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    latency = registry.histogram("chat_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        latency.observe(value)
+    assert samples(registry) == [
+        'chat_seconds_bucket{le="0.1"} 1',
+        'chat_seconds_bucket{le="1.0"} 3',
+        'chat_seconds_bucket{le="+Inf"} 4',
+        "chat_seconds_sum 4.25",
+        "chat_seconds_count 4",
+    ]
+
+
+def test_value_on_a_bound_falls_in_that_bucket():
+    registry = MetricsRegistry()
+    calls = registry.histogram("chat_calls", "Calls", ("source",), buckets=(0, 1, 2))
+    for value in (0, 1, 1, 2):
+        calls.labels("faq").observe(value)
+    assert samples(registry)[:4] == [
+        'chat_calls_bucket{source="faq",le="0.0"} 1',
+        'chat_calls_bucket{source="faq",le="1.0"} 3',
+        'chat_calls_bucket{source="faq",le="2.0"} 4',
+        'chat_calls_bucket{source="faq",le="+Inf"} 4',
+    ]
+
+
+def test_registering_twice_returns_the_same_metric():
+    registry = MetricsRegistry()
+    assert registry.counter("chat_errors", "Errors") is registry.counter("chat_errors", "Errors")
+
+
+def test_labels_must_match_label_names():
+    registry = MetricsRegistry()
+    errors = registry.counter("chat_errors", "Errors", ("chain",))
+    with pytest.raises(ValueError):
+        errors.labels("intent", "extra")
+
+
+def test_callback_metric_reads_values_at_render():
+    registry = MetricsRegistry()
+    size = [2]
+    registry.callback("chat_pool_size", "Pool size", lambda: [({"pool": "primary"}, size[0])])
+    registry.callback("chat_events", "Events", lambda: [({"event": "turns"}, 5)], kind="counter")
+    size[0] = 3
+    assert samples(registry) == ['chat_pool_size{pool="primary"} 3', 'chat_events_total{event="turns"} 5']
+
+
+def test_callback_error_is_logged_once_until_it_recovers(caplog):
+    registry = MetricsRegistry()
+    healthy = [False]
+
+    def collect():
+        if not healthy[0]:
+            raise RuntimeError("pool closed")
+        return [({}, 1)]
+
+    registry.callback("chat_pool_size", "Pool size", collect)
+    registry.callback("chat_other", "Other", lambda: [({}, 2)])
+    for _ in range(3):
+        assert samples(registry) == ["chat_other 2"]
+    assert [record.getMessage() for record in caplog.records] == [
+        "Metrics collection failed for chat_pool_size; not logged again until it recovers"
+    ]
+
+    healthy[0] = True
+    assert samples(registry) == ["chat_pool_size 1", "chat_other 2"]
+    healthy[0] = False
+    samples(registry)
+    assert len(caplog.records) == 2
+
+
+def test_llm_calls_count_towards_the_running_turn():
+    with turn_usage() as usage:
+        record_llm_call("intent", "m", 0.1, {"prompt_tokens": 10, "completion_tokens": 2})
+        record_llm_call("response", "m", 0.2, {"prompt_tokens": 20, "completion_tokens": 5, "cached_tokens": 8})
+    assert (usage.calls, usage.tokens) == (2, 37)
@@ -0,0 +1,62 @@
+from src.core.order_cache import OrderCache
+
+
+def test_read_before_invalidation_is_not_stored():
+    cache = OrderCache()
+    epoch = cache.begin_read()
+    # A cancellation lands while the lookup is querying
+    cache.invalidate("a@example.com")
+    cache.set("a@example.com", "stale", epoch)
+    assert cache.get("a@example.com") is None
+
+
+def test_invalidation_of_another_email_also_rejects_the_read():
+    # One epoch for the whole cache: conservative, never stale
+    cache = OrderCache()
+    epoch = cache.begin_read()
+    cache.invalidate("b@example.com")
+    cache.set("a@example.com", "orders", epoch)
+    assert cache.get("a@example.com") is None
+
+
+def test_read_after_invalidation_is_stored():
+    cache = OrderCache()
+    cache.invalidate("a@example.com")
+    cache.set("a@example.com", "orders", cache.begin_read())
+    assert cache.get("a@example.com") == "orders"
+    cache.invalidate("a@example.com")
+    assert cache.get("a@example.com") is None
+
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("src.core.order_cache.time.monotonic", lambda: now[0])
+    cache = OrderCache(ttl_seconds=30)
+    cache.set("a@example.com", "orders", cache.begin_read())
+    now[0] += 29
+    assert cache.get("a@example.com") == "orders"
+    now[0] += 2
+    assert cache.get("a@example.com") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = OrderCache(max_entries=2)
+    for email in ("a", "b"):
+        cache.set(email, email, cache.begin_read())
+    cache.get("a")
+    cache.set("c", "c", cache.begin_read())
+    assert cache.get("b") is None
+    assert cache.get("a") == "a" and cache.get("c") == "c"
+
+
+def test_disabled_cache_is_bypassed_and_rejects_reads_started_before():
+    cache = OrderCache()
+    cache.set("a", "orders", cache.begin_read())
+    epoch = cache.begin_read()
+    cache.set_enabled(False)
+    assert cache.get("a") is None
+    cache.set_enabled(True)
+    # Writes while disabled went unnoticed, so the older read is dropped
+    cache.set("a", "stale", epoch)
+    assert cache.get("a") is None
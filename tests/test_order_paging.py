@@ -0,0 +1,99 @@
+import asyncio
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from src.core.orders import Order, OrderSummary
+from src.core.tools import MORE_ORDERS_PATTERN, ConversationState, OrderQuerySystem
+
+EMAIL = "a@example.com"
+
+
+class FakeOrders:
+    """Twelve orders, newest first, paged by position"""
+
+    def __init__(self):
+        start = datetime(2024, 1, 1)
+        self.orders = [
+            Order(f"ORD-{i:02d}", EMAIL, {"items": []}, Decimal("10"), "delivered", start - timedelta(days=i))
+            for i in range(12)
+        ]
+
+    def _cursor(self, end):
+        return (str(end), "") if end < len(self.orders) else None
+
+    def get_order_summary(self, email, limit):
+        return OrderSummary(
+            email, len(self.orders), Decimal("120"), {"delivered": len(self.orders)},
+            self.orders[:limit], self._cursor(limit),
+        )
+
+    def get_order_page(self, email, cursor, limit):
+        start = int(cursor[0])
+        return self.orders[start:start + limit], self._cursor(start + limit)
+
+
+@pytest.fixture(scope="module")
+def system():
+    return OrderQuerySystem(api_key="test", order_repository=FakeOrders())
+
+
+def turn(session, text, intent_result=None):
+    async def collect():
+        return "".join([chunk async for chunk in session.process_query_stream(text, intent_result=intent_result)])
+    return asyncio.run(collect())
+
+
+def lookup(session):
+    return turn(session, f"Đơn hàng của {EMAIL}", {"intent": "CHECK_ORDERS", "email": EMAIL})
+
+
+@pytest.mark.parametrize("text", ["xem thêm", "Xem tiếp", "  xem thêm!  "])
+def test_paging_command(text):
+    assert MORE_ORDERS_PATTERN.match(text)
+
+
+@pytest.mark.parametrize("text", [
+    "bước tiếp theo để đổi trả là gì",
+    "tell me more about shipping",
+    "xem thêm chính sách đổi trả",
+    "thêm nữa",
+])
+def test_not_a_paging_command(text):
+    assert not MORE_ORDERS_PATTERN.match(text)
+
+
+def test_pages_through_a_lookup(system):
+    session = system.new_session()
+    assert "ORD-00" in lookup(session)
+    assert not session.needs_intent("xem thêm")
+    assert "ORD-05" in turn(session, "xem thêm")
+    assert "ORD-10" in turn(session, "xem tiếp")
+    # Out of pages
+    assert session.state.order_lookup["cursor"] is None
+    assert session.needs_intent("xem thêm")
+
+
+def test_questions_after_a_lookup_are_classified(system):
+    session = system.new_session()
+    lookup(session)
+    assert session.needs_intent("tell me more about shipping")
+    turn(session, "bước tiếp theo để đổi trả là gì", {"intent": "FAQ"})
+    assert session.state.order_lookup is None
+    assert session.needs_intent("xem thêm")
+
+
+def test_faq_answer_ends_paging(system):
+    session = system.new_session()
+    lookup(session)
+    session.record_exchange("Phí ship bao nhiêu?", "30.000đ")
+    assert session.state.order_lookup is None
+
+
+def test_lookup_survives_the_conversation_store():
+    state = ConversationState()
+    state.order_lookup = {"email": EMAIL, "cursor": ("2024-01-01", "ORD-04"), "remaining": 7}
+    restored = ConversationState()
+    restored.load_record(state.to_record())
+    assert restored.order_lookup == state.order_lookup
@@ -0,0 +1,146 @@
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
+
+from src.core.orders import (
+    BULK_LOOKUP_SQL,
+    CANCEL_SQL,
+    CancelStatus,
+    Order,
+    OrderRepository,
+)
+
+
+class FakeCursor:
+    def __init__(self, conn, row_factory=None):
+        self.conn = conn
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def execute(self, query, params=None, prepare=None):
+        self.conn.executed.append((query, params))
+        self.rows = self.conn.respond(query, params)
+        return self
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return list(self.rows)
+
+
+class FakeConnection:
+    """Answers CANCEL_SQL from a dict of order statuses, as Postgres would"""
+
+    def __init__(self, statuses, orders=()):
+        self.statuses = statuses
+        self.orders = list(orders)
+        self.executed = []
+        self.pipelines = 0
+        self.commits = 0
+
+    def respond(self, query, params):
+        if query == CANCEL_SQL:
+            key = (params["email"], params["order_id"])
+            if key not in self.statuses:
+                return []
+            status = self.statuses[key]
+            cancelled = status.lower() == "pending"
+            if cancelled:
+                self.statuses[key] = "cancelled"
+            return [(status, cancelled)]
+        if query == BULK_LOOKUP_SQL:
+            (emails,) = params
+            return [order for order in self.orders if order.customer_email in emails]
+        raise AssertionError(f"unexpected query: {query}")
+
+    def cursor(self, row_factory=None):
+        return FakeCursor(self, row_factory)
+
+    @contextmanager
+    def pipeline(self):
+        self.pipelines += 1
+        yield
+
+    def commit(self):
+        self.commits += 1
+
+
+class FakePool:
+    def __init__(self, conn):
+        self.conn = conn
+        self.checkouts = 0
+
+    @contextmanager
+    def connection(self):
+        self.checkouts += 1
+        yield self.conn
+
+
+class FakeCache:
+    def __init__(self):
+        self.invalidated = []
+
+    def invalidate(self, email):
+        self.invalidated.append(email)
+
+
+def repository(statuses, orders=()):
+    conn = FakeConnection(statuses, orders)
+    return OrderRepository(FakePool(conn), cache=FakeCache()), conn
+
+
+def test_cancel_maps_statement_results():
+    repo, conn = repository({("a@x.com", "O1"): "pending", ("a@x.com", "O2"): "cancelled"})
+    cancelled = repo.cancel("a@x.com", "O1")
+    assert (cancelled.status, cancelled.order_status) == (CancelStatus.CANCELLED, "pending")
+    again = repo.cancel("a@x.com", "O2")
+    assert (again.status, again.order_status) == (CancelStatus.INVALID_STATUS, "cancelled")
+    # Another customer's order is not found, whatever its status
+    assert repo.cancel("b@x.com", "O1").status == CancelStatus.NOT_FOUND
+    assert repo.cancel("a@x.com", "O9").status == CancelStatus.NOT_FOUND
+    # Only the actual cancellation invalidates the customer's cached orders
+    assert repo.cache.invalidated == ["a@x.com"]
+
+
+def test_cancel_many_pipelines_one_transaction():
+    repo, conn = repository({("a@x.com", "O1"): "pending", ("b@x.com", "O2"): "shipped"})
+    requests = [("a@x.com", "O1"), ("b@x.com", "O2"), ("a@x.com", "O1"), ("c@x.com", "O3")]
+    results = repo.cancel_many(requests)
+    assert [result.status for result in results] == [
+        CancelStatus.CANCELLED,
+        CancelStatus.INVALID_STATUS,
+        # The earlier request in the batch already cancelled it
+        CancelStatus.INVALID_STATUS,
+        CancelStatus.NOT_FOUND,
+    ]
+    assert [result.order_id for result in results] == ["O1", "O2", "O1", "O3"]
+    assert (repo.pool.checkouts, conn.pipelines, conn.commits) == (1, 1, 1)
+    assert [query for query, _ in conn.executed] == [CANCEL_SQL] * 4
+    # One timestamp for the whole batch
+    assert len({params["updated_at"] for _, params in conn.executed}) == 1
+
+
+def test_orders_bulk_is_one_query_per_batch():
+    created = datetime(2024, 1, 1)
+    orders = [
+        Order("O1", "a@x.com", {}, Decimal("1"), "pending", created),
+        Order("O2", "b@x.com", {}, Decimal("2"), "pending", created),
+        Order("O3", "a@x.com", {}, Decimal("3"), "shipped", created),
+    ]
+    repo, conn = repository({}, orders)
+    results = repo.get_orders_bulk(["a@x.com", "c@x.com", "a@x.com"])
+    assert {email: [order.order_id for order in found] for email, found in results.items()} == {
+        "a@x.com": ["O1", "O3"],
+        "c@x.com": [],
+    }
+    # Duplicates are sent once
+    assert conn.executed == [(BULK_LOOKUP_SQL, (["a@x.com", "c@x.com"],))]
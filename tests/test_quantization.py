@@ -0,0 +1,49 @@
+import numpy as np
+
+from src.core.quantization import BinaryQuantizedIndex, binary_quantize, hamming_distances, pack_codes
+
+
+def clustered(rows=2000, dims=256, clusters=50, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dims))
+    corpus = centers[rng.integers(0, clusters, rows)] + 0.5 * rng.standard_normal((rows, dims))
+    queries = corpus[rng.integers(0, rows, 50)] + 0.3 * rng.standard_normal((50, dims))
+    return corpus, queries
+
+
+def recall(index, queries, k, multiplier):
+    hits = 0
+    for query in queries:
+        exact = {row for row, _ in index.search(query, k, 0)}
+        hits += len(exact & {row for row, _ in index.search(query, k, multiplier)})
+    return hits / (k * len(queries))
+
+
+def test_binary_quantize_is_sign_bits():
+    assert binary_quantize([0.5, -1.0, 0.0, 2.0]) == "1001"
+
+
+def test_codes_pad_to_whole_words():
+    codes = pack_codes(np.array([[1.0] * 70, [-1.0] * 70]))
+    assert codes.shape == (2, 2)
+    assert hamming_distances(codes, codes[0]).tolist() == [0, 70]
+
+
+def test_exact_search_is_sorted_cosine():
+    index = BinaryQuantizedIndex([[1, 0], [0.6, 0.8], [0, 1], [-1, 0]])
+    assert [row for row, _ in index.search([1, 0.1], k=3, rerank_multiplier=0)] == [0, 1, 2]
+    row, similarity = index.search([2, 0], k=1, rerank_multiplier=0)[0]
+    assert (row, round(similarity, 6)) == (0, 1.0)
+
+
+def test_rerank_recall_grows_with_multiplier():
+    corpus, queries = clustered()
+    index = BinaryQuantizedIndex(corpus)
+    recalls = [recall(index, queries, 5, multiplier) for multiplier in (1, 4, 16)]
+    assert recalls == sorted(recalls)
+    assert recalls[-1] >= 0.9
+
+
+def test_candidates_cover_small_index():
+    index = BinaryQuantizedIndex(np.eye(4))
+    assert len(index.search([1, 0, 0, 0], k=3, rerank_multiplier=8)) == 3
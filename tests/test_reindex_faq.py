@@ -0,0 +1,101 @@
+import pytest
+
+from src.utils.faq.reindex_faq import (
+    DOCUMENTS_TABLE,
+    PREVIOUS_TABLE,
+    STAGING_TABLE,
+    reindex,
+    validation_problems,
+)
+
+
+def counts(staged, live=None):
+    return {DOCUMENTS_TABLE: live, STAGING_TABLE: staged, PREVIOUS_TABLE: None}
+
+
+def test_valid_staging_table_has_no_problems():
+    assert validation_problems(counts(100, live=120), 100, recall=0.95) == []
+
+
+def test_missing_staging_table_is_the_only_problem():
+    assert validation_problems(counts(None, live=120), 100, recall=0.0) == [f"{STAGING_TABLE} does not exist"]
+
+
+def test_row_count_must_match_the_loaded_rows():
+    assert validation_problems(counts(99), 100) == [f"{STAGING_TABLE} holds 99 rows, expected 100"]
+
+
+@pytest.mark.parametrize("live, shrunk", [(200, False), (201, True), (None, False), (0, False)])
+def test_staging_table_may_shrink_up_to_max_shrink(live, shrunk):
+    problems = validation_problems(counts(100, live), 100, max_shrink=0.5)
+    assert bool(problems) == shrunk
+
+
+@pytest.mark.parametrize("recall, low", [(0.9, False), (0.88, True), (None, False)])
+def test_recall_below_minimum(recall, low):
+    problems = validation_problems(counts(100), 100, recall=recall, k=5, min_recall=0.9)
+    assert problems == (["sample recall@5 is 0.88, below 0.90"] if low else [])
+
+
+class FakeReindexer:
+    """Records its calls in a log shared by every node"""
+
+    def __init__(self, name, log, problems=(), fail_swap=False):
+        self.name = name
+        self.log = log
+        self.problems = list(problems)
+        self.fail_swap = fail_swap
+
+    def load(self, rows):
+        self.log.append(("load", self.name, len(rows)))
+
+    def validate(self, rows, **validate_args):
+        self.log.append(("validate", self.name))
+        return {"node": self.name, "problems": self.problems}
+
+    def swap(self):
+        self.log.append(("swap", self.name))
+        if self.fail_swap:
+            raise RuntimeError("lock timeout")
+
+    def rollback(self):
+        self.log.append(("rollback", self.name))
+
+
+def rows(count):
+    return [{"key": f"q{i}", "answer": "a"} for i in range(count)]
+
+
+def test_every_node_is_validated_before_any_swap():
+    log = []
+    nodes = [FakeReindexer("a", log), FakeReindexer("b", log)]
+    reports = reindex(nodes, rows(10))
+    assert [report["node"] for report in reports] == ["a", "b"]
+    assert [entry[:2] for entry in log] == [
+        ("load", "a"), ("validate", "a"), ("load", "b"), ("validate", "b"), ("swap", "a"), ("swap", "b"),
+    ]
+    # Rows are split between the nodes
+    assert sum(entry[2] for entry in log if entry[0] == "load") == 10
+
+
+def test_one_failed_node_keeps_every_node_live():
+    log = []
+    nodes = [FakeReindexer("a", log), FakeReindexer("b", log, problems=["recall"])]
+    reindex(nodes, rows(10))
+    assert not [entry for entry in log if entry[0] == "swap"]
+
+
+def test_no_swap_stops_after_validation():
+    log = []
+    reindex([FakeReindexer("a", log)], rows(3), swap=False)
+    assert log == [("load", "a", 3), ("validate", "a")]
+
+
+def test_failed_swap_rolls_back_the_swapped_nodes():
+    log = []
+    nodes = [FakeReindexer("a", log), FakeReindexer("b", log), FakeReindexer("c", log, fail_swap=True)]
+    with pytest.raises(RuntimeError):
+        reindex(nodes, rows(10))
+    assert [entry[:2] for entry in log if entry[0] in ("swap", "rollback")] == [
+        ("swap", "a"), ("swap", "b"), ("swap", "c"), ("rollback", "a"), ("rollback", "b"),
+    ]
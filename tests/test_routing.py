@@ -0,0 +1,136 @@
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from src.core.openai_client import OpenAIClient
+from src.core.routing import ChainConfig, LatencyRouter, build_chain_configs
+
+
+def test_chains_use_small_or_default_model():
+    configs = build_chain_configs("big", "small")
+    assert configs["intent"].models == ["small"]
+    assert configs["intent"].temperature == 0
+    assert configs["email"].stop == ["\n"]
+    assert configs["response"].models == ["big"]
+    assert configs["response"].stop is None
+
+
+def test_overrides_merge_into_chain_defaults():
+    configs = build_chain_configs("big", "small", {
+        "intent": {"max_tokens": 40},
+        "response": {"models": ["big", "other"]},
+        "custom": {"temperature": 0.1},
+    })
+    assert configs["intent"].models == ["small"]
+    assert configs["intent"].max_tokens == 40
+    assert configs["intent"].temperature == 0
+    assert configs["response"].models == ["big", "other"]
+    # Unknown chains start from the default model
+    assert configs["custom"].models == ["big"]
+    assert configs["custom"].temperature == 0.1
+
+
+def test_invoke_kwargs_leave_out_unset_stop():
+    assert "stop" not in ChainConfig(models=["m"]).invoke_kwargs()
+    assert ChainConfig(models=["m"], stop=["\n"]).invoke_kwargs()["stop"] == ["\n"]
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls = []
+
+    def create(self, **params):
+        self.calls.append(params)
+        message = SimpleNamespace(content="ok")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+@pytest.fixture
+def client():
+    client = OpenAIClient(api_key="test", model_id="default")
+    client.client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()))
+    return client
+
+
+def sent(client):
+    return client.client.chat.completions.calls[-1]
+
+
+def test_request_keeps_only_openai_parameters(client):
+    messages = [{"role": "user", "content": "hi"}]
+    config = {"top_p": 0.5, "metadata": {"chain": "intent"}, "callbacks": []}
+    assert client.invoke({"messages": messages}, config, models=["small"], temperature=0, stop=["\n"], seed=1) == "ok"
+    assert sent(client) == {
+        "model": "small",
+        "messages": messages,
+        "temperature": 0,
+        "max_tokens": 1000,
+        "stop": ["\n"],
+        "top_p": 0.5,
+    }
+
+
+def test_request_defaults_without_bound_parameters(client):
+    client.invoke({"messages": [{"role": "user", "content": "hi"}]})
+    assert sent(client)["model"] == "default"
+    assert sent(client)["temperature"] == 0.7
+    assert "stop" not in sent(client)
+
+
+def test_first_model_is_used_without_latency_routing(client):
+    client.router.observe("slow", 5.0)
+    client.invoke({"messages": []}, models=["slow", "fast"])
+    assert sent(client)["model"] == "slow"
+
+
+def observe(router, model, seconds, times):
+    for _ in range(times):
+        router.observe(model, seconds)
+
+
+def test_p95_is_nearest_rank():
+    router = LatencyRouter()
+    for seconds in range(1, 21):
+        router.observe("m", float(seconds))
+    assert router.p95("m") == 20.0
+    assert router.p95("unseen") is None
+
+
+def test_window_keeps_recent_samples():
+    router = LatencyRouter(window=5)
+    observe(router, "m", 9.0, 5)
+    observe(router, "m", 1.0, 5)
+    assert router.p95("m") == 1.0
+
+
+def test_models_without_enough_samples_go_first():
+    router = LatencyRouter(min_samples=3, explore_rate=0)
+    observe(router, "fast", 0.1, 3)
+    observe(router, "slow", 1.0, 2)
+    assert router.select(["fast", "slow"]) == "slow"
+    router.observe("slow", 1.0)
+    assert router.select(["fast", "slow"]) == "fast"
+
+
+def test_lowest_p95_wins():
+    router = LatencyRouter(min_samples=5, explore_rate=0)
+    observe(router, "a", 0.5, 10)
+    observe(router, "b", 0.2, 9)
+    # One slow call puts b's p95 above a's
+    router.observe("b", 2.0)
+    assert router.select(["a", "b"]) == "a"
+    # Diluted below the top 5% again
+    observe(router, "b", 0.2, 30)
+    assert router.select(["a", "b"]) == "b"
+
+
+def test_explore_rate_picks_random_candidates():
+    router = LatencyRouter(min_samples=1, explore_rate=0.5)
+    observe(router, "fast", 0.1, 5)
+    observe(router, "slow", 1.0, 5)
+    random.seed(7)
+    picks = [router.select(["fast", "slow"]) for _ in range(1000)]
+    # Half the calls explore, and half of those land on the slow model
+    assert 180 < picks.count("slow") < 320
+    assert router.select(["only"]) == "only"
@@ -0,0 +1,68 @@
+import threading
+
+from src.core.pgvector import ShardedPGVector, shard_for
+
+
+class FakeShard:
+    def __init__(self, similarities=(), error=None, block=None):
+        self.similarities = similarities
+        self.error = error
+        self.block = block
+        self.documents = []
+        self.deleted = []
+
+    def similarity_search(self, query_embedding, k, filter_metadata, similarity_threshold, categories):
+        if self.block is not None:
+            self.block.wait()
+        if self.error is not None:
+            raise self.error
+        return [{"answer": str(s), "similarity": s} for s in self.similarities][:k]
+
+    def add_documents(self, documents, get_embedding_fn):
+        start = len(self.documents)
+        self.documents.extend(documents)
+        return list(range(start, len(self.documents)))
+
+    def delete_document(self, doc_id):
+        self.deleted.append(doc_id)
+        return True
+
+
+def test_merges_top_k_across_shards():
+    store = ShardedPGVector([FakeShard([0.9, 0.5]), FakeShard([0.8, 0.7])])
+    results = store.similarity_search([0.0], k=3)
+    assert [(r["similarity"], r["shard"]) for r in results] == [(0.9, 0), (0.8, 1), (0.7, 1)]
+    assert not results.partial
+
+
+def test_failed_and_slow_shards_are_reported():
+    release = threading.Event()
+    store = ShardedPGVector(
+        [FakeShard([0.9]), FakeShard(error=RuntimeError("down")), FakeShard([0.99], block=release)],
+        shard_timeout=0.05,
+    )
+    try:
+        results = store.similarity_search([0.0], k=3)
+    finally:
+        release.set()
+    assert [r["similarity"] for r in results] == [0.9]
+    assert results.failed_shards == [1, 2]
+    assert results.partial
+
+
+def test_document_ids_are_global():
+    shards = [FakeShard() for _ in range(3)]
+    store = ShardedPGVector(shards)
+    documents = [{"id": f"faq-{i}", "answer": "a"} for i in range(10)]
+    doc_ids = store.add_documents(documents, get_embedding_fn=None)
+    assert len(set(doc_ids)) == 10
+    for doc_id in doc_ids:
+        shard, local_id = doc_id % 3, doc_id // 3
+        assert shard_for(shards[shard].documents[local_id]["id"], 3) == shard
+    store.delete_document(doc_ids[0])
+    assert shards[doc_ids[0] % 3].deleted == [doc_ids[0] // 3]
+
+
+def test_shard_is_stable_and_spread():
+    assert shard_for("faq-1", 4) == shard_for("faq-1", 4)
+    assert len({shard_for(f"faq-{i}", 4) for i in range(100)}) == 4
@@ -0,0 +1,113 @@
+import asyncio
+import threading
+
+import pytest
+
+from src.core.chat import SPECULATION_EVENTS, ChatService
+
+HIT = {"found": True, "answer": "30.000đ", "similarity": 0.9}
+MISS = {"found": False, "embedding": [0.1]}
+CHECK_ORDERS = {"intent": "CHECK_ORDERS", "confidence": 0.9}
+GENERAL = {"intent": "GENERAL_QUESTION", "confidence": 0.9}
+
+
+class Conversation:
+    """LLM intent call that answers after ``delay``, or never"""
+
+    def __init__(self, result=None, delay=None, error=None, on_done=None):
+        self.result = result
+        self.delay = delay
+        self.error = error
+        self.on_done = on_done
+        self.cancelled = False
+
+    async def classify_intent_llm(self, user_input):
+        try:
+            if self.delay is None:
+                await asyncio.Event().wait()
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.on_done:
+            # Lets the FAQ lookup finish once this call has
+            asyncio.get_running_loop().call_later(0.05, self.on_done)
+        if self.error:
+            raise self.error
+        return self.result
+
+
+@pytest.fixture
+def release():
+    # Set at teardown too, so no lookup thread outlives its test
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+def service(faq_response, wait_for=None):
+    chat = ChatService(order_system=None, vector_db=None, embedding_client=None, faq_threshold=0.7, speculative=True)
+
+    def get_faq_response(query):
+        if wait_for is not None:
+            wait_for.wait(5)
+        return faq_response
+
+    chat.get_faq_response = get_faq_response
+    return chat
+
+
+def counts(chat):
+    return {field: count for field, count in chat.speculation.snapshot().items() if count}
+
+
+def test_faq_hit_cancels_intent():
+    chat, conversation = service(HIT), Conversation()
+    assert asyncio.run(chat._speculate(conversation, "Phí ship?")) == (HIT, None)
+    assert conversation.cancelled
+    assert counts(chat) == {"turns": 1, "faq_first": 1, "faq_hits": 1, "cancelled_intents": 1}
+
+
+def test_local_intent_cancels_llm_intent():
+    faq_response = {**MISS, "local_intent": CHECK_ORDERS}
+    chat, conversation = service(faq_response), Conversation()
+    assert asyncio.run(chat._speculate(conversation, "Đơn của tôi?")) == (faq_response, CHECK_ORDERS)
+    assert conversation.cancelled
+    assert counts(chat) == {"turns": 1, "faq_first": 1, "cancelled_intents": 1}
+
+
+def test_intent_error_falls_back_to_faq_response(release):
+    chat = service(MISS, wait_for=release)
+    conversation = Conversation(delay=0, error=RuntimeError("timeout"), on_done=release.set)
+    assert asyncio.run(chat._speculate(conversation, "hi")) == (MISS, None)
+    assert counts(chat) == {"turns": 1, "intent_first": 1, "intent_errors": 1}
+
+
+def test_order_intent_ignores_pending_retrieval(release):
+    chat = service(HIT, wait_for=release)
+    conversation = Conversation(CHECK_ORDERS, delay=0, on_done=release.set)
+    assert asyncio.run(chat._speculate(conversation, "Đơn của tôi?")) == ({"found": False}, CHECK_ORDERS)
+    assert counts(chat) == {"turns": 1, "intent_first": 1, "ignored_retrievals": 1}
+
+
+def test_faq_hit_after_intent_drops_intent(release):
+    chat = service(HIT, wait_for=release)
+    conversation = Conversation(GENERAL, delay=0, on_done=release.set)
+    assert asyncio.run(chat._speculate(conversation, "Phí ship?")) == (HIT, None)
+    assert not conversation.cancelled
+    assert counts(chat) == {"turns": 1, "intent_first": 1, "faq_hits": 1, "unused_intents": 1}
+
+
+def test_faq_miss_after_intent_keeps_intent(release):
+    chat = service(MISS, wait_for=release)
+    conversation = Conversation(GENERAL, delay=0, on_done=release.set)
+    assert asyncio.run(chat._speculate(conversation, "hi")) == (MISS, GENERAL)
+    assert counts(chat) == {"turns": 1, "intent_first": 1}
+
+
+def test_metric_counts_the_turns_of_every_service():
+    before = SPECULATION_EVENTS.labels("faq_hits").value
+    for chat in (service(HIT), service(HIT)):
+        asyncio.run(chat._speculate(Conversation(), "Phí ship?"))
+        assert counts(chat)["faq_hits"] == 1
+    assert SPECULATION_EVENTS.labels("faq_hits").value == before + 2
@@ -0,0 +1,77 @@
+import asyncio
+import threading
+
+import pytest
+
+from src.core.streaming import StreamRunner, coalesce_text
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("src.core.streaming.time.monotonic", lambda: now[0])
+    return now
+
+
+def timed(clock, chunks):
+    """Chunks arriving 62.5 ms apart, exact in binary floating point"""
+    for chunk in chunks:
+        clock[0] += 0.0625
+        yield chunk
+
+
+def test_renders_at_most_fps_times_a_second(clock):
+    renders = list(coalesce_text(timed(clock, "abcdefghij"), fps=8))
+    # One render per 125 ms, the last of which is the complete text
+    assert renders == ["ab", "abcd", "abcdef", "abcdefgh", "abcdefghij"]
+
+
+def test_min_chars_holds_back_renders(clock):
+    renders = list(coalesce_text(timed(clock, ["a", "b", "cdef", "g"]), fps=100, min_chars=3))
+    assert renders == ["abcdef", "abcdefg"]
+
+
+def test_always_ends_with_complete_text(clock):
+    assert list(coalesce_text(iter(["one ", "two"]), fps=1)) == ["one two"]
+
+
+def test_empty_stream_renders_once(clock):
+    assert list(coalesce_text(iter([]), fps=10)) == [""]
+
+
+def test_fps_zero_renders_every_chunk(clock):
+    assert list(coalesce_text(iter(["a", "b"]), fps=0)) == ["a", "ab"]
+
+
+def test_runner_reuses_thread_loops():
+    runner = StreamRunner(max_workers=1)
+    loops = []
+
+    async def stream():
+        loops.append((threading.get_ident(), asyncio.get_running_loop()))
+        yield "a"
+        yield "b"
+
+    try:
+        assert list(runner.iterate(stream)) == ["a", "b"]
+        assert list(runner.iterate(stream)) == ["a", "b"]
+    finally:
+        runner.shutdown()
+    assert loops[0] == loops[1]
+    assert loops[0][0] != threading.get_ident()
+
+
+def test_runner_raises_stream_errors():
+    runner = StreamRunner(max_workers=1)
+
+    async def stream():
+        yield "a"
+        raise RuntimeError("boom")
+
+    try:
+        chunks = runner.iterate(stream)
+        assert next(chunks) == "a"
+        with pytest.raises(RuntimeError, match="boom"):
+            next(chunks)
+    finally:
+        runner.shutdown()
@@ -0,0 +1,141 @@
+import asyncio
+import json
+
+from src.core.tracing import JsonlExporter, Tracer, span
+from src.utils.tracing.summarize_traces import read_traces, self_times, summarize
+
+
+class ListExporter:
+    def __init__(self):
+        self.traces = []
+
+    def export(self, trace):
+        self.traces.append(trace)
+
+
+def by_name(trace):
+    return {item["name"]: item for item in trace["spans"]}
+
+
+def test_spans_nest_across_threads_and_tasks():
+    exporter = ListExporter()
+    tracer = Tracer(exporter)
+
+    def lookup():
+        with span("db", rows=2):
+            pass
+
+    async def classify():
+        with span("llm"):
+            await asyncio.sleep(0)
+
+    async def turn():
+        with tracer.trace("turn", conversation_id="c1") as root:
+            with span("speculate"):
+                await asyncio.gather(asyncio.to_thread(lookup), classify())
+            root.set(source="faq")
+
+    asyncio.run(turn())
+    (trace,) = exporter.traces
+    spans = by_name(trace)
+    assert spans["turn"]["parent"] is None
+    assert spans["turn"]["attrs"] == {"conversation_id": "c1", "source": "faq"}
+    assert spans["speculate"]["parent"] == spans["turn"]["id"]
+    assert spans["db"]["parent"] == spans["speculate"]["id"]
+    assert spans["llm"]["parent"] == spans["speculate"]["id"]
+    assert spans["db"]["attrs"] == {"rows": 2}
+
+
+def test_nested_trace_is_a_child_span():
+    exporter = ListExporter()
+    tracer = Tracer(exporter)
+    with tracer.trace("turn"):
+        with tracer.trace("inner"):
+            pass
+    (trace,) = exporter.traces
+    assert by_name(trace)["inner"]["parent"] == by_name(trace)["turn"]["id"]
+
+
+def test_sample_rate_zero_exports_nothing():
+    exporter = ListExporter()
+    tracer = Tracer(exporter, sample_rate=0)
+    for _ in range(20):
+        with tracer.trace("turn") as root:
+            assert root.trace_id is None
+            with span("db") as child:
+                child.set(rows=1)
+    assert exporter.traces == []
+
+
+def test_sample_rate_one_exports_every_turn():
+    exporter = ListExporter()
+    tracer = Tracer(exporter, sample_rate=1)
+    ids = []
+    for _ in range(20):
+        with tracer.trace("turn") as root:
+            ids.append(root.trace_id)
+    assert [trace["trace_id"] for trace in exporter.traces] == ids
+    assert len(set(ids)) == 20
+
+
+def test_span_outside_a_turn_is_a_noop():
+    with span("db") as child:
+        child.set(rows=1)
+    assert child.trace_id is None
+
+
+def test_jsonl_exporter_appends_one_line_per_trace(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(JsonlExporter(str(path)))
+    for name in ("a", "b"):
+        with tracer.trace(name):
+            with span("db", rows=3):
+                pass
+    lines = path.read_text(encoding="utf-8").splitlines()
+    traces = [json.loads(line) for line in lines]
+    assert [trace["name"] for trace in traces] == ["a", "b"]
+    assert set(traces[0]) == {"trace_id", "name", "start", "duration_ms", "spans"}
+    assert [item["name"] for item in traces[0]["spans"]] == ["a", "db"]
+    assert list(read_traces([str(path)])) == traces
+
+
+def make_trace(trace_id, turn_ms, llm_ms, start=0.0):
+    return {
+        "trace_id": trace_id,
+        "name": "turn",
+        "start": start,
+        "duration_ms": turn_ms,
+        "spans": [
+            {"id": "t", "parent": None, "name": "turn", "offset_ms": 0, "duration_ms": turn_ms, "attrs": {}},
+            {"id": "h", "parent": "t", "name": "handle", "offset_ms": 1, "duration_ms": llm_ms + 5, "attrs": {}},
+            {
+                "id": "l", "parent": "h", "name": "llm", "offset_ms": 2, "duration_ms": llm_ms,
+                "attrs": {"prompt_tokens": 100, "cache_hit": True},
+            },
+        ],
+    }
+
+
+def test_self_time_excludes_children():
+    assert self_times(make_trace("a", 50, 30)) == {"t": 15.0, "h": 5.0, "l": 30.0}
+
+
+def test_summary_aggregates_per_span_name():
+    traces = [make_trace(str(i), 10 * i + 40, 10 * i) for i in range(1, 11)]
+    summary = summarize(traces)
+    assert summary["turns"] == 10
+    assert summary["turn_ms"] == {"p50": 90, "p95": 140, "p99": 140, "max": 140}
+    llm = summary["stages"]["llm"]
+    assert (llm["spans"], llm["turns"], llm["p50_ms"], llm["max_ms"]) == (10, 10, 50, 100)
+    assert (llm["prompt_tokens"], llm["cache_hit"]) == (1000, 10)
+    assert llm["self_ms"] == 550
+    # Stages are ordered by the time spent in them
+    assert list(summary["stages"]) == ["llm", "turn", "handle"]
+    assert [trace["trace_id"] for trace in summary["slowest"][:2]] == ["10", "9"]
+
+
+def test_read_traces_skips_malformed_lines_and_older_turns(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    lines = [json.dumps(make_trace("old", 10, 1, start=100.0)), "{not json", "", json.dumps(make_trace("new", 10, 1, start=200.0))]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    assert [trace["trace_id"] for trace in read_traces([str(path)], since=150.0)] == ["new"]
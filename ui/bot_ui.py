@@ -1,18 +1,48 @@
 import streamlit as st
-from src.core.tools import OrderQuerySystem
-from src.core.pgvector import PGVector
-from src.core.embedding import EmbeddingClient
+from src.core.chat import ChatService
+from src.api.client import ChatAPIClient
+from src.core.streaming import coalesce_text, get_stream_runner
+from src.core.conversation_store import conversation_store_from_env
 import json
 from typing import Dict, List, AsyncGenerator
-import asyncio
 from contextlib import contextmanager
 from src.lang.vi import UI_MESSAGES
 
+import uuid
+import httpx
 from dotenv import load_dotenv
 import os
 
 load_dotenv()  # Tải biến môi trường từ file .env
 api_key = os.getenv("OPENAI_API_KEY")
+# With CHAT_API_URL set the UI is a thin client of the chat API
+chat_api_url = os.getenv("CHAT_API_URL")
+# Streamed answers are re-rendered at most this often
+render_fps = float(os.getenv("CHAT_RENDER_FPS", "10"))
+render_min_chars = int(os.getenv("CHAT_RENDER_MIN_CHARS", "0"))
+# Only the newest messages are rendered on each rerun, older ones are
+# paged in on demand
+window_messages = int(os.getenv("CHAT_WINDOW_MESSAGES", "20"))
+# Messages kept in session state; older ones go to the conversation store
+session_max_messages = max(int(os.getenv("CHAT_SESSION_MAX_MESSAGES", "60")), window_messages)
+
+@st.cache_resource
+def get_chat_service() -> ChatService:
+    """Clients, chains, pools and the vector store, built once per process"""
+    return ChatService.from_env()
+
+
+@st.cache_resource
+def get_archive_store():
+    """Conversation store of in-process sessions, and of the messages archived out of any session"""
+    return conversation_store_from_env()
+
+
+@st.cache_resource
+def get_api_client(base_url: str) -> ChatAPIClient:
+    """API client with its kept-alive connections, shared by sessions"""
+    return ChatAPIClient(base_url)
+
 
 class ChatBot:
     def __init__(self):
@@ -21,65 +51,128 @@ class ChatBot:
 
         # Initialize session state
         if "messages" not in st.session_state:
-            st.session_state.messages = []
+            self._reset_messages()
 
     def _initialize_resources(self):
-        """Initialize or get cached resources"""
-        if "resources" not in st.session_state:
-            st.session_state.resources = {
-                "order_system": OrderQuerySystem(),
-                "vector_db": PGVector(),
-                "embedding_client": EmbeddingClient(api_key=api_key),
-            }
-
-        self.order_system = st.session_state.resources["order_system"]
-        self.vector_db = st.session_state.resources["vector_db"]
-        self.embedding_client = st.session_state.resources["embedding_client"]
-
-    def get_faq_response(self, query: str) -> Dict:
-        """Get response from FAQ system"""
-        try:
-            # Get embedding for query
-            query_embeddings = self.embedding_client.embed_documents(
-                texts=[query], input_type="search_query"
-            )
+        """Get the chat pipeline and this session's conversation"""
+        if chat_api_url:
+            self.api = get_api_client(chat_api_url)
+            if "conversation_id" not in st.session_state:
+                st.session_state.conversation_id = self.api.create_conversation()
+            # Responses stream on a worker thread, which can't use session state
+            self.conversation_id = st.session_state.conversation_id
+            return
 
-            if not query_embeddings:
-                return {"found": False}
-
-            # Search similar questions
-            results = self.vector_db.similarity_search(
-                query_embedding=query_embeddings[0], k=3, similarity_threshold=0.7
+        self.api = None
+        self.chat = get_chat_service()
+        # Only the conversation memory and state are per session. They live
+        # in the store, like the API's, so the archive expires with them.
+        if "order_session" not in st.session_state:
+            st.session_state.conversation_id = uuid.uuid4().hex
+            st.session_state.order_session = self.chat.new_conversation(
+                st.session_state.conversation_id, get_archive_store()
             )
-
-            if results:
-                return {
-                    "found": True,
-                    "answer": results[0]["answer"],
-                    "similarity": results[0]["similarity"],
-                }
-        except Exception as e:
-            print(UI_MESSAGES["faq_error"].format(str(e)))
-        return {"found": False}
+        self.order_system = st.session_state.order_session
 
     async def get_streaming_response(self, user_input: str) -> AsyncGenerator[str, None]:
-        """Get streaming response from the order system"""
-        try:
-            # First check FAQ
-            faq_response = self.get_faq_response(user_input)
-            #
-            if faq_response["found"] and faq_response["similarity"] > 0.7:
-                yield faq_response["answer"]
-                return
-
-            # Use order system for streaming response
-            async for chunk in self.order_system.process_query_stream(user_input):
+        """Get streaming response from the chat pipeline or the chat API"""
+        if self.api is None:
+            async for chunk in self.chat.stream_response(self.order_system, user_input):
                 yield chunk
+            return
 
+        try:
+            try:
+                async for chunk in self.api.stream_message(self.conversation_id, user_input):
+                    yield chunk
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code != 404:
+                    raise
+                # Expired on the server, carry on in a new conversation
+                self.conversation_id = self.api.create_conversation()
+                async for chunk in self.api.stream_message(self.conversation_id, user_input):
+                    yield chunk
         except Exception as e:
             print(f"Response error: {str(e)}")
             yield UI_MESSAGES["response_error"]
 
+    def _reset_messages(self):
+        st.session_state.messages = []
+        self._reset_archive()
+
+    def _reset_archive(self):
+        # Messages before these were moved to the archive under the
+        # conversation id
+        st.session_state.archived = 0
+        st.session_state.older_pages = 0
+        # The newest archived messages paged in so far, oldest first
+        st.session_state.archive_loaded = []
+
+    def add_message(self, role: str, content: str):
+        """Append a message, archiving the oldest ones beyond the session cap"""
+        messages = st.session_state.messages
+        messages.append({"role": role, "content": content})
+        if len(messages) <= session_max_messages:
+            return
+        # Archive down to one window, so the store is written once per
+        # (session_max_messages - window_messages) messages
+        overflow = len(messages) - window_messages
+        try:
+            get_archive_store().archive(
+                st.session_state.conversation_id, st.session_state.archived, messages[:overflow]
+            )
+        except Exception as e:
+            print(f"Archive error: {str(e)}")
+            return
+        pages = st.session_state.older_pages
+        if pages:
+            # Keep the loaded messages the newest archived ones, as many as are shown
+            loaded = st.session_state.archive_loaded
+            loaded.extend(messages[:overflow])
+            del loaded[:max(len(loaded) - pages * window_messages, 0)]
+        del messages[:overflow]
+        st.session_state.archived += overflow
+
+    def older_messages(self, count: int) -> List[Dict]:
+        """The last ``count`` messages before the rendered window, oldest first"""
+        messages = st.session_state.messages
+        in_session = messages[:max(len(messages) - window_messages, 0)][-count:] if count else []
+        needed = count - len(in_session)
+        if needed <= 0:
+            return in_session
+        # Pages are loaded once, so reruns don't query the store
+        loaded = st.session_state.archive_loaded
+        if len(loaded) < min(needed, st.session_state.archived):
+            try:
+                loaded[:0] = get_archive_store().load_archive(
+                    st.session_state.conversation_id,
+                    st.session_state.archived - len(loaded),
+                    needed - len(loaded),
+                )
+            except Exception as e:
+                print(f"Archive error: {str(e)}")
+        return loaded[-needed:] + in_session
+
+    def display_history(self):
+        """Render the last window_messages messages, with older ones in an expander"""
+        messages = st.session_state.messages
+        older = st.session_state.archived + max(len(messages) - window_messages, 0)
+        if older:
+            with st.expander(UI_MESSAGES["older_messages"].format(older)):
+                pages = st.session_state.older_pages
+                if pages * window_messages < older:
+                    label = UI_MESSAGES["load_older"] if pages else UI_MESSAGES["show_older"]
+                    if st.button(label):
+                        st.session_state.older_pages += 1
+                        st.rerun()
+                for message in self.older_messages(min(pages * window_messages, older)):
+                    with st.chat_message(message["role"]):
+                        st.markdown(message["content"])
+
+        for message in messages[-window_messages:]:
+            with st.chat_message(message["role"]):
+                st.markdown(message["content"])
+
     def display_chat(self):
         """Display chat interface"""
         # Chat header
@@ -87,14 +180,12 @@ class ChatBot:
         st.write(UI_MESSAGES["chat_subtitle"])
 
         # Display chat messages
-        for message in st.session_state.messages:
-            with st.chat_message(message["role"]):
-                st.markdown(message["content"])
+        self.display_history()
 
         # Chat input
         if prompt := st.chat_input(UI_MESSAGES["chat_input_placeholder"]):
             # Add user message to chat
-            st.session_state.messages.append({"role": "user", "content": prompt})
+            self.add_message("user", prompt)
             with st.chat_message("user"):
                 st.markdown(prompt)
 
@@ -102,22 +193,20 @@ class ChatBot:
             with st.chat_message("assistant"):
                 message_placeholder = st.empty()
                 full_response = ""
-                
-                # Create and run async response generator
-                async def process_response():
-                    nonlocal full_response
-                    async for chunk in self.get_streaming_response(prompt):
-                        full_response += chunk
-                        message_placeholder.markdown(full_response + "▌")
-                
-                # Run the async function
-                asyncio.run(process_response())
-                
+
+                # The response streams on a long-lived event loop in the
+                # process; re-render it at most render_fps times a second
+                chunks = get_stream_runner().iterate(lambda: self.get_streaming_response(prompt))
+                for full_response in coalesce_text(chunks, render_fps, render_min_chars):
+                    message_placeholder.markdown(full_response + "▌")
+
                 # Update final response
                 message_placeholder.markdown(full_response)
-                st.session_state.messages.append(
-                    {"role": "assistant", "content": full_response}
-                )
+                if self.api is not None and self.conversation_id != st.session_state.conversation_id:
+                    # The old conversation expired, and its archive with it
+                    st.session_state.conversation_id = self.conversation_id
+                    self._reset_archive()
+                self.add_message("assistant", full_response)
 
     def display_sidebar(self):
         """Display sidebar with additional information"""
@@ -131,7 +220,15 @@ class ChatBot:
 
             # Clear chat button
             if st.button(UI_MESSAGES["clear_chat"]):
-                st.session_state.messages = []
+                if st.session_state.archived:
+                    try:
+                        get_archive_store().delete(st.session_state.conversation_id)
+                    except Exception as e:
+                        print(f"Archive error: {str(e)}")
+                # Start a new conversation, with its own memory and archive
+                st.session_state.pop("conversation_id", None)
+                st.session_state.pop("order_session", None)
+                self._reset_messages()
                 st.rerun()
 
 def main():